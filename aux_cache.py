@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+SNAP 辅助数据（SRTM 1Sec DEM、Sentinel-1 精密轨道）的共享缓存
+
+目录结构与 SNAP auxdata 相同，可以放在集群共享盘上：
+  <root>/dem/SRTM 1Sec HGT/N35E139.SRTMGL1.hgt.zip
+  <root>/dem/mosaic/srtm1_<hash>.tif          按 AOI/burst 范围拼接的 External DEM（GeoTIFF）
+  <root>/Orbits/Sentinel-1/POEORB/S1A/2020/12/S1A_OPER_AUX_POEORB_OPOD_..._V..._....EOF.zip
+  <root>/index.json                           已缓存 / 远端不存在（海洋 DEM 瓦片）的条目
+
+- prefetch：由 AOI（或选中 burst 的范围）计算所需 SRTM 瓦片，由景的起止时间计算轨道文件，缺失的下载
+- check：只检查，不联网；离线模式下有缺失立即失败
+- dsm.py 使用拼接好的 GeoTIFF 作为 External DEM，轨道文件链接到 SNAP 的 auxdata 目录，
+  SNAP 找到本地文件后不会再自动下载
+
+python aux_cache.py prefetch --aux_dir /shared/auxdata --aoi data/aoi.geojson scene1.zip scene2.zip
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import socket
+import zipfile
+import hashlib
+import argparse
+import datetime
+import threading
+
+import numpy as np
+import requests
+
+import s1_meta
+import cog_export
+
+SRTM_URL = "https://step.esa.int/auxdata/dem/SRTMGL1/{tile}.SRTMGL1.hgt.zip"
+ORBIT_URL = "https://step.esa.int/auxdata/orbits/Sentinel-1/POEORB/{mission}/{year}/{month:02d}/"
+SNAP_AUXDATA = os.environ.get("SNAP_AUXDATA_DIR") or os.path.expanduser("~/.snap/auxdata")
+DEM_DIR = os.path.join("dem", "SRTM 1Sec HGT")
+MOSAIC_DIR = os.path.join("dem", "mosaic")
+ORBIT_DIR = os.path.join("Orbits", "Sentinel-1", "POEORB")
+INDEX_NAME = "index.json"
+
+SRTM_SIZE = 3601             # 1 角秒 HGT：3601x3601，相邻瓦片共享边缘一行/列
+SRTM_NODATA = -32768
+DEM_MARGIN_DEG = 0.05        # DEM 范围相对 burst/AOI 外扩
+ORBIT_MARGIN_S = 60          # 轨道文件有效期需覆盖景的起止时间并留出余量
+MAX_RETRIES = 3
+TIMEOUT = 60
+
+ORBIT_RE = re.compile(r"(S1[AB]_OPER_AUX_POEORB_OPOD_(\d{8}T\d{6})_V(\d{8}T\d{6})_(\d{8}T\d{6})\.EOF(?:\.zip)?)")
+
+
+class AuxMissing(RuntimeError):
+    """离线模式下缺少辅助数据"""
+
+
+# ---------------------- needs ----------------------
+def srtm_tiles(bbox, margin=DEM_MARGIN_DEG):
+    """经纬度外包框 -> 覆盖它的 SRTM 瓦片名（左下角取整，如 N35E139）"""
+    x0, y0, x1, y1 = bbox
+    tiles = []
+    for lat in range(math.floor(y0 - margin), math.floor(y1 + margin) + 1):
+        for lon in range(math.floor(x0 - margin), math.floor(x1 + margin) + 1):
+            tiles.append(f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}{'E' if lon >= 0 else 'W'}{abs(lon):03d}")
+    return tiles
+
+
+def tile_origin(tile):
+    lat = int(tile[1:3]) * (1 if tile[0] == "N" else -1)
+    lon = int(tile[4:7]) * (1 if tile[3] == "E" else -1)
+    return lat, lon
+
+
+def scene_dem_bbox(zip_path, aoi=None, iw=None, polarization="VV"):
+    """选中 burst 的合并范围（Back-Geocoding 需要整个 burst 的 DEM）；读不到 annotation 时用 AOI"""
+    aoi_bbox = s1_meta.load_aoi_bbox(aoi)
+    try:
+        anns = s1_meta.read_zip_annotations(zip_path, polarization)
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return aoi_bbox
+    if iw not in (None, "auto"):
+        anns = [a for a in anns if a["swath"] == iw]
+    return s1_meta.bursts_bbox(anns, s1_meta.select_bursts(anns, aoi_bbox)) or aoi_bbox
+
+
+def union_bbox(boxes):
+    boxes = [b for b in boxes if b]
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def parse_orbit_name(name):
+    m = ORBIT_RE.search(name)
+    if not m:
+        return None
+    def t(v):
+        return datetime.datetime.strptime(v, "%Y%m%dT%H%M%S")
+    return {"name": m.group(1), "mission": m.group(1)[:3], "created": t(m.group(2)),
+            "start": t(m.group(3)), "stop": t(m.group(4))}
+
+
+def orbit_covers(orbit, info, margin=ORBIT_MARGIN_S):
+    pad = datetime.timedelta(seconds=margin)
+    return orbit["mission"] == info["mission"] and orbit["start"] <= info["start"] - pad \
+        and orbit["stop"] >= info["stop"] + pad
+
+
+# ---------------------- cache ----------------------
+def _with_retries(func, desc, log=None):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return func()
+        except requests.HTTPError:
+            raise
+        except requests.RequestException as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = 2.0 * (2 ** attempt) * (0.5 + random.random())
+            if log:
+                log("WARN", f"{desc} failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class AuxCache:
+    def __init__(self, root, offline=False, log=None):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.offline = offline
+        self.log = log or (lambda level, msg: None)
+        self.lock = threading.Lock()
+        self.mosaic_lock = threading.Lock()
+        self.session = None
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---------- index ----------
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_NAME)
+
+    def load_index(self):
+        try:
+            with open(self._index_path(), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"dem": {}, "orbits": {}}
+
+    def _record(self, kind, key, entry):
+        # 其他节点可能同时写入：重新读取后合并，原子替换
+        with self.lock:
+            index = self.load_index()
+            index.setdefault(kind, {})[key] = entry
+            tmp = f"{self._index_path()}.{socket.gethostname()}-{os.getpid()}"
+            with open(tmp, "w") as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.replace(tmp, self._index_path())
+
+    def _download(self, url, dest):
+        if self.session is None:
+            self.session = requests.Session()
+        part = f"{dest}.part-{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+        def fetch():
+            with self.session.get(url, stream=True, timeout=TIMEOUT) as resp:
+                resp.raise_for_status()
+                with open(part, "wb") as f:
+                    for chunk in resp.iter_content(1024 * 1024):
+                        f.write(chunk)
+        try:
+            _with_retries(fetch, os.path.basename(dest), self.log)
+        except Exception:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        os.replace(part, dest)
+        return dest
+
+    # ---------- DEM ----------
+    def dem_tile_path(self, tile):
+        return os.path.join(self.root, DEM_DIR, f"{tile}.SRTMGL1.hgt.zip")
+
+    def dem_tile_state(self, tile, index=None):
+        """'ok' / 'absent'（远端没有，如海洋）/ None（未缓存）"""
+        if os.path.exists(self.dem_tile_path(tile)):
+            return "ok"
+        entry = (index or self.load_index()).get("dem", {}).get(tile)
+        return "absent" if entry and entry.get("absent") else None
+
+    def fetch_dem_tile(self, tile):
+        state = self.dem_tile_state(tile)
+        if state or self.offline:
+            return state
+        url = SRTM_URL.format(tile=tile)
+        try:
+            self._download(url, self.dem_tile_path(tile))
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                self._record("dem", tile, {"absent": True, "url": url, "checked": time.time()})
+                self.log("INFO", f"SRTM tile {tile} does not exist (sea), treated as 0 m")
+                return "absent"
+            raise
+        self._record("dem", tile, {"url": url, "size": os.path.getsize(self.dem_tile_path(tile)),
+                                   "fetched": time.time()})
+        self.log("INFO", f"Cached SRTM tile {tile}")
+        return "ok"
+
+    def read_dem_tile(self, tile):
+        with zipfile.ZipFile(self.dem_tile_path(tile)) as zf:
+            name = next(n for n in zf.namelist() if n.lower().endswith(".hgt"))
+            data = np.frombuffer(zf.read(name), dtype=">i2")
+        return data.reshape(SRTM_SIZE, SRTM_SIZE)
+
+    def dem_mosaic(self, bbox, margin=DEM_MARGIN_DEG):
+        """覆盖 bbox 的 SRTM 瓦片拼接为一个 GeoTIFF（External DEM），按瓦片集合缓存；返回路径"""
+        tiles = sorted(srtm_tiles(bbox, margin))
+        missing = [t for t in tiles if self.fetch_dem_tile(t) is None]
+        if missing:
+            raise AuxMissing(f"SRTM tiles not cached: {', '.join(missing)}")
+        name = "srtm1_" + hashlib.sha256(",".join(tiles).encode("utf-8")).hexdigest()[:16] + ".tif"
+        path = os.path.join(self.root, MOSAIC_DIR, name)
+        with self.mosaic_lock:
+            if not os.path.exists(path):
+                self._build_mosaic(tiles, path)
+        return path
+
+    def _build_mosaic(self, tiles, path):
+
+        lats = sorted({tile_origin(t)[0] for t in tiles})
+        lons = sorted({tile_origin(t)[1] for t in tiles})
+        n = SRTM_SIZE - 1
+        height, width = n * len(lats) + 1, n * len(lons) + 1
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        raw = f"{path}.raw-{socket.gethostname()}-{os.getpid()}"
+        # 拼接结果先写 memmap，再按行带写出 GeoTIFF，内存与瓦片数无关
+        mosaic = np.memmap(raw, dtype=np.int16, mode="w+", shape=(height, width))
+        try:
+            for t in tiles:
+                lat, lon = tile_origin(t)
+                y0 = (lats[-1] - lat) * n
+                x0 = (lon - lons[0]) * n
+                if self.dem_tile_state(t) == "ok":
+                    mosaic[y0:y0 + SRTM_SIZE, x0:x0 + SRTM_SIZE] = self.read_dem_tile(t)
+                else:
+                    mosaic[y0:y0 + SRTM_SIZE, x0:x0 + SRTM_SIZE] = 0
+            mosaic.flush()
+            res = 1.0 / n
+            geo = cog_export.geographic_tags(lons[0] - res / 2, lats[-1] + 1 + res / 2, res, res)
+            tmp = f"{path}.tmp-{socket.gethostname()}-{os.getpid()}"
+            # SNAP 的 GeoTIFF 读取器对预测器的支持有限：不压缩、不生成概视图
+            cog_export.write_cog(cog_export.ArraySource(mosaic, geo, SRTM_NODATA), tmp,
+                                 compression="none", overviews=False)
+            os.replace(tmp, path)
+        finally:
+            del mosaic
+            os.remove(raw)
+        self.log("INFO", f"DEM mosaic {width}x{height} from {len(tiles)} SRTM tiles: {path}")
+
+    # ---------- orbits ----------
+    def orbit_dir(self, mission, when):
+        return os.path.join(self.root, ORBIT_DIR, mission, f"{when.year}", f"{when.month:02d}")
+
+    def _months(self, info):
+        # SNAP 按有效期起始月份存放；景在月初时轨道文件在上个月的目录
+        days = (info["start"] - datetime.timedelta(days=1), info["start"])
+        return sorted({(d.year, d.month) for d in days})
+
+    def find_orbit(self, info):
+        """本地已缓存且覆盖该景的 POEORB 文件（多个时取最新生成的）"""
+        found = []
+        for year, month in self._months(info):
+            d = self.orbit_dir(info["mission"], datetime.datetime(year, month, 1))
+            if not os.path.isdir(d):
+                continue
+            for fn in os.listdir(d):
+                orbit = parse_orbit_name(fn)
+                if orbit and fn.endswith((".EOF", ".EOF.zip")) and orbit_covers(orbit, info):
+                    found.append((orbit["created"], os.path.join(d, fn)))
+        return max(found)[1] if found else None
+
+    def fetch_orbit(self, info):
+        path = self.find_orbit(info)
+        if path or self.offline:
+            return path
+        if self.session is None:
+            self.session = requests.Session()
+        candidates = []
+        for year, month in self._months(info):
+            url = ORBIT_URL.format(mission=info["mission"], year=year, month=month)
+
+            def listing():
+                resp = self.session.get(url, timeout=TIMEOUT)
+                if resp.status_code == 404:
+                    return ""
+                resp.raise_for_status()
+                return resp.text
+            for m in set(ORBIT_RE.findall(_with_retries(listing, url, self.log))):
+                orbit = parse_orbit_name(m[0])
+                if orbit_covers(orbit, info):
+                    candidates.append((orbit["created"], url, orbit))
+        if not candidates:
+            self.log("WARN", f"No POEORB file covers {info['name']} yet")
+            return None
+        _, url, orbit = max(candidates, key=lambda c: c[0])
+        name = orbit["name"] if orbit["name"].endswith(".zip") else orbit["name"] + ".zip"
+        dest = os.path.join(self.orbit_dir(info["mission"], orbit["start"]), name)
+        self._download(url + name, dest)
+        self._record("orbits", name, {"url": url + name, "size": os.path.getsize(dest), "fetched": time.time()})
+        self.log("INFO", f"Cached orbit {name}")
+        return dest
+
+    def link_orbit(self, path, snap_auxdata=SNAP_AUXDATA):
+        """在 SNAP 的 auxdata 目录中建立指向缓存文件的链接（同一目录时不做任何事）"""
+        rel = os.path.relpath(path, self.root)
+        target = os.path.join(snap_auxdata, rel)
+        if os.path.abspath(target) == os.path.abspath(path) or os.path.exists(target):
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.symlink(path, target)
+        except FileExistsError:
+            pass
+        return target
+
+    # ---------- all ----------
+    def prefetch(self, scenes, aoi=None, iw=None, polarization="VV"):
+        """scenes: 景路径列表。下载（离线时只检查）DEM 瓦片与轨道文件；返回缺失项列表"""
+        missing = []
+        bbox = union_bbox(scene_dem_bbox(p, aoi, iw, polarization) for p in scenes) if scenes \
+            else s1_meta.load_aoi_bbox(aoi)
+        for t in srtm_tiles(bbox):
+            if self.fetch_dem_tile(t) is None:
+                missing.append(f"SRTM {t}")
+        for p in scenes:
+            info = s1_meta.scene_info(p)
+            if info is None:
+                continue
+            path = self.fetch_orbit(info)
+            if path is None:
+                missing.append(f"POEORB {info['name']}")
+            else:
+                self.link_orbit(path)
+        return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared SNAP aux-data cache (SRTM 1Sec DEM, Sentinel-1 POEORB)")
+    parser.add_argument("command", choices=["prefetch", "check"], help="prefetch: download missing; check: offline check")
+    parser.add_argument("scenes", nargs="*", help="Scene zips / .SAFE directories")
+    parser.add_argument("--aux_dir", required=True, help="Shared cache directory")
+    parser.add_argument("--aoi", help='AOI GeoJSON or "minLon,minLat,maxLon,maxLat" (default: data/aoi.geojson)')
+    parser.add_argument("--iw", default="auto", choices=["auto", "IW1", "IW2", "IW3"])
+    args = parser.parse_args()
+
+    def log(level, msg):
+        print(f"[{level}] {msg}")
+
+    cache = AuxCache(args.aux_dir, offline=args.command == "check", log=log)
+    missing = cache.prefetch(args.scenes, args.aoi, args.iw)
+    for m in missing:
+        log("ERROR", f"missing: {m}")
+    log("INFO", f"{'All auxiliary data present' if not missing else f'{len(missing)} items missing'} in {cache.root}")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+垂直基线 pair 网络（NumPy，按景缓存）
+
+- 每景只做一次几何计算：annotation 的轨道状态矢量（phase_height.Orbit，三次 Hermite 插值）
+  对参考点（AOI 外包框中心，椭球面）求零多普勒时刻与卫星位置/速度，结果按景名缓存在 baseline_cache.json；
+  参考点或缓存版本变化时整体重算
+- pair 指标由缓存的位置向量化求得（同一轨道/帧内所有 i<j 一次计算）：
+  B = S_slave - S_master；B⊥ = B·n（n 为 master 零多普勒面内垂直于视线、指向上方的单位向量，
+  与 phase_height.sensitivity 的 B⊥ 同号），B∥ = B·l，模糊高度 HoA = λ R sinθ / (2|B⊥|)
+- 新增一景：一次 annotation 读取 + 一次零多普勒求解，pair 表只做向量运算
+- 候选：|B⊥| 在 [BPERP_MIN, BPERP_MAX]、时间基线不超过 MAX_DAYS；
+  排序分数 = |(|B⊥| - BPERP_TARGET)| / BPERP_TARGET + 天数 / MAX_DAYS（越小越好），
+  每景作为 master 最多 MAX_PER_SCENE 个 pair
+- 输出与 dsm.py --pairs 相同格式的 pair 列表（行尾 # 注释为指标）
+
+python baseline_network.py SCENE_DIR [--aoi ...] [--catalog scene_catalog.sqlite] [-o pairs.txt]
+"""
+import os
+import json
+import argparse
+import datetime
+
+import numpy as np
+
+import s1_meta
+import phase_height
+
+BPERP_MIN = 150.0
+BPERP_MAX = 400.0
+BPERP_TARGET = 250.0
+MAX_DAYS = 48
+MAX_PER_SCENE = 2
+POLARIZATION = "VV"
+CACHE_NAME = "baseline_cache.json"
+CACHE_VERSION = 1
+
+
+def reference_point(aoi=None):
+    """AOI 外包框中心（椭球面）-> (lon, lat)"""
+    x0, y0, x1, y1 = s1_meta.load_aoi_bbox(aoi)
+    return (x0 + x1) / 2.0, (y0 + y1) / 2.0
+
+
+def scene_state(geom, point):
+    """parse_geometry() 结果 + 参考点 (lon, lat) -> 缓存条目；参考点不在轨道时间范围内时返回 None"""
+    orbit = phase_height.Orbit(geom["orbit"])
+    p = phase_height.ecef(point[1], point[0], 0.0)
+    t = float(orbit.zero_doppler(p))
+    if not orbit.t[0] <= t <= orbit.t[-1]:
+        return None
+    pos, vel = orbit.at(t)
+    return {
+        "time": (phase_height.EPOCH + datetime.timedelta(seconds=t)).isoformat(),
+        "position": [float(v) for v in pos],
+        "velocity": [float(v) for v in vel],
+        "wavelength": phase_height.C / geom["radar_frequency"],
+        "swath": geom["swath"],
+    }
+
+
+def read_scene(path, point, polarization=POLARIZATION):
+    # 任一 swath 的 annotation 均可（同一景各 swath 轨道相同）；burst 子集 .SAFE 只有所选 swath
+    geoms = s1_meta.read_zip_geometry(path, polarization)
+    for sw in sorted(geoms):
+        g = geoms[sw]
+        if len(g["orbit"]) >= 2 and g["radar_frequency"]:
+            return scene_state(g, point)
+    raise ValueError(f"No orbit state vectors in {os.path.basename(path.rstrip('/'))}")
+
+
+def load_cache(path, point):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION or data.get("point") != [round(v, 6) for v in point]:
+        return {}
+    return data.get("scenes", {})
+
+
+def save_cache(path, point, scenes):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": CACHE_VERSION, "point": [round(v, 6) for v in point], "scenes": scenes}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def scene_states(paths, point, cache_path=None, polarization=POLARIZATION, log=None):
+    """各景的缓存条目 {path: state 或 None}；只读取缓存中没有的景，新增条目写回缓存"""
+    log = log or (lambda level, msg: print(f"[{level}] {msg}"))
+    cached = load_cache(cache_path, point) if cache_path else {}
+    out, added = {}, 0
+    for path in paths:
+        info = s1_meta.scene_info(path)
+        if not info:
+            continue
+        name = info["name"]
+        if name not in cached:
+            try:
+                cached[name] = read_scene(path, point, polarization)
+            except (OSError, ValueError, KeyError) as e:
+                log("WARN", f"Baseline: cannot read orbit of {name}: {e}")
+                continue
+            added += 1
+            if cached[name] is None:
+                log("WARN", f"Baseline: {name} does not cover the reference point, skipped.")
+        out[path] = cached[name]
+    if cache_path and added:
+        save_cache(cache_path, point, cached)
+    log("INFO", f"Baseline: {len(out)} scenes, {added} computed, {len(out) - added} from cache")
+    return out
+
+
+def pair_table(states, point):
+    """同一组景的 states [(path, state)]（按时间排序）-> 所有 i<j 的指标 dict(数组)，向量化"""
+    n = len(states)
+    i, j = np.triu_indices(n, 1)
+    pos = np.array([s["position"] for _, s in states], dtype=np.float64)
+    t = np.array([np.datetime64(s["time"]) for _, s in states])
+    wl = np.array([s["wavelength"] for _, s in states], dtype=np.float64)
+    p = phase_height.ecef(point[1], point[0], 0.0)
+    up = phase_height.normal(point[1], point[0])
+
+    r = np.linalg.norm(pos - p, axis=1)
+    los = (pos - p) / r[:, None]
+    cos_inc = los @ up
+    perp = up - cos_inc[:, None] * los
+    perp /= np.linalg.norm(perp, axis=1)[:, None]
+    b = pos[j] - pos[i]
+    bperp = np.einsum("ij,ij->i", b, perp[i])
+    sin_inc = np.sqrt(1 - cos_inc ** 2)
+    with np.errstate(divide="ignore"):
+        hoa = wl[i] * r[i] * sin_inc[i] / (2 * np.abs(bperp))
+    return {
+        "master": i,
+        "slave": j,
+        "bperp": bperp,
+        "bpar": np.einsum("ij,ij->i", b, los[i]),
+        "days": (t[j] - t[i]) / np.timedelta64(1, "s") / 86400.0,
+        "hoa": hoa,
+        "incidence": np.degrees(np.arccos(cos_inc[i])),
+    }
+
+
+def rank_pairs(table, bperp_min=BPERP_MIN, bperp_max=BPERP_MAX, max_days=MAX_DAYS, target=BPERP_TARGET):
+    """候选 pair 的下标（按分数升序）与分数"""
+    a = np.abs(table["bperp"])
+    ok = (a >= bperp_min) & (a <= bperp_max) & (table["days"] <= max_days + 1e-6)
+    score = np.abs(a - target) / target + table["days"] / max(max_days, 1)
+    idx = np.flatnonzero(ok)
+    idx = idx[np.argsort(score[idx], kind="stable")]
+    return idx, score
+
+
+def build_network(paths, aoi=None, tracks=None, cache_path=None, bperp_min=BPERP_MIN, bperp_max=BPERP_MAX,
+                  max_days=MAX_DAYS, max_per_scene=MAX_PER_SCENE, target=BPERP_TARGET, polarization=POLARIZATION,
+                  log=None):
+    """景路径 -> 按分数排序的 pair 列表 [dict(master, slave, bperp_m, bpar_m, days, hoa_m, incidence_deg, score)]"""
+    point = reference_point(aoi)
+    states = scene_states(paths, point, cache_path, polarization, log)
+    infos = [s1_meta.scene_info(p) for p in states if states[p] is not None]
+    pairs = []
+    for group in s1_meta.group_tracks(infos, tracks).values():
+        members = [(info["path"], states[info["path"]]) for info in group]
+        if len(members) < 2:
+            continue
+        table = pair_table(members, point)
+        idx, score = rank_pairs(table, bperp_min, bperp_max, max_days, target)
+        for k in idx:
+            pairs.append({
+                "master": members[table["master"][k]][0],
+                "slave": members[table["slave"][k]][0],
+                "bperp_m": round(float(table["bperp"][k]), 1),
+                "bpar_m": round(float(table["bpar"][k]), 1),
+                "days": round(float(table["days"][k]), 1),
+                "hoa_m": round(float(table["hoa"][k]), 1),
+                "incidence_deg": round(float(table["incidence"][k]), 2),
+                "score": round(float(score[k]), 4),
+            })
+    pairs.sort(key=lambda p: p["score"])
+    if max_per_scene:
+        used, kept = {}, []
+        for p in pairs:
+            if used.get(p["master"], 0) < max_per_scene:
+                used[p["master"]] = used.get(p["master"], 0) + 1
+                kept.append(p)
+        pairs = kept
+    return pairs
+
+
+def pair_lines(pairs):
+    # dsm.py --pairs 格式：master,slave  # 指标
+    return [f"{p['master']},{p['slave']}  # B_perp {p['bperp_m']} m, {p['days']:g} d, HoA {p['hoa_m']} m, "
+            f"score {p['score']}" for p in pairs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank Sentinel-1 DEM pairs by perpendicular and temporal baseline")
+    parser.add_argument("scene_dir", help="Directory with SLC zips / burst .SAFE directories (searched recursively)")
+    parser.add_argument("--aoi", help="AOI (GeoJSON or minLon,minLat,maxLon,maxLat); its centre is the reference point")
+    parser.add_argument("--catalog", help="scene_catalog.sqlite from slc_dl (path/frame grouping)")
+    parser.add_argument("--bperp", default=f"{BPERP_MIN:g},{BPERP_MAX:g}", help="Perpendicular baseline range in metres")
+    parser.add_argument("--target", type=float, default=BPERP_TARGET, help="Preferred perpendicular baseline in metres")
+    parser.add_argument("--max_days", type=int, default=MAX_DAYS, help="Max temporal baseline in days")
+    parser.add_argument("--max_per_scene", type=int, default=MAX_PER_SCENE, help="Max pairs per master scene (0: no limit)")
+    parser.add_argument("--polarization", default=POLARIZATION)
+    parser.add_argument("--cache", help=f"Baseline cache file (default: SCENE_DIR/{CACHE_NAME})")
+    parser.add_argument("-o", "--output", help="Write the ranked pair list here (dsm.py --pairs format)")
+    parser.add_argument("--json", help="Also write the pair metrics as JSON")
+    args = parser.parse_args()
+
+    bmin, bmax = (float(v) for v in args.bperp.split(","))
+    pairs = build_network(s1_meta.find_scenes(args.scene_dir), args.aoi, s1_meta.catalog_tracks(args.catalog),
+                          args.cache or os.path.join(args.scene_dir, CACHE_NAME), bmin, bmax, args.max_days,
+                          args.max_per_scene, args.target, args.polarization)
+    lines = pair_lines(pairs)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+    else:
+        print("\n".join(lines))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(pairs, f, indent=2)
+    print(f"[INFO] {len(pairs)} pairs with |B_perp| in [{bmin:g}, {bmax:g}] m and <= {args.max_days} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+"""
+GeoTIFF -> Cloud-Optimized GeoTIFF（numpy + 标准库，不依赖 GDAL）
+
+- TiffReader：读取 TIFF/BigTIFF（条带或分块，无压缩/LZW/DEFLATE/ZSTD，预测器 1/2/3），
+  read_window 只解码与窗口相交的块；无压缩数据直接用 memmap
+- write_cog：按行带流式读入，写出内部分块（默认 512）、DEFLATE/ZSTD + 预测器（浮点为 3）、
+  2x2 平均（忽略 nodata/NaN）逐级生成的内部概视图；GeoTIFF 地理标签原样复制
+  文件布局符合 COG：所有 IFD 在文件头部，其后是从最小概视图到全分辨率的分块数据
+- benchmark：两份文件的大小、随机窗口读取耗时与取回字节数对比
+
+python cog_export.py DEM_output.tif -o DEM_cog.tif --benchmark 200
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+TILE = 512
+COMPRESSION = "deflate"      # "deflate" | "zstd"（需要 zstandard 包）| "none"
+LEVEL = 6
+MIN_OVERVIEW = 256           # 概视图生成到长边不大于该值为止
+BIGTIFF_BYTES = 3 * 1024 ** 3  # 未压缩大小超过该值时写 BigTIFF
+
+COMPRESSION_CODES = {"none": 1, "lzw": 5, "deflate": 8, "zstd": 50000}
+GEO_TAGS = (33550, 33922, 34264, 34735, 34736, 34737, 42112, 42113)
+
+# tag 数据类型 -> (struct 格式, 字节数)
+TYPES = {1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8), 6: ("b", 1), 7: ("B", 1),
+         8: ("h", 2), 9: ("i", 4), 10: ("ii", 8), 11: ("f", 4), 12: ("d", 8), 16: ("Q", 8), 17: ("q", 8)}
+SAMPLE_KINDS = {1: "u", 2: "i", 3: "f"}
+
+
+# ---------------------- codecs ----------------------
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("ZSTD compression needs the 'zstandard' package (pip install zstandard)")
+    return zstandard
+
+
+def lzw_decode(data):
+    """TIFF LZW（MSB 优先，早变码长）"""
+    out = bytearray()
+    table = [bytes([i]) for i in range(256)] + [b"", b""]
+    bits, nbits, width, prev = 0, 0, 9, None
+    for byte in data:
+        bits = (bits << 8) | byte
+        nbits += 8
+        while nbits >= width:
+            nbits -= width
+            code = bits >> nbits
+            bits &= (1 << nbits) - 1
+            if code == 257:
+                return bytes(out)
+            if code == 256:
+                table = table[:258]
+                width, prev = 9, None
+                continue
+            if prev is None:
+                entry = table[code]
+            elif code < len(table):
+                entry = table[code]
+                table.append(prev + entry[:1])
+            else:
+                entry = prev + prev[:1]
+                table.append(entry)
+            out += entry
+            prev = entry
+            if len(table) + 1 >= (1 << width) and width < 12:
+                width += 1
+    return bytes(out)
+
+
+def decompress(data, compression):
+    if compression == 1:
+        return data
+    if compression in (8, 32946):
+        return zlib.decompress(data)
+    if compression == 5:
+        return lzw_decode(data)
+    if compression == 50000:
+        return _zstd().ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unsupported TIFF compression {compression}")
+
+
+def compress(data, compression, level=LEVEL):
+    if compression == 1:
+        return data
+    if compression == 8:
+        return zlib.compress(data, level)
+    if compression == 50000:
+        return _zstd().ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unsupported output compression {compression}")
+
+
+def predict(block, predictor):
+    """(h, w, spp) -> 编码后的字节；3 为浮点预测器（字节平面重排 + 水平差分），2 为水平差分"""
+    h, w, spp = block.shape
+    if predictor == 3:
+        size = block.dtype.itemsize
+        planes = block.astype(block.dtype.newbyteorder(">")).view(np.uint8).reshape(h, w * spp, size)
+        row = planes.transpose(0, 2, 1).reshape(h, size * w * spp)
+        out = row.copy()
+        out[:, spp:] -= row[:, :-spp]
+        return out.tobytes()
+    if predictor == 2:
+        out = block.copy()
+        out[:, 1:] -= block[:, :-1]
+        return out.tobytes()
+    return np.ascontiguousarray(block).tobytes()
+
+
+def unpredict(buf, predictor, shape, dtype):
+    """predict 的逆过程；dtype 带字节序"""
+    h, w, spp = shape
+    if predictor == 3:
+        size = dtype.itemsize
+        row = np.frombuffer(buf, np.uint8)[:h * w * spp * size].reshape(h, w * spp * size)
+        row = np.cumsum(row.reshape(h, -1, spp), axis=1, dtype=np.uint8).reshape(h, size, w * spp)
+        return row.transpose(0, 2, 1).copy().view(dtype.newbyteorder(">")).reshape(h, w, spp)
+    arr = np.frombuffer(buf, dtype)[:h * w * spp].reshape(h, w, spp)
+    if predictor == 2:
+        arr = np.cumsum(arr, axis=1, dtype=arr.dtype)
+    return arr
+
+
+# ---------------------- reader ----------------------
+class TiffReader:
+    """TIFF/BigTIFF 第 index 个 IFD（0 为全分辨率）；read_window 返回 (h, w, spp)"""
+
+    def __init__(self, path, index=0):
+        self.path = path
+        self.f = open(path, "rb")
+        head = self.f.read(16)
+        self.bo = {b"II": "<", b"MM": ">"}[head[:2]]
+        magic = struct.unpack(self.bo + "H", head[2:4])[0]
+        self.big = magic == 43
+        if self.big:
+            offset = struct.unpack(self.bo + "Q", head[8:16])[0]
+        elif magic == 42:
+            offset = struct.unpack(self.bo + "I", head[4:8])[0]
+        else:
+            raise ValueError(f"Not a TIFF file: {path}")
+        for _ in range(index + 1):
+            if not offset:
+                raise IndexError(f"{path} has no IFD {index}")
+            self.tags, offset = self._read_ifd(offset)
+        self._parse()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_ifd(self, offset):
+        cnt_fmt, ent_size, off_fmt = ("Q", 20, "Q") if self.big else ("H", 12, "I")
+        self.f.seek(offset)
+        count = struct.unpack(self.bo + cnt_fmt, self.f.read(struct.calcsize(cnt_fmt)))[0]
+        raw = self.f.read(count * ent_size + struct.calcsize(off_fmt))
+        tags = {}
+        inline = 8 if self.big else 4
+        for i in range(count):
+            ent = raw[i * ent_size:(i + 1) * ent_size]
+            tag, typ = struct.unpack(self.bo + "HH", ent[:4])
+            n = struct.unpack(self.bo + off_fmt, ent[4:4 + struct.calcsize(off_fmt)])[0]
+            if typ not in TYPES:
+                continue
+            fmt, size = TYPES[typ]
+            data = ent[ent_size - inline:]
+            if n * size > inline:
+                pos = struct.unpack(self.bo + off_fmt, data)[0]
+                here = self.f.tell()
+                self.f.seek(pos)
+                data = self.f.read(n * size)
+                self.f.seek(here)
+            data = data[:n * size]
+            if typ == 2:
+                tags[tag] = (typ, data.rstrip(b"\0").decode("latin-1"))
+            else:
+                tags[tag] = (typ, list(struct.unpack(self.bo + fmt * n, data)))
+        nxt = struct.unpack(self.bo + off_fmt, raw[count * ent_size:])[0]
+        return tags, nxt
+
+    def tag(self, code, default=None):
+        if code not in self.tags:
+            return default
+        value = self.tags[code][1]
+        return value[0] if isinstance(value, list) and len(value) == 1 else value
+
+    def _parse(self):
+        self.width = self.tag(256)
+        self.height = self.tag(257)
+        self.spp = self.tag(277, 1)
+        bits = self.tag(258, 8)
+        bits = bits[0] if isinstance(bits, list) else bits
+        kind = self.tag(339, 1)
+        kind = kind[0] if isinstance(kind, list) else kind
+        self.dtype = np.dtype(f"{SAMPLE_KINDS[kind]}{bits // 8}").newbyteorder(self.bo)
+        self.compression = self.tag(259, 1)
+        self.predictor = self.tag(317, 1)
+        self.planar = self.tag(284, 1)
+        if 322 in self.tags:
+            self.block = (self.tag(323), self.tag(322))
+            offsets, counts = self.tags[324][1], self.tags[325][1]
+        else:
+            self.block = (min(self.tag(278, self.height), self.height), self.width)
+            offsets, counts = self.tags[273][1], self.tags[279][1]
+        self.offsets, self.counts = list(offsets), list(counts)
+        self._last = None
+        self.nodata = None
+        if 42113 in self.tags:
+            try:
+                self.nodata = float(self.tags[42113][1])
+            except ValueError:
+                pass
+
+    def geo_tags(self):
+        return {t: self.tags[t] for t in GEO_TAGS if t in self.tags}
+
+    def _chunk(self, index, rows, spp):
+        # 分块总是完整的 bh 行；最后一个条带只有 rows 行
+        shape = (self.block[0] if 322 in self.tags else rows, self.block[1], spp)
+        if self.compression == 1 and self.predictor == 1:
+            # 无压缩：直接映射，只有被切片的部分会从磁盘读入
+            return np.memmap(self.f, dtype=self.dtype, mode="r", offset=self.offsets[index], shape=shape)
+        self.f.seek(self.offsets[index])
+        buf = decompress(self.f.read(self.counts[index]), self.compression)
+        return unpredict(buf, self.predictor, shape, self.dtype)
+
+    def _chunks(self, y0, x0, h, w):
+        # 与窗口相交的条带/分块：(index, plane, by, bx, rows)
+        bh, bw = self.block
+        planes = self.spp if self.planar == 2 else 1
+        across = -(-self.width // bw)
+        down = -(-self.height // bh)
+        for plane in range(planes):
+            for by in range(y0 // bh, (y0 + h - 1) // bh + 1):
+                rows = min(bh, self.height - by * bh)
+                for bx in range(x0 // bw, (x0 + w - 1) // bw + 1):
+                    yield plane * across * down + by * across + bx, plane, by, bx, rows
+
+    def window_bytes(self, y0, x0, h, w):
+        """读取窗口需要取回的字节数（按整块计，即 HTTP Range 读取的数据量）"""
+        return sum(self.counts[c[0]] for c in self._chunks(y0, x0, h, w))
+
+    def read_window(self, y0, x0, h, w):
+        bh, bw = self.block
+        spp_chunk = 1 if self.planar == 2 else self.spp
+        out = np.empty((h, w, self.spp), dtype=self.dtype.newbyteorder("="))
+        for index, plane, by, bx, rows in self._chunks(y0, x0, h, w):
+            if self._last is not None and self._last[0] == index:
+                chunk = self._last[1]
+            else:
+                chunk = self._chunk(index, rows, spp_chunk)
+                # 按行带顺序读取时，一个条带常被相邻的窗口重复用到
+                self._last = (index, chunk)
+            cy0, cx0 = max(y0, by * bh), max(x0, bx * bw)
+            cy1, cx1 = min(y0 + h, by * bh + rows), min(x0 + w, bx * bw + bw, self.width)
+            sub = chunk[cy0 - by * bh:cy1 - by * bh, cx0 - bx * bw:cx1 - bx * bw]
+            if self.planar == 2:
+                out[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0, plane] = sub[..., 0]
+            else:
+                out[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = sub
+        return out
+
+    def iter_rows(self, rows):
+        """按行带遍历：yield (y0, (n, width, spp))"""
+        for y0 in range(0, self.height, rows):
+            yield y0, self.read_window(y0, 0, min(rows, self.height - y0), self.width)
+
+
+# ---------------------- writer ----------------------
+class ArraySource:
+    """write_cog 的数组数据源：arr 为 (h, w) 或 (h, w, spp)，可以是 memmap"""
+
+    def __init__(self, arr, geo_tags=None, nodata=None):
+        self.arr = arr if arr.ndim == 3 else arr[..., None]
+        self.height, self.width, self.spp = self.arr.shape
+        self.dtype = self.arr.dtype
+        self.nodata = nodata
+        self._geo = dict(geo_tags or {})
+        if nodata is not None:
+            self._geo[42113] = (2, f"{nodata:g}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def geo_tags(self):
+        return self._geo
+
+    def iter_rows(self, rows):
+        for y0 in range(0, self.height, rows):
+            yield y0, np.asarray(self.arr[y0:y0 + rows])
+
+
+def geographic_tags(lon0, lat0, res_x, res_y):
+    """EPSG:4326 的 GeoTIFF 标签；(lon0, lat0) 为左上角像元的左上角"""
+    return {
+        33550: (12, [res_x, res_y, 0.0]),
+        33922: (12, [0.0, 0.0, 0.0, lon0, lat0, 0.0]),
+        # GTModelType=Geographic, GTRasterType=PixelIsArea, GeographicType=WGS84
+        34735: (3, [1, 1, 0, 3, 1024, 0, 1, 2, 1025, 0, 1, 1, 2048, 0, 1, 4326]),
+    }
+
+
+def _downsample(rows, nodata):
+    """(2k, w, spp) -> (k, ceil(w/2), spp)，2x2 平均；浮点时忽略 nodata/NaN"""
+    if rows.shape[1] % 2:
+        rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+    n, w, spp = rows.shape
+    quad = rows.reshape(n // 2, 2, w // 2, 2, spp).astype(np.float64)
+    if rows.dtype.kind != "f":
+        return quad.mean(axis=(1, 3)).round().astype(rows.dtype)
+    if nodata is not None and not np.isnan(nodata):
+        quad[quad == nodata] = np.nan
+    valid = np.isfinite(quad)
+    count = valid.sum(axis=(1, 3))
+    total = np.where(valid, quad, 0.0).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    mean[count == 0] = np.nan if nodata is None else nodata
+    return mean.astype(rows.dtype)
+
+
+class _Level:
+    """一个分辨率层：累积行 -> 编码整行分块写入临时文件；同时把成对的行降采样交给下一层"""
+
+    def __init__(self, width, height, spp, dtype, tile, compression, predictor, level, nodata, spool, nxt=None):
+        self.width, self.height, self.spp, self.dtype = width, height, spp, dtype
+        self.tile, self.compression, self.predictor, self.level = tile, compression, predictor, level
+        self.nodata, self.spool, self.next = nodata, spool, nxt
+        self.fill = 0 if nodata is None else nodata
+        self.buf = np.empty((0, width, spp), dtype=dtype)
+        self.odd = None
+        self.rows_done = 0
+        self.counts = []
+
+    def push(self, rows):
+        self.buf = np.concatenate([self.buf, rows]) if len(self.buf) else rows
+        while len(self.buf) >= self.tile:
+            self._emit(self.buf[:self.tile])
+            self.buf = self.buf[self.tile:]
+        if self.next is not None:
+            if self.odd is not None:
+                rows = np.concatenate([self.odd, rows])
+                self.odd = None
+            if len(rows) % 2:
+                rows, self.odd = rows[:-1], rows[-1:]
+            if len(rows):
+                self.next.push(_downsample(rows, self.nodata))
+
+    def finish(self):
+        if len(self.buf):
+            self._emit(self.buf)
+        if self.next is not None:
+            if self.odd is not None:
+                self.next.push(_downsample(np.concatenate([self.odd, self.odd]), self.nodata))
+            self.next.finish()
+
+    def _emit(self, rows):
+        t = self.tile
+        block = np.full((t, -(-self.width // t) * t, self.spp), self.fill, dtype=self.dtype)
+        block[:len(rows), :self.width] = rows
+        for x0 in range(0, self.width, t):
+            data = compress(predict(block[:, x0:x0 + t], self.predictor), self.compression)
+            self.spool.write(data)
+            self.counts.append(len(data))
+        self.rows_done += len(rows)
+
+
+def _entry_value(bo, typ, values):
+    fmt, size = TYPES[typ]
+    if typ == 2:
+        data = values.encode("latin-1") + b"\0"
+        return data, len(data)
+    return struct.pack(bo + fmt * len(values), *values), len(values)
+
+
+def _ifd_bytes(start, tags, big, bo="<"):
+    """一个 IFD（含其溢出数据）的字节；start 为 IFD 在文件中的偏移，下一 IFD 偏移稍后填写"""
+    cnt_fmt, ent_size, off_fmt, inline = ("Q", 20, "Q", 8) if big else ("H", 12, "I", 4)
+    n = len(tags)
+    head = struct.calcsize(cnt_fmt) + n * ent_size + struct.calcsize(off_fmt)
+    entries, extra = [], b""
+    for code in sorted(tags):
+        typ, values = tags[code]
+        data, count = _entry_value(bo, typ, values)
+        if len(data) <= inline:
+            field = data.ljust(inline, b"\0")
+        else:
+            pos = start + head + len(extra)
+            field = struct.pack(bo + off_fmt, pos)
+            extra += data + (b"\0" if len(data) % 2 else b"")
+        entries.append(struct.pack(bo + "HH" + off_fmt, code, typ, count) + field)
+    body = struct.pack(bo + cnt_fmt, n) + b"".join(entries)
+    return body, struct.pack(bo + off_fmt, 0), extra
+
+
+def write_cog(src_path, dst_path, tile=TILE, compression=COMPRESSION, level=LEVEL, bands=None, log=None,
+              overviews=True):
+    """src GeoTIFF（或 ArraySource）-> COG；bands 为要保留的波段下标（默认全部）。返回写出的概视图层数"""
+    codec = COMPRESSION_CODES[compression]
+    with TiffReader(src_path) if isinstance(src_path, str) else src_path as src:
+        spp = len(bands) if bands else src.spp
+        dtype = src.dtype.newbyteorder("=")
+        predictor = 1 if codec == 1 else (3 if dtype.kind == "f" else 2)
+        sizes = [(src.width, src.height)]
+        while overviews and max(sizes[-1]) > max(MIN_OVERVIEW, tile // 2) and min(sizes[-1]) > 1:
+            w, h = sizes[-1]
+            sizes.append((-(-w // 2), -(-h // 2)))
+        big = src.width * src.height * spp * dtype.itemsize * 4 // 3 > BIGTIFF_BYTES
+        if log:
+            log("INFO", f"COG {src.width}x{src.height}x{spp} {dtype.name}: tile {tile}, {compression}, "
+                        f"predictor {predictor}, {len(sizes) - 1} overviews{', BigTIFF' if big else ''}")
+
+        tmp_dir = tempfile.mkdtemp(prefix=".cog-", dir=os.path.dirname(os.path.abspath(dst_path)))
+        try:
+            spools = [open(os.path.join(tmp_dir, f"level{i}"), "w+b") for i in range(len(sizes))]
+            levels = None
+            for i in reversed(range(len(sizes))):
+                w, h = sizes[i]
+                levels = _Level(w, h, spp, dtype, tile, codec, predictor, i, src.nodata, spools[i], levels)
+            top = levels
+            for _, rows in src.iter_rows(tile):
+                if bands:
+                    rows = rows[..., bands]
+                top.push(np.ascontiguousarray(rows, dtype=dtype))
+            top.finish()
+            counts = []
+            lvl = top
+            while lvl is not None:
+                counts.append(lvl.counts)
+                lvl = lvl.next
+            _assemble(dst_path, spools, counts, sizes, spp, dtype, tile, codec, predictor, src.geo_tags(), big)
+            for sp in spools:
+                sp.close()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return len(sizes) - 1
+
+
+def _assemble(dst_path, spools, counts, sizes, spp, dtype, tile, codec, predictor, geo, big):
+    # IFD 全部在前（全分辨率在最前），数据从最小概视图到全分辨率依次写入，最后回填 TileOffsets
+    bo = "<"
+    off_type = 16 if big else 4
+    kind = {"u": 1, "i": 2, "f": 3}[dtype.kind]
+
+    def tags_for(i, offsets):
+        w, h = sizes[i]
+        t = {
+            254: (4, [0 if i == 0 else 1]),
+            256: (4, [w]), 257: (4, [h]),
+            258: (3, [dtype.itemsize * 8] * spp),
+            259: (3, [codec]),
+            262: (3, [1]),
+            277: (3, [spp]),
+            284: (3, [1]),
+            322: (3, [tile]), 323: (3, [tile]),
+            324: (off_type, offsets),
+            325: (off_type, counts[i]),
+            339: (3, [kind] * spp),
+        }
+        if predictor != 1:
+            t[317] = (3, [predictor])
+        if spp > 1:
+            t[338] = (3, [0] * (spp - 1))
+        for code in geo if i == 0 else (42113,) if 42113 in geo else ():
+            typ, value = geo[code]
+            t[code] = (typ, value)
+        return t
+
+    def layout(all_offsets):
+        pos = 16 if big else 8
+        blobs = []
+        for i in range(len(sizes)):
+            body, nxt, extra = _ifd_bytes(pos, tags_for(i, all_offsets[i]), big, bo)
+            blobs.append([pos, body, nxt, extra])
+            pos += len(body) + len(nxt) + len(extra)
+        for i in range(len(blobs) - 1):
+            blobs[i][2] = struct.pack(bo + ("Q" if big else "I"), blobs[i + 1][0])
+        return blobs, pos
+
+    zero = [[0] * len(c) for c in counts]
+    blobs, data_start = layout(zero)
+    offsets = [None] * len(sizes)
+    pos = data_start
+    for i in reversed(range(len(sizes))):
+        offsets[i] = []
+        for c in counts[i]:
+            offsets[i].append(pos)
+            pos += c
+    blobs, end = layout(offsets)
+    assert end == data_start
+    with open(dst_path + ".tmp", "wb") as f:
+        if big:
+            f.write(struct.pack(bo + "2sHHHQ", b"II", 43, 8, 0, blobs[0][0]))
+        else:
+            f.write(struct.pack(bo + "2sHI", b"II", 42, blobs[0][0]))
+        for _, body, nxt, extra in blobs:
+            f.write(body + nxt + extra)
+        for i in reversed(range(len(sizes))):
+            spools[i].seek(0)
+            shutil.copyfileobj(spools[i], f, 16 * 1024 * 1024)
+    os.replace(dst_path + ".tmp", dst_path)
+
+
+# ---------------------- benchmark ----------------------
+def time_windows(path, windows, size):
+    """平均每个窗口的 (读取耗时 ms, 取回字节数)"""
+    with TiffReader(path) as r:
+        nbytes = sum(r.window_bytes(y, x, min(size, r.height - y), min(size, r.width - x)) for y, x in windows)
+        t0 = time.perf_counter()
+        for y, x in windows:
+            r._last = None
+            r.read_window(y, x, min(size, r.height - y), min(size, r.width - x))
+        n = max(len(windows), 1)
+        return (time.perf_counter() - t0) * 1000 / n, nbytes / n
+
+
+def benchmark(src_path, cog_path, n=100, size=256, seed=0):
+    """文件大小、随机 size x size 窗口的平均读取耗时与取回字节数
+
+    本地文件的耗时包含页缓存的影响；取回字节数对应远程 Range 读取的数据量
+    """
+    with TiffReader(src_path) as r:
+        height, width = r.height, r.width
+    rng = np.random.RandomState(seed)
+    windows = list(zip(rng.randint(0, max(1, height - size), n), rng.randint(0, max(1, width - size), n)))
+    src_ms, src_bytes = time_windows(src_path, windows, size)
+    cog_ms, cog_bytes = time_windows(cog_path, windows, size)
+    src_mb, cog_mb = os.path.getsize(src_path) / 1024 ** 2, os.path.getsize(cog_path) / 1024 ** 2
+    return {
+        "source": src_path, "cog": cog_path, "windows": n, "window_px": size,
+        "source_mb": round(src_mb, 2), "cog_mb": round(cog_mb, 2),
+        "size_ratio": round(cog_mb / src_mb, 4) if src_mb else None,
+        "source_window_ms": round(src_ms, 3), "cog_window_ms": round(cog_ms, 3),
+        "source_window_kb": round(src_bytes / 1024, 1), "cog_window_kb": round(cog_bytes / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GeoTIFF -> Cloud-Optimized GeoTIFF")
+    parser.add_argument("src", help="Input GeoTIFF / BigTIFF (e.g. DEM_output.tif)")
+    parser.add_argument("-o", "--output", help="Output COG (default: <src>_cog.tif)")
+    parser.add_argument("--tile", type=int, default=TILE, help="Internal tile size (px)")
+    parser.add_argument("--compression", choices=["deflate", "zstd", "none"], default=COMPRESSION)
+    parser.add_argument("--level", type=int, default=LEVEL, help="Compression level")
+    parser.add_argument("--bands", type=str, help="Comma-separated band indices to keep (default: all)")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Time N random 256x256 window reads on both files")
+    args = parser.parse_args()
+    dst = args.output or os.path.splitext(args.src)[0] + "_cog.tif"
+    bands = [int(b) for b in args.bands.split(",")] if args.bands else None
+
+    def log(level, msg):
+        print(f"[{level}] {msg}")
+
+    t0 = time.perf_counter()
+    write_cog(args.src, dst, args.tile, args.compression, args.level, bands, log)
+    log("INFO", f"COG written: {dst} ({time.perf_counter() - t0:.1f}s)")
+    if args.benchmark:
+        result = benchmark(args.src, dst, args.benchmark)
+        print(json.dumps(result, indent=2))
+        with open(os.path.splitext(dst)[0] + "_benchmark.json", "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+解缠前的相干性质量门限（NumPy）
+
+- 步骤 8 之后、解缠之前运行：每 STEP 行读一行 coh 波段，行内每 STEP 个像元取一个。
+  只统计落在 AOI 多边形内的像元（经纬度取自 tie-point grid），无数据（0/NaN）不计
+- 指标：均值、中位数、分位数，以及 γ ≥ PIXEL_COHERENCE 的像元比例
+- 均值低于 MIN_MEAN，或高相干比例低于 MIN_FRACTION 时判为不可用。
+  MODE="skip" 时该 pair 停止（抛出 LowCoherenceError，不做解缠/Deburst/TC），"flag" 时只告警，"off" 不检查
+- 判定、指标与阈值写入 output_dir/coherence_gate.json
+"""
+import json
+
+import numpy as np
+
+MODE = "skip"              # "off" / "flag" / "skip"
+STEP = 8                   # 抽稀步长（行、列）
+MIN_MEAN = 0.25            # AOI 内平均相干性下限
+PIXEL_COHERENCE = 0.3      # 单像元"可用"的相干性
+MIN_FRACTION = 0.2         # γ ≥ PIXEL_COHERENCE 的像元比例下限
+MIN_SAMPLES = 100          # 样本少于此数时不做判定（按通过处理）
+REPORT = "coherence_gate.json"
+EXIT_SKIPPED = 3           # 单 pair 模式下 pair 被门限跳过时的退出码（1 为失败，2 为 argparse 参数错误）
+
+
+class LowCoherenceError(RuntimeError):
+    """相干性门限判为不可用、pair 被跳过"""
+
+
+def points_in_polygons(lon, lat, polygons):
+    """射线法（奇偶规则，洞自然排除）：lon/lat 同形状数组 -> 布尔数组；polygons 同 s1_meta.load_aoi_polygons()"""
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    inside = np.zeros(lon.shape, dtype=bool)
+    for poly in polygons:
+        hit = np.zeros(lon.shape, dtype=bool)
+        for ring in poly:
+            ring = np.asarray(ring, dtype=np.float64)
+            x0, y0 = ring[:, 0], ring[:, 1]
+            x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+            for ax, ay, bx, by in zip(x0, y0, x1, y1):
+                if ay == by:
+                    continue
+                crosses = (ay > lat) != (by > lat)
+                x = ax + (lat - ay) * (bx - ax) / (by - ay)
+                hit ^= crosses & (lon < x)
+        inside |= hit
+    return inside
+
+
+def sample(read_row, height, width, step=STEP, read_lonlat=None, polygons=None):
+    """抽稀采样：read_row(y) -> coh 行 (width,)；read_lonlat(y) -> (lon, lat) 行或 None
+
+    返回 (AOI 内的有效相干值, AOI 内的采样点数, 是否按 AOI 筛选)
+    """
+    step = max(1, int(step))
+    cols = np.arange(step // 2, width, step)
+    values, in_aoi = [], 0
+    use_aoi = read_lonlat is not None and polygons is not None
+    for y in range(step // 2, height, step):
+        coh = np.asarray(read_row(y))[cols]
+        if use_aoi:
+            lon, lat = read_lonlat(y)
+            mask = points_in_polygons(np.asarray(lon)[cols], np.asarray(lat)[cols], polygons)
+            coh = coh[mask]
+        in_aoi += coh.size
+        coh = coh[np.isfinite(coh) & (coh > 0)]
+        values.append(coh.astype(np.float32))
+    values = np.concatenate(values) if values else np.zeros(0, np.float32)
+    return values, in_aoi, use_aoi
+
+
+def statistics(values, in_aoi, pixel_coherence=PIXEL_COHERENCE):
+    """相干值样本 -> 指标 dict（无样本时数值为 None）"""
+    stats = {"samples": int(values.size), "aoi_samples": int(in_aoi),
+             "valid_fraction": round(values.size / in_aoi, 4) if in_aoi else 0.0}
+    if values.size == 0:
+        stats.update({"mean": None, "median": None, "p10": None, "p90": None, "coherent_fraction": None})
+        return stats
+    v = values.astype(np.float64)
+    p10, p50, p90 = np.percentile(v, [10, 50, 90])
+    stats.update({
+        "mean": round(float(v.mean()), 4),
+        "median": round(float(p50), 4),
+        "p10": round(float(p10), 4),
+        "p90": round(float(p90), 4),
+        "coherent_fraction": round(float(np.count_nonzero(v >= pixel_coherence)) / v.size, 4),
+    })
+    return stats
+
+
+def decide(stats, min_mean=MIN_MEAN, min_fraction=MIN_FRACTION, min_samples=MIN_SAMPLES):
+    """指标 -> (是否可用, 原因列表)；样本不足时视为可用（无法判断）"""
+    if stats["samples"] < min_samples:
+        return True, [f"only {stats['samples']} valid samples (< {min_samples}), not judged"]
+    reasons = []
+    if stats["mean"] < min_mean:
+        reasons.append(f"mean coherence {stats['mean']:.3f} < {min_mean}")
+    if stats["coherent_fraction"] < min_fraction:
+        reasons.append(f"coherent fraction {stats['coherent_fraction']:.1%} < {min_fraction:.0%}")
+    return not reasons, reasons
+
+
+def evaluate(read_row, height, width, read_lonlat=None, polygons=None, mode=MODE, step=STEP,
+             min_mean=MIN_MEAN, pixel_coherence=PIXEL_COHERENCE, min_fraction=MIN_FRACTION,
+             min_samples=MIN_SAMPLES):
+    """采样 + 统计 + 判定 -> 报告 dict；decision 为 "pass" / "flag"（不可用但继续）/ "skip" """
+    values, in_aoi, use_aoi = sample(read_row, height, width, step, read_lonlat, polygons)
+    stats = statistics(values, in_aoi, pixel_coherence)
+    usable, reasons = decide(stats, min_mean, min_fraction, min_samples)
+    return {
+        "decision": "pass" if usable else ("skip" if mode == "skip" else "flag"),
+        "reasons": reasons,
+        "metrics": stats,
+        "aoi_filtered": use_aoi,
+        "thresholds": {"mode": mode, "step": step, "min_mean": min_mean, "pixel_coherence": pixel_coherence,
+                       "min_fraction": min_fraction, "min_samples": min_samples},
+        "raster": [width, height],
+    }
+
+
+def write_report(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""
+多 pair DEM 融合（相干性加权、粗差剔除、分块流式、可增量更新）
+
+输入：各 pair 的 Terrain-Correction 输出 DEM_output.tif（height 波段 + coh_ 波段；波段名取自 SNAP 写在
+GeoTIFF 中的 DIMAP 头，或同目录的 ifg_deb_TC.dim），可以给 pair 目录、tif 文件或批处理输出根目录。
+- 公共网格：--aoi 外包框或全部输入的并集，分辨率取输入中最细的，原点对齐到分辨率的整数倍；
+  输入按最近邻取样，网格不必完全一致（dsm.py --align_grid 时各 pair 的 TC 网格本身就对齐）
+- 权重：相位方差的倒数 2γ²/(1-γ²)（γ < MIN_COHERENCE 的像元不用），乘以 pair 权重 (HOA_REF / 模糊高度)²
+  （模糊高度来自 pair 目录的 height/height_model.json）
+- 每个输出块：逐层读取与块相交的窗口（任何时候只有一层在内存中，内存与叠加层数无关）
+  1. 样本的均值/标准差（确定直方图范围）；2. 每像元 HIST_BINS 个箱的样本数直方图 -> 中位数与 IQR 稳健标准差；
+  3. 与中位数之差不超过 OUTLIER_K·σ（限制在 [MIN_TOLERANCE_M, MAX_TOLERANCE_M]）的样本累加加权和
+  mean 输出第 3 步的加权均值，median 输出保留样本的加权中位数（再读一遍，加权直方图）
+- 输出块在线程池中并行（块之间互不相交，直接写入 memmap）
+- 增量更新：fusion_state/ 中保存第 3 步的累加量（Σw, Σwh, Σwh², n）与已融合输入的清单；
+  新增输入只读一次，与当前融合结果比较剔除粗差后累加（mean）；已有输入变化、网格/参数变化或 median 时整体重算。
+  增量结果只是整体重算的近似：剔除标准用当前的加权均值与标准差，而不是全体样本的中位数与 IQR，
+  已累加的样本也不会因新输入而被重新剔除（合成的 6 个 pair 叠加上与整体重算相差可达约 3 m）；
+  需要与整体重算一致时用 --rebuild
+- 输出 DSM_fused.tif（高程，COG）与 DSM_fused_quality.tif（加权标准差、样本数、权重和）
+
+python dem_fusion.py output_root/ -o fused/ --method mean --workers 4
+"""
+import os
+import re
+import sys
+import json
+import math
+import glob
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import envi_io
+import cog_export
+import s1_meta
+
+METHOD = "mean"          # "mean"（粗差剔除后的加权均值）| "median"（加权中位数）
+TILE = 256
+WORKERS = 2
+HIST_BINS = 64
+HIST_SIGMA = 4.0         # 直方图范围：均值 ± HIST_SIGMA·σ（范围外的样本计入两端的箱，不改变中位数）
+OUTLIER_K = 3.0
+MIN_TOLERANCE_M = 2.0    # 剔除阈值下限（米）
+MAX_TOLERANCE_M = 30.0   # 剔除阈值上限：解缠错误是模糊高度（几十米以上）的整数倍，多个粗差使 IQR 变大时也能剔除
+MIN_COHERENCE = 0.3
+MAX_COHERENCE = 0.99     # 权重 2γ²/(1-γ²) 在 γ→1 时发散
+HOA_REF = 100.0          # pair 权重 (HOA_REF / 模糊高度)²
+NODATA = -32768.0
+INPUT_NODATA = (0.0, -32768.0)   # TC 在足迹以外填 0；phase_height 的无效值
+STATE_DIR = "fusion_state"
+STATE_NAME = "fusion.json"
+SUMS = ("sum_w", "sum_wh", "sum_whh", "count")
+OUTPUTS = ("height", "std", "count", "weight")
+
+
+# ---------------------- inputs ----------------------
+def band_names(tif_path):
+    """DEM_output.tif 的波段名：GeoTIFF 中的 DIMAP 头（tag 65000），否则同目录的 ifg_deb_TC.dim"""
+    with cog_export.TiffReader(tif_path) as r:
+        xml = r.tag(65000)
+    if not isinstance(xml, str):
+        dim = os.path.join(os.path.dirname(tif_path), "ifg_deb_TC.dim")
+        xml = open(dim, "r", encoding="utf-8", errors="replace").read() if os.path.exists(dim) else ""
+    names = {}
+    for block in re.findall(r"<Spectral_Band_Info>(.*?)</Spectral_Band_Info>", xml, re.S):
+        index = re.search(r"<BAND_INDEX>\s*(\d+)\s*</BAND_INDEX>", block)
+        name = re.search(r"<BAND_NAME>\s*(.*?)\s*</BAND_NAME>", block)
+        if index and name:
+            names[int(index.group(1))] = name.group(1)
+    return [names[i] for i in sorted(names)]
+
+
+def raster_grid(reader):
+    """(lon0, lat0, res_x, res_y, width, height)，(lon0, lat0) 为左上角像元的左上角"""
+    scale = reader.tag(33550)
+    tie = reader.tag(33922)
+    if not scale or not tie:
+        raise ValueError(f"{reader.path} has no GeoTIFF georeferencing")
+    res_x, res_y = float(scale[0]), float(scale[1])
+    return (float(tie[3]) - float(tie[0]) * res_x, float(tie[4]) + float(tie[1]) * res_y,
+            res_x, res_y, reader.width, reader.height)
+
+
+def find_inputs(paths):
+    """pair 目录 / tif 文件 / 批处理根目录（其下的 */DEM_output.tif）-> tif 路径列表（去重、排序）"""
+    found = []
+    for p in paths:
+        if os.path.isfile(p):
+            found.append(p)
+        elif os.path.isfile(os.path.join(p, "DEM_output.tif")):
+            found.append(os.path.join(p, "DEM_output.tif"))
+        else:
+            found.extend(glob.glob(os.path.join(p, "*", "DEM_output.tif")))
+    return sorted({os.path.abspath(p) for p in found})
+
+
+def describe_input(tif_path):
+    """单个输入的波段、网格、pair 权重与签名（大小 + 修改时间，用于判断是否变化）"""
+    names = band_names(tif_path)
+    height_band = names.index("height") if "height" in names else None
+    coh_band = next((i for i, n in enumerate(names) if n.startswith("coh")), None)
+    if height_band is None:
+        raise ValueError(f"No 'height' band in {tif_path} (bands: {names}); run with --phase_to_height")
+    with cog_export.TiffReader(tif_path) as r:
+        grid = raster_grid(r)
+        nodata = r.nodata
+    hoa = None
+    model = os.path.join(os.path.dirname(tif_path), "height", "height_model.json")
+    if os.path.exists(model):
+        with open(model, "r") as f:
+            hoa = (json.load(f).get("geometry") or {}).get("height_of_ambiguity_m")
+    st = os.stat(tif_path)
+    return {
+        "path": tif_path,
+        "height_band": height_band,
+        "coh_band": coh_band,
+        "nodata": nodata,
+        "grid": list(grid),
+        "height_of_ambiguity_m": hoa,
+        "weight": (HOA_REF / hoa) ** 2 if hoa else 1.0,
+        "signature": [st.st_size, int(st.st_mtime)],
+    }
+
+
+def output_grid(inputs, aoi=None, resolution=None):
+    """公共网格：AOI 外包框（或全部输入的并集），分辨率默认取输入中最细的，原点对齐到分辨率的整数倍"""
+    res = resolution or min(min(i["grid"][2], i["grid"][3]) for i in inputs)
+    if aoi is not None:
+        west, south, east, north = s1_meta.load_aoi_bbox(aoi)
+    else:
+        west = min(i["grid"][0] for i in inputs)
+        north = max(i["grid"][1] for i in inputs)
+        east = max(i["grid"][0] + i["grid"][2] * i["grid"][4] for i in inputs)
+        south = min(i["grid"][1] - i["grid"][3] * i["grid"][5] for i in inputs)
+    lon0, lat0 = math.floor(west / res) * res, math.ceil(north / res) * res
+    width = max(1, int(math.ceil((east - lon0) / res - 1e-9)))
+    height = max(1, int(math.ceil((lat0 - south) / res - 1e-9)))
+    return [lon0, lat0, res, res, width, height]
+
+
+def tiles(height, width, tile=TILE):
+    for y0 in range(0, height, tile):
+        for x0 in range(0, width, tile):
+            yield y0, x0, min(tile, height - y0), min(tile, width - x0)
+
+
+# ---------------------- per-tile reading ----------------------
+class LayerReader:
+    """一个输入在输出块上的最近邻取样；每个线程各自打开文件（TiffReader 不是线程安全的）
+
+    各线程的文件在整个融合过程中保持打开，全部块处理完后由 close() 统一关闭
+    """
+
+    def __init__(self, info, grid):
+        self.info = info
+        self.grid = grid
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.opened = []
+
+    def _reader(self):
+        if getattr(self.local, "reader", None) is None:
+            self.local.reader = cog_export.TiffReader(self.info["path"])
+            with self.lock:
+                self.opened.append(self.local.reader)
+        return self.local.reader
+
+    def close(self):
+        """关闭所有线程打开的文件（线程池结束后调用）"""
+        with self.lock:
+            for r in self.opened:
+                r.close()
+            self.opened = []
+            self.local = threading.local()
+
+    def read(self, y0, x0, h, w):
+        """-> (高程, 权重)，形状 (h, w)；无效像元权重为 0；与输入不相交时返回 None"""
+        glon0, glat0, grx, gry = self.grid[:4]
+        ilon0, ilat0, irx, iry, iw, ih = self.info["grid"]
+        cols = np.floor((glon0 + (x0 + np.arange(w) + 0.5) * grx - ilon0) / irx).astype(np.int64)
+        rows = np.floor((ilat0 - (glat0 - (y0 + np.arange(h) + 0.5) * gry)) / iry).astype(np.int64)
+        cvalid, rvalid = (cols >= 0) & (cols < iw), (rows >= 0) & (rows < ih)
+        if not cvalid.any() or not rvalid.any():
+            return None
+        c0, c1 = cols[cvalid].min(), cols[cvalid].max() + 1
+        r0, r1 = rows[rvalid].min(), rows[rvalid].max() + 1
+        window = self._reader().read_window(int(r0), int(c0), int(r1 - r0), int(c1 - c0))
+        ri, ci = np.clip(rows - r0, 0, r1 - r0 - 1), np.clip(cols - c0, 0, c1 - c0 - 1)
+        sub = window[ri[:, None], ci[None, :]]
+        hgt = sub[..., self.info["height_band"]].astype(np.float64)
+        valid = rvalid[:, None] & cvalid[None, :] & np.isfinite(hgt)
+        for nd in INPUT_NODATA + ((self.info["nodata"],) if self.info["nodata"] is not None else ()):
+            valid &= hgt != nd
+        if self.info["coh_band"] is not None:
+            coh = np.clip(np.nan_to_num(sub[..., self.info["coh_band"]].astype(np.float64)), 0, MAX_COHERENCE)
+            valid &= coh >= MIN_COHERENCE
+            weight = 2 * coh * coh / (1 - coh * coh)
+        else:
+            weight = np.ones_like(hgt)
+        weight = np.where(valid, weight * self.info["weight"], 0.0)
+        return np.where(valid, hgt, 0.0), weight
+
+
+def _accumulate(sums, hgt, weight, mask=None):
+    w = weight if mask is None else np.where(mask, weight, 0.0)
+    sums["sum_w"] += w
+    sums["sum_wh"] += w * hgt
+    sums["sum_whh"] += w * hgt * hgt
+    sums["count"] += w > 0
+
+
+def _stats(sums):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums["sum_wh"] / sums["sum_w"]
+        var = sums["sum_whh"] / sums["sum_w"] - mean * mean
+    return mean, np.sqrt(np.maximum(np.nan_to_num(var), 0.0))
+
+
+def _quantiles(hist, lo, width, qs):
+    # 每像元加权直方图 (P, B) -> 各分位数（箱内线性插值）
+    cum = np.cumsum(hist, axis=1)
+    total = cum[:, -1]
+    out = []
+    for q in qs:
+        target = total * q
+        b = np.minimum((cum < target[:, None]).sum(axis=1), hist.shape[1] - 1)
+        prev = np.where(b > 0, cum[np.arange(len(b)), np.maximum(b - 1, 0)], 0.0)
+        inbin = hist[np.arange(len(b)), b]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.clip(np.nan_to_num((target - prev) / inbin), 0, 1)
+        out.append(lo + (b + frac) * width)
+    return out
+
+
+def fuse_tile(layers, win, method=METHOD):
+    """一个输出块的完整三步融合 -> (输出 dict, 累加量 dict)"""
+    y0, x0, h, w = win
+    zeros = lambda: np.zeros((h, w), np.float64)
+    raw = {k: zeros() for k in SUMS}
+    lo_hi = [np.full((h, w), np.inf), np.full((h, w), -np.inf)]
+    for layer in layers:
+        got = layer.read(y0, x0, h, w)
+        if got is None:
+            continue
+        hgt, weight = got
+        _accumulate(raw, hgt, (weight > 0).astype(np.float64))
+        lo_hi[0] = np.where(weight > 0, np.minimum(lo_hi[0], hgt), lo_hi[0])
+        lo_hi[1] = np.where(weight > 0, np.maximum(lo_hi[1], hgt), lo_hi[1])
+    mean, std = _stats(raw)
+    has = raw["sum_w"] > 0
+
+    # 2. 样本数直方图 -> 中位数与稳健标准差（剔除不看权重：高相干的粗差也能剔除）
+    lo = np.where(has, np.maximum(lo_hi[0], mean - HIST_SIGMA * std), 0.0)
+    hi = np.where(has, np.minimum(lo_hi[1], mean + HIST_SIGMA * std), 1.0)
+    bin_w = np.maximum(hi - lo, 1e-3) / HIST_BINS
+    base = np.arange(h * w) * HIST_BINS
+
+    def histogram(weights_of):
+        hist = np.zeros(h * w * HIST_BINS, np.float64)
+        for layer in layers:
+            got = layer.read(y0, x0, h, w)
+            if got is None:
+                continue
+            hgt, weight = got
+            weight = weights_of(hgt, weight)
+            b = np.clip(np.floor((hgt - lo) / bin_w), 0, HIST_BINS - 1).astype(np.int64)
+            hist += np.bincount(base + b.ravel(), weights=weight.ravel(), minlength=hist.size)
+        return hist.reshape(h * w, HIST_BINS)
+
+    hist = histogram(lambda hgt, weight: (weight > 0).astype(np.float64))
+    q25, median, q75 = (q.reshape(h, w) for q in _quantiles(hist, lo.ravel(), bin_w.ravel(), (0.25, 0.5, 0.75)))
+    del hist
+    tolerance = np.clip(OUTLIER_K * (q75 - q25) / 1.349, MIN_TOLERANCE_M, MAX_TOLERANCE_M)
+
+    # 3. 粗差剔除后的累加；median 时再对保留的样本做加权直方图求加权中位数
+    sums = {k: zeros() for k in SUMS}
+    for layer in layers:
+        got = layer.read(y0, x0, h, w)
+        if got is None:
+            continue
+        hgt, weight = got
+        _accumulate(sums, hgt, weight, np.abs(hgt - median) <= tolerance)
+    weighted_median = None
+    if method == "median":
+        hist = histogram(lambda hgt, weight: np.where(np.abs(hgt - median) <= tolerance, weight, 0.0))
+        weighted_median = _quantiles(hist, lo.ravel(), bin_w.ravel(), (0.5,))[0].reshape(h, w)
+    return outputs_from(sums, weighted_median), sums
+
+
+def outputs_from(sums, median=None):
+    mean, std = _stats(sums)
+    ok = sums["count"] > 0
+    height = median if median is not None else mean
+    return {
+        "height": np.where(ok, height, NODATA).astype(np.float32),
+        "std": np.where(ok, std, NODATA).astype(np.float32),
+        "count": sums["count"].astype(np.float32),
+        "weight": sums["sum_w"].astype(np.float32),
+    }
+
+
+def update_tile(layers, win, sums):
+    """增量：新输入与当前融合结果比较（样本数 < 2 的像元全部接受）后累加到 sums -> 输出 dict"""
+    y0, x0, h, w = win
+    mean, std = _stats(sums)
+    tolerance = np.clip(OUTLIER_K * std, MIN_TOLERANCE_M, MAX_TOLERANCE_M)
+    established = sums["count"] >= 2
+    for layer in layers:
+        got = layer.read(y0, x0, h, w)
+        if got is None:
+            continue
+        hgt, weight = got
+        _accumulate(sums, hgt, weight, ~established | (np.abs(hgt - mean) <= tolerance))
+    return outputs_from(sums)
+
+
+# ---------------------- state ----------------------
+def _state_path(state_dir, name, output=False):
+    return os.path.join(state_dir, ("out_" if output else "") + name + ".img")
+
+
+def _open_state(state_dir, grid, create):
+    # 累加量（float64）与输出（float32）的 memmap -> (sums, outputs)
+    width, height = grid[4], grid[5]
+    opened = ({}, {})
+    for group, names, dtype in ((0, SUMS, np.float64), (1, OUTPUTS, np.float32)):
+        for name in names:
+            path = _state_path(state_dir, name, output=bool(group))
+            if create:
+                opened[group][name], _ = envi_io.create_raster(path, width, height, dtype, band_names=[name],
+                                                               description="DEM fusion state")
+            else:
+                opened[group][name] = envi_io.open_raster(path, mode="r+")
+    return opened
+
+
+def _params(method):
+    return {"method": method, "hist_bins": HIST_BINS, "outlier_k": OUTLIER_K, "min_tolerance_m": MIN_TOLERANCE_M,
+            "max_tolerance_m": MAX_TOLERANCE_M, "min_coherence": MIN_COHERENCE, "hoa_ref": HOA_REF}
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_DIR, STATE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_DIR, STATE_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# ---------------------- driver ----------------------
+def fuse(inputs, out_dir, method=METHOD, aoi=None, resolution=None, tile=TILE, workers=WORKERS,
+         rebuild=False, cog=True, log=None):
+    """融合 inputs（pair 目录 / tif / 批处理根目录）到 out_dir；已有状态且只新增了输入时做增量更新
+
+    返回摘要 dict（mode: full / incremental / unchanged）
+    """
+    log = log or (lambda level, msg: print(f"[{level}] {msg}"))
+    os.makedirs(os.path.join(out_dir, STATE_DIR), exist_ok=True)
+    infos = []
+    for path in find_inputs(inputs):
+        try:
+            infos.append(describe_input(path))
+        except ValueError as e:
+            log("WARN", f"Skipping {path}: {e}")
+    if not infos:
+        raise RuntimeError("No usable DEM_output.tif inputs for fusion")
+    grid = output_grid(infos, aoi, resolution)
+
+    previous = None if rebuild else load_state(out_dir)
+    mode = "full"
+    new = infos
+    if previous:
+        done = {i["path"]: i["signature"] for i in previous["inputs"]}
+        current = {i["path"]: i["signature"] for i in infos}
+        changed = [p for p, sig in done.items() if current.get(p) != sig]
+        new = [i for i in infos if i["path"] not in done]
+        same_setup = previous["grid"] == grid and previous["params"] == _params(method)
+        if same_setup and not changed and not new:
+            mode = "unchanged"
+        elif same_setup and not changed and method == "mean":
+            mode = "incremental"
+        else:
+            reason = ("inputs changed or removed" if changed else
+                      "grid or parameters changed (give --aoi for a fixed grid)" if not same_setup else
+                      "median needs the full stack")
+            log("INFO", f"Fusion: full recompute ({reason})")
+            new = infos
+
+    width, height = grid[4], grid[5]
+    windows = list(tiles(height, width, tile))
+    log("INFO", f"Fusion ({method}, {mode}): {len(infos)} inputs, {len(new) if mode != 'unchanged' else 0} to read, "
+                f"grid {width}x{height} @ {grid[2]:.3g} deg, {len(windows)} tiles, {workers} workers")
+    if mode != "unchanged":
+        sum_arrays, out_arrays = _open_state(os.path.join(out_dir, STATE_DIR), grid, create=(mode == "full"))
+        layers = [LayerReader(i, grid) for i in new]
+
+        def work(win):
+            y0, x0, h, w = win
+            sl = (slice(y0, y0 + h), slice(x0, x0 + w))
+            if mode == "full":
+                outputs, sums = fuse_tile(layers, win, method)
+            else:
+                sums = {k: np.array(sum_arrays[k][sl], dtype=np.float64) for k in SUMS}
+                outputs = update_tile(layers, win, sums)
+            for k in SUMS:
+                sum_arrays[k][sl] = sums[k]
+            for k in OUTPUTS:
+                out_arrays[k][sl] = outputs[k]
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for fut in [pool.submit(work, win) for win in windows]:
+                    fut.result()
+        finally:
+            for layer in layers:
+                layer.close()
+        for a in list(sum_arrays.values()) + list(out_arrays.values()):
+            a.flush()
+        save_state(out_dir, {"grid": grid, "params": _params(method), "inputs": infos})
+
+    outputs = {k: envi_io.open_raster(_state_path(os.path.join(out_dir, STATE_DIR), k, output=True)) for k in OUTPUTS}
+    summary = {"mode": mode, "method": method, "inputs": len(infos), "read": len(new) if mode != "unchanged" else 0,
+               "grid": grid}
+    if cog:
+        summary["files"] = write_outputs(out_dir, grid, outputs, log)
+    valid = sum(int(np.count_nonzero(block)) for _, block in envi_io.iter_blocks(outputs["count"])) / float(width * height)
+    summary["valid_fraction"] = round(valid, 4)
+    with open(os.path.join(out_dir, "fusion_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    log("INFO", f"Fusion done: {100 * valid:.1f}% of the grid has data")
+    return summary
+
+
+def write_outputs(out_dir, grid, outputs, log=None):
+    # DSM_fused.tif（高程）与 DSM_fused_quality.tif（标准差、样本数、权重和），COG
+    geo = cog_export.geographic_tags(grid[0], grid[1], grid[2], grid[3])
+    dsm_path = os.path.join(out_dir, "DSM_fused.tif")
+    cog_export.write_cog(cog_export.ArraySource(outputs["height"], geo, NODATA), dsm_path, log=log)
+    quality = np.stack([outputs["std"], outputs["count"], outputs["weight"]], axis=-1)
+    quality_path = os.path.join(out_dir, "DSM_fused_quality.tif")
+    cog_export.write_cog(cog_export.ArraySource(quality, geo, NODATA), quality_path, log=log)
+    return [dsm_path, quality_path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coherence-weighted multi-pair DEM fusion")
+    parser.add_argument("inputs", nargs="+", help="Pair output dirs, DEM_output.tif files or a batch output root")
+    parser.add_argument("-o", "--output_dir", required=True, help="Fusion output directory (also holds the incremental state)")
+    parser.add_argument("--method", choices=["mean", "median"], default=METHOD,
+                        help="Outlier-rejected coherence-weighted mean, or weighted median")
+    parser.add_argument("--aoi", type=str, default=None, help="Output grid extent (GeoJSON or minLon,minLat,maxLon,maxLat); default: union of inputs")
+    parser.add_argument("--resolution", type=float, default=None, help="Output grid spacing in degrees (default: finest input)")
+    parser.add_argument("--tile", type=int, default=TILE, help="Output tile size (px)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Parallel output tiles")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the saved state and recompute from all inputs")
+    args = parser.parse_args()
+    summary = fuse(args.inputs, args.output_dir, args.method, args.aoi, args.resolution, args.tile, args.workers,
+                   args.rebuild)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,42 @@
 # -*- coding: utf-8 -*-
 """
-Sentinel-1 IW2 VV InSAR DEM Pipeline (Snappy)
+Sentinel-1 IW VV InSAR DEM Pipeline (Snappy)
 Flow (matching your table):
-1 Read  -> 2 Apply-Orbit  -> 3 TOPSAR-Split -> 4 Re-Apply-Orbit ->
+1 Read  -> 2 Apply-Orbit  -> 3 TOPSAR-Split (AOI sub-swaths/bursts) -> 4 Re-Apply-Orbit ->
 5 Back-Geocoding(Stack) -> 6 ESD(optional) -> 7 Interferogram ->
 8 Goldstein Filtering -> 9 SNAPHU Unwrapping -> 10 Deburst ->
-11 Terrain Correction -> GeoTIFF
+11 Terrain Correction -> GeoTIFF (-> COG)
 
 Usage:
 python test_dem2.py --master_zip ./data/S1B_IW_SLC__1SDV_20201217T084140_20201217T084207_024740_02F148_C219.zip --slave_zip ./data/S1B_IW_SLC__1SDV_20201205T084141_20201205T0
 84207_024565_02EB9A_B623.zip --output_dir ./output3 --iw IW2
 """
-import  os, glob, subprocess, datetime, sys
-import esa_snappy as snappy
-from esa_snappy import ProductIO, GPF, jpy
+import  os, glob, subprocess, datetime, sys, json
 import shutil
 import subprocess
 import re, tqdm
 import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import s1_meta
+from stage_cache import StageCache, stage_key, input_key
+import stage_profile
+import snaphu_runner
+import unwrap_np
+import envi_io
+import cog_export
+import aux_cache
+import snap_config
+import pair_plan
+import phase_height
+import goldstein_np
+import dem_fusion
+import baseline_network
+import coherence_gate
+import stream_pipeline
+import numpy as np
+from stage_profile import StageProfiler
 
 
 # 保证使用 GUI 的 SNAP_HOME 配置
@@ -25,11 +44,116 @@ import argparse
 #os.environ["ESASNAP_HOME"] = os.environ["SNAP_HOME"]
 #os.environ["SNAP_AUXDATA_DIR"] = os.path.join(os.environ["SNAP_HOME"], "auxdata")
 
-# 注册所有 SNAP 算子（包括 DEM）
-GPF.getDefaultInstance().getOperatorSpiRegistry().loadOperatorSpis()
+# esa_snappy 在 init_snap() 中才导入（启动 JVM）：--help 与不需要 SNAP 的模式不启动 JVM
+snappy = ProductIO = GPF = jpy = HashMap = Integer = None
 
-HashMap = jpy.get_type('java.util.HashMap')
-Integer = jpy.get_type('java.lang.Integer')
+# JVM/SNAP 调优（snap_config.preset()/load() 的结果）；None 时使用 snappy 配置中的默认值
+SNAP_CONFIG = None
+_snap_lock = threading.Lock()
+
+
+def init_snap(config=None):
+    """导入 esa_snappy 并注册算子；config 中的堆/瓦片缓存/线程数/瓦片尺寸在 JVM 启动前写入 _JAVA_OPTIONS"""
+    global snappy, ProductIO, GPF, jpy, HashMap, Integer
+    with _snap_lock:
+        if GPF is not None:
+            return
+        config = SNAP_CONFIG if config is None else config
+        if config:
+            if "esa_snappy" in sys.modules:
+                print("[WARN] JVM already started; SNAP heap size cannot be changed any more")
+            else:
+                snap_config.apply_env(config)
+        import esa_snappy as snappy
+        from esa_snappy import ProductIO, GPF, jpy
+        if config:
+            snap_config.apply_runtime(config, jpy)
+
+        # 注册所有 SNAP 算子（包括 DEM）
+        GPF.getDefaultInstance().getOperatorSpiRegistry().loadOperatorSpis()
+
+        HashMap = jpy.get_type('java.util.HashMap')
+        Integer = jpy.get_type('java.lang.Integer')
+
+# 批处理：每个 pair（Back-Geocoding ~ Terrain-Correction）的 JVM 内存估计与默认并发数
+BATCH_WORKERS = 2
+PAIR_MEMORY_GB = 8.0
+
+# 阶段缓存（BEAM-DIMAP，内容寻址 + LRU）；STAGE_CACHE_DIR 为 None 时不缓存
+STAGE_CACHE_DIR = None
+STAGE_CACHE_GB = 200.0
+CACHE_STAGES = ("split_orb", "bg", "esd", "ifg", "merge", "unw", "deburst")
+
+# Goldstein 滤波后端："snap"（GoldsteinPhaseFiltering 算子）或 "numpy"（goldstein_np.py，分块批量 FFT、多线程）；
+# FLT_WRITE_DIMAP=False 时不写 ifg_flt.dim（不能再从步骤 9 续跑）
+GOLDSTEIN = "snap"
+GOLDSTEIN_TILE = 1024
+GOLDSTEIN_WORKERS = 2
+GOLDSTEIN_INMEMORY_MB = 512   # i/q 结果不超过该大小时留在内存，否则写 memmap（ENVI）
+GOLDSTEIN_DIR = "flt_numpy"
+FLT_WRITE_DIMAP = True
+
+# SNAPHU：并行核数（None=全部）、单次超时（秒）与超时后以更粗分块重试的次数
+SNAPHU_CORES = None
+SNAPHU_TIMEOUT = None
+SNAPHU_RETRIES = 2
+
+# 解缠后端："snaphu"（外部程序）或 "numpy"（进程内加权最小二乘，unwrap_np.py）
+UNWRAPPER = "snaphu"
+NUMPY_UNW_TILE = 1024
+NUMPY_UNW_OVERLAP = 128
+NUMPY_UNW_WORKERS = 2
+NUMPY_UNW_INMEMORY_MB = 512   # 结果不超过该大小时留在内存，否则写 memmap（同时作为检查点）
+NUMPY_UNW_DIR = "unw_numpy"
+
+# SNAPHU 结果质量检查阈值（仅告警）
+QC_MIN_VALID = 0.5
+QC_MIN_COHERENCE = 0.3
+
+# 解缠前的相干性门限（coherence_gate.py）："skip"（不可用的 pair 在步骤 9 之前停止）、"flag"（只告警）、"off"
+COH_GATE = coherence_gate.MODE
+COH_GATE_MIN_MEAN = coherence_gate.MIN_MEAN
+COH_GATE_MIN_FRACTION = coherence_gate.MIN_FRACTION
+COH_GATE_STEP = coherence_gate.STEP
+
+# 解缠相位 -> 高程（Deburst 之后、Terrain-Correction 之前）：
+# "numpy"（phase_height.py，轨道/几何网格求 dφ/dh，参考 DEM 标定偏移，分块多线程）、"snap"（PhaseToElevation 算子）、"none"
+PHASE_TO_HEIGHT = "numpy"
+HEIGHT_TILE = 1024
+HEIGHT_WORKERS = 2
+HEIGHT_INMEMORY_MB = 512      # 结果不超过该大小时留在内存，否则写 memmap（ENVI）
+HEIGHT_DIR = "height"
+
+# Terrain-Correction 之前按 AOI 多边形裁剪（雷达几何下的 Subset）；外扩量留给地形位移与重采样边缘
+TC_SUBSET = True
+TC_SUBSET_MARGIN_DEG = 0.01
+# ifg_deb_TC.dim 与 DEM_output.tif 内容相同；False 时只写 GeoTIFF
+TC_WRITE_DIMAP = True
+# TC 网格对齐到像元间距的整数倍（standardGridOrigin 0,0）：各 pair 的 DEM_output 在同一网格上，融合时无需重采样
+TC_ALIGN_GRID = False
+
+# 批处理/流式结束后的多 pair 融合（dem_fusion.py）：输出到 <output_dir>/fused，再次运行时只累加新增的 pair
+FUSE = False
+FUSION_DIR = "fused"
+
+# 辅助数据共享缓存（aux_cache.py）：SRTM 瓦片拼接为 External DEM，轨道文件链接到 SNAP auxdata；
+# AUX_OFFLINE 时不联网，缺少任何文件都在处理开始前失败
+AUX_DIR = None
+AUX_OFFLINE = False
+
+# Terrain-Correction 之后把 DEM_output.tif 流式转换为 COG（分块 + 压缩 + 内部概视图，cog_export.py）
+COG_EXPORT = False
+COG_COMPRESSION = "deflate"
+COG_TILE = 512
+
+# 处理前检查（pair_plan.py，只读 annotation）：时间基线超过该天数或 burst 不重叠的 pair 直接拒绝
+MAX_TEMPORAL_BASELINE_DAYS = 48
+# --network 的配对方式："temporal"（每景与其后 max_neighbors 景）、"baseline"（baseline_network.py，按垂直基线/时间基线排序）
+NETWORK_MODE = "temporal"
+BPERP_RANGE = (baseline_network.BPERP_MIN, baseline_network.BPERP_MAX)
+
+# --materialize 时各阶段的临时落盘目录（output_dir 下，结束后删除）
+PROFILE_SCRATCH = "profile_tmp"
 
 
 # ---------------------- simple logger ----------------------
@@ -40,195 +164,167 @@ def logmsg(log, level, msg):
     log.write(line + "\n")
     log.flush()
 
-def read_product(logmsg,log,master_zip,slave_zip):
-    logmsg(log, "INFO", f"Reading master={os.path.basename(master_zip)}, slave={os.path.basename(slave_zip)}")
-    master = ProductIO.readProduct(master_zip)
-    slave  = ProductIO.readProduct(slave_zip)
-    if master is None or slave is None:
-        logmsg(log, "ERROR", "Failed to read input products.")
-        raise RuntimeError("ReadProduct returned None")
-    return master,slave, log
+def safe_input_path(path):
+    # slc_dl 的 burst 模式输出精简 .SAFE 目录，SNAP 需要指向其中的 manifest.safe
+    if os.path.isdir(path):
+        return os.path.join(path, "manifest.safe")
+    return path
 
-def apply_orbit(logmsg,log,master,slave):
+def orbit_params():
     p = HashMap()
     p.put("Orbit State Vectors", "Sentinel Precise (Auto Download)")
-    master = GPF.createProduct("Apply-Orbit-File", p, master)
-    slave = GPF.createProduct("Apply-Orbit-File", p, slave)
-    return master,slave, log
+    return p
 
-def back_geocoding(logmsg,log,dem,master_split_orb,slave_split_orb):
+def split_params(iw, polarization, first_burst=None, last_burst=None):
+    p = HashMap()
+    p.put("subswath", iw)
+    if first_burst is not None:
+        p.put("firstBurstIndex", str(first_burst))
+        p.put("lastBurstIndex", str(last_burst))
+    p.put("selectedPolarisations", polarization.upper())
+    return p
+
+def select_scene_bursts(logmsg, log, zip_path, polarization, aoi=None, iw=None):
+    # 用 annotation 中各 burst 的地理范围与 AOI 求交：覆盖 AOI 的最少 swath 与连续 burst 范围
+    # master/slave 的 burst 编号因帧起点不同而不同，所以每景单独选择
+    scene = os.path.basename(zip_path.rstrip("/\\"))
+    anns = s1_meta.read_zip_annotations(zip_path, polarization)
+    if iw not in (None, "auto"):
+        anns = [a for a in anns if a["swath"] == iw]
+    bursts = s1_meta.select_bursts(anns, s1_meta.load_aoi_bbox(aoi))
+    if not bursts:
+        logmsg(log, "ERROR", f"{scene}: no {iw or ''} burst intersects the AOI.")
+        raise RuntimeError("AOI does not intersect the scene")
+    logmsg(log, "INFO", f"{scene}: AOI covered by " +
+           ", ".join(f"{sw} bursts {first}-{last}" for sw, (first, last) in bursts.items()))
+    return bursts
+
+def dem_params(p, dem):
+    # dem 为文件路径时作为 External DEM（aux_cache 拼接的 SRTM GeoTIFF，高程相对 EGM96）
+    if os.path.isfile(dem):
+        File = jpy.get_type('java.io.File')
+        p.put("demName", "External DEM")
+        p.put("externalDEMFile", File(dem))
+        p.put("externalDEMNoDataValue", float(aux_cache.SRTM_NODATA))
+        p.put("externalDEMApplyEGM", True)
+    else:
+        p.put("demName", dem)
+    return p
+
+def back_geocoding_params(dem):
     p = HashMap()
-    p.put("demName", dem)
+    dem_params(p, dem)
     p.put("resamplingType", "BILINEAR_INTERPOLATION")
+    return p
+
+def back_geocoding(logmsg,log,dem,master_split_orb,slave_split_orb):
+    p = back_geocoding_params(dem)
     bg = GPF.createProduct("Back-Geocoding", p, [master_split_orb, slave_split_orb])
     return bg, log
 
-def topsar_split(logmsg,log,iw,polarization,master,slave):
-    p = HashMap()
-    p.put("subswath", "IW2")
-    p.put("firstBurstIndex", "4")
-    p.put("lastBurstIndex", "7")
-    p.put("selectedPolarisations", "VV")
-    master_split = GPF.createProduct("TOPSAR-Split", p, master)
-    slave_split  = GPF.createProduct("TOPSAR-Split", p, slave)
-    return master_split,slave_split, log
-    
-def enhanced_spectral_diversity(logmsg,log,bg):
+def esd_params():
     esd_params = HashMap()
     esd_params.put('fineWinWidthStr', '128')
     esd_params.put('fineWinHeightStr', '128')
     esd_params.put('fineWinAccStr', '8')
     esd_params.put('fineWinOversamplingStr', '2')
     esd_params.put('xCorrThresholdStr', '0.05')
-    esd = GPF.createProduct("Enhanced-Spectral-Diversity", esd_params, bg)
+    return esd_params
+
+def enhanced_spectral_diversity(logmsg,log,bg):
+    esd = GPF.createProduct("Enhanced-Spectral-Diversity", esd_params(), bg)
     # ProductIO.writeProduct(esd, os.path.join(output_dir, "stack_esd"), "BEAM-DIMAP")
     return esd, log
 
-def interferogram(logmsg,log,esd):
+def interferogram_params(dem=None):
     p = HashMap()
     p.put("subtractFlatEarthPhase", True)
     p.put("includeCoherence", True)
     p.put("coherenceRangeWinSize", 10)
     p.put("coherenceAzimuthWinSize", 3)
     p.put("subtractTopographicPhase", False)
+    if PHASE_TO_HEIGHT == "numpy" and dem:
+        # 参考高程波段 elevation：phase_height 标定高程偏移与相位符号
+        p.put("outputElevation", True)
+        dem_params(p, dem)
+    return p
+
+def interferogram(logmsg,log,esd,dem=None):
+    p = interferogram_params(dem)
     logmsg(log, "INFO", "Step 7: Interferogram Formation...")
     ifg = GPF.createProduct("Interferogram", p, [esd])
     # ProductIO.writeProduct(ifg, os.path.join(output_dir, "ifg"), "BEAM-DIMAP")
     return ifg, log
 
-def goldstein_phase_filtering(logmsg,log,ifg):
+def goldstein_params():
     p = HashMap()
-    p.put("alpha", 0.7)
-    p.put("FFTSizeString", "32")
-    p.put("WindowSize", 3)
-    logmsg(log, "INFO", "Step 8: Goldstein phase filtering...")
-    flt = GPF.createProduct("GoldsteinPhaseFiltering", p, ifg)
-    ProductIO.writeProduct(flt, os.path.join(output_dir, "ifg_flt"), "BEAM-DIMAP")
-    return flt, log
-    
-def run_snaphu(snaphu_dir, logmsg, log):
-    snaphu_conf = os.path.join(snaphu_dir, "snaphu.conf")
+    p.put("alpha", goldstein_np.ALPHA)
+    p.put("FFTSizeString", str(goldstein_np.FFT_SIZE))
+    p.put("WindowSize", goldstein_np.WINDOW)
+    return p
 
-    # 1. 查找 snaphu 可执行路径
-    snaphu_bin = shutil.which("snaphu") or "/gs/bs/tga-guc-lab/users/vickey/snaphu/snaphu-v2.0.7/bin/snaphu"
-    if not os.path.exists(snaphu_bin):
-        raise FileNotFoundError(f"[FATAL] SNAPHU not found at {snaphu_bin}")
+def goldstein_phase_filtering(logmsg,log,ifg,output_dir):
+    logmsg(log, "INFO", f"Step 8: Goldstein phase filtering ({GOLDSTEIN})...")
+    if GOLDSTEIN == "numpy":
+        flt, log = numpy_goldstein(logmsg, log, ifg, output_dir)
+    else:
+        flt = GPF.createProduct("GoldsteinPhaseFiltering", goldstein_params(), ifg)
+    if FLT_WRITE_DIMAP:
+        ProductIO.writeProduct(flt, os.path.join(output_dir, "ifg_flt"), "BEAM-DIMAP")
+    return flt, log
 
-    # 2. 从 snaphu.conf 中提取命令
-    input_file = None
-    width = None
-    with open(snaphu_conf, "r") as f:
-        for line in f:
-            line = line.strip()
-            # 允许带 "#" 的命令行
-            if "snaphu" in line and "-f" in line:
-                # 去掉开头的 "#"
-                line = line.lstrip("#").strip()
-                parts = line.split()
-                if len(parts) >= 4:
-                    input_file = parts[-2]
-                    width = parts[-1]
-                    break
-
-    if not input_file or not width:
-        raise ValueError("[FATAL] Cannot find SNAPHU command line in snaphu.conf")
-
-    # 3️⃣ 输出日志
-    logmsg(log, "INFO", f"Step 9.3: Running SNAPHU at {snaphu_bin} ...")
-    logmsg(log, "INFO", f"Working dir: {snaphu_dir}")
-    logmsg(log, "INFO", f"Config file: {snaphu_conf}")
-    logmsg(log, "INFO", f"Command from conf: snaphu -f snaphu.conf {input_file} {width}")
+def numpy_goldstein(logmsg, log, ifg, output_dir):
+    # 8️⃣ (--goldstein numpy) 分块读取 i/q，批量 FFT 滤波，逐块写出；Phase/Intensity 为基于新 i/q 的虚拟波段
+    w, h = ifg.getSceneRasterWidth(), ifg.getSceneRasterHeight()
+    i_band, q_band = find_band(ifg, "i_"), find_band(ifg, "q_")
+    if i_band is None or q_band is None:
+        raise RuntimeError(f"No i/q bands in {list(ifg.getBandNames())}")
+    i_name, q_name = i_band.getName(), q_band.getName()
+    suffix = i_name[2:]
 
-    try:
-        result = subprocess.run(
-            [snaphu_bin, "-f", "snaphu.conf", input_file, width],
-            cwd=snaphu_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        logmsg(log, "INFO", "SNAPHU unwrap completed successfully.")
-        if result.stdout:
-            logmsg(log, "DEBUG", result.stdout)
-    except subprocess.CalledProcessError as e:
-        logmsg(log, "ERROR", f"SNAPHU failed with code {e.returncode}")
-        if e.stdout:
-            logmsg(log, "ERROR", e.stdout)
-        if e.stderr:
-            logmsg(log, "ERROR", e.stderr)
-        raise RuntimeError("SNAPHU unwrap failed.")
+    def read_band(band, y, x, th, tw):
+        buf = np.zeros(th * tw, np.float32)
+        band.readPixels(x, y, tw, th, buf)
+        return buf.reshape(th, tw)
 
-# ---------------------- pipeline ----------------------
-def fixed_pipeline(
-    master_zip,
-    slave_zip,
-    output_dir,
-    iw="IW2",
-    polarization="VV",
-    dem="SRTM 1Sec HGT"
-):
-    start_time = datetime.datetime.now()  # Start time
-    os.makedirs(output_dir, exist_ok=True)
-    log_path = os.path.join(output_dir, "log.txt")
-    log = open(log_path, "w")
-
-    # 1️⃣ Read master/slave
-    master,slave, log = read_product(logmsg,log,master_zip,slave_zip)
-    logmsg(log, "INFO", "Step 1 done: read master/slave.")
-
-    # 2️⃣ Apply precise orbitSRTM 1Sec HGT (Auto Download)
-    master,slave, log = apply_orbit(logmsg,log,master,slave)
-    # ProductIO.writeProd uct(master, os.path.join(output_dir, "master_orb"), "BEAM-DIMAP")
-    # ProductIO.writeProduct(slave, os.path.join(output_dir, "slave_orb"), "BEAM-DIMAP")
-    logmsg(log, "INFO", "Step 2 done: precise orbit applied.")
-
-    # 3️⃣ TOPSAR-Split (IW2, VV)
-    master_split,slave_split, log = topsar_split(logmsg,log,iw,polarization,master,slave)
-    # ProductIO.writeProduct(master_split, os.path.join(output_dir, "master_split"), "BEAM-DIMAP")
-    # ProductIO.writeProduct(slave_split,  os.path.join(output_dir, "slave_split"),  "BEAM-DIMAP")
-    logmsg(log, "INFO", f"Step 3 done: split {iw} {polarization.upper()}.")
-
-    # 4️⃣ Re-apply orbit after split
-    master_split_orb,slave_split_orb, log = apply_orbit(logmsg,log,master_split,slave_split)
-    # ProductIO.writeProduct(master_split_orb, os.path.join(output_dir, "master_split_orb"), "BEAM-DIMAP")
-    # ProductIO.writeProduct(slave_split_orb, os.path.join(output_dir, "slave_split_orb"), "BEAM-DIMAP")
-    logmsg(log, "INFO", "Step 4 done: orbit reapplied on split scenes.")
-
-    # 5️⃣ Back-Geocoding (stack)
-    bg, log = back_geocoding(logmsg,log,dem,master_split_orb,slave_split_orb)
-    # ProductIO.writeProduct(bg, os.path.join(output_dir, "stack_bg"), "BEAM-DIMAP")
-    logmsg(log, "INFO", f"Step 5 done. Bands: {list(bg.getBandNames())}")
-
-    # 6️⃣ Enhanced Spectral Diversity (optional, auto-fallback)
-    try:
-        logmsg(log, "INFO", "Step 6: Running Enhanced-Spectral-Diversity...")
-        esd, log = enhanced_spectral_diversity(logmsg,log,bg)
-        logmsg(log, "INFO", f"Step 6 done. ESD bands: {list(esd.getBandNames())}")
-    except Exception as e:
-        logmsg(log, "WARN", f"ESD failed: {e}. Using Back-Geocoding result.")
-        esd = bg
+    def read_tile(y, x, th, tw):
+        return read_band(i_band, y, x, th, tw) + 1j * read_band(q_band, y, x, th, tw)
 
-    # 7️⃣ Interferogram Formation
-    ifg, log = interferogram(logmsg,log,esd)
-    ifg_bands = list(ifg.getBandNames())
-    logmsg(log, "INFO", f"Step 7 done. IFG bands: {ifg_bands}")
-    if len(ifg_bands) == 0:
-        logmsg(log, "ERROR", "Interferogram has no bands. Check overlap/bursts/metadata.")
-        raise RuntimeError("IFG empty")
+    if w * h * 8 <= GOLDSTEIN_INMEMORY_MB * 1024 ** 2:
+        out_i, out_q = np.zeros((h, w), np.float32), np.zeros((h, w), np.float32)
+        hdrs = None
+    else:
+        flt_dir = os.path.join(output_dir, GOLDSTEIN_DIR)
+        os.makedirs(flt_dir, exist_ok=True)
+        (out_i, hdr_i), (out_q, hdr_q) = [
+            envi_io.create_raster(os.path.join(flt_dir, name + ".img"), w, h, band_names=[name],
+                                  description="NumPy Goldstein filtered interferogram")
+            for name in (i_name, q_name)]
+        hdrs = (hdr_i, hdr_q)
 
-    # 8️⃣ Goldstein Phase Filtering
-    flt, log = goldstein_phase_filtering(logmsg,log,ifg)
-    logmsg(log, "INFO", "Step 8 done.")
+    def write_tile(y, x, z):
+        th, tw = z.shape
+        out_i[y:y + th, x:x + tw] = z.real
+        out_q[y:y + th, x:x + tw] = z.imag
 
-    # 9️⃣ Phase Unwrapping (SNAPHU)
-    snaphu_dir = os.path.join(output_dir, "snaphu")
-    os.makedirs(snaphu_dir, exist_ok=True)
-
-    # 直接读取已生成的滤波后干涉图文件
-    flt_path = os.path.join(output_dir, "ifg_flt.dim")
-    # flt = ProductIO.readProduct(flt_path)
+    goldstein_np.filter_tiled(read_tile, h, w, write_tile, tile=GOLDSTEIN_TILE, workers=GOLDSTEIN_WORKERS,
+                              log=lambda level, msg: logmsg(log, level, msg))
+    exclude = (i_name, q_name, "Intensity_" + suffix, "Phase_" + suffix)
+    if hdrs:
+        out_i.flush()
+        out_q.flush()
+        del out_i, out_q
+        bands = [(i_name, None, hdrs[0], "real"), (q_name, None, hdrs[1], "imaginary")]
+    else:
+        bands = [(i_name, out_i, None, "real"), (q_name, out_q, None, "imaginary")]
+    flt = attach_bands(ifg, [(name, data, hdr, unit, None) for name, data, hdr, unit in bands],
+                       suffix="_Flt", exclude=exclude)
+    flt.addBand("Intensity_" + suffix, f"{i_name} * {i_name} + {q_name} * {q_name}").setUnit("intensity")
+    flt.addBand("Phase_" + suffix, f"atan2({q_name}, {i_name})").setUnit("phase")
+    logmsg(log, "INFO", f"Step 8: NumPy Goldstein done. Bands: {list(flt.getBandNames())}")
+    return flt, log
 
-    # === 9.1 Snaphu Export ===
+def snaphu_export_params(snaphu_dir):
     p = HashMap()
     p.put("targetFolder", snaphu_dir)
     p.put("statCostMode", "TOPO")
@@ -246,28 +342,39 @@ def fixed_pipeline(
     p.put("exportUnwPhase", True)
     p.put("exportSnaphuConf", True)     # 部分版本支持显式导出配置
     p.put("tileExtension", True)
+    # 分块与进程数只是 snaphu.conf 的默认值，run_snaphu 会按影像尺寸与核数覆盖
     p.put("ntilerow", Integer(16))     # Tile 行数
     p.put("ntilecol", Integer(16))     # Tile 列数
     p.put("rowovrlp", Integer(400))
     p.put("colovrlp", Integer(400))
     p.put("tileCostThreshold", Integer(500))  # 部分版本支持，会写入 conf 中
     p.put("numberOfProcessors", Integer(8))
+    return p
 
+def snaphu_export(logmsg, log, flt, snaphu_dir):
+    # === 9.1 Snaphu Export ===
+    os.makedirs(snaphu_dir, exist_ok=True)
+    p = snaphu_export_params(snaphu_dir)
     snaphu_exp = GPF.createProduct("SnaphuExport", p, flt)
     ProductIO.writeProduct(snaphu_exp, snaphu_dir, "Snaphu")
     
     logmsg(log, "INFO", "Step 9.1: Snaphu export complete. Checking configuration...")
+    return log
 
+def find_unw_hdr(snaphu_dir, require_data=False):
+    # SnaphuExport 预先写出 UnwPhase*.hdr；require_data=True 时还要求 snaphu 已写出对应的 .img
+    for hdr in sorted(glob.glob(os.path.join(snaphu_dir, "UnwPhase*.hdr"))):
+        img = os.path.splitext(hdr)[0] + ".img"
+        if not require_data or (os.path.exists(img) and os.path.getsize(img) > 0):
+            return hdr
+    return None
 
-    # === 9.2 Unwrap files generated ===
-    run_snaphu(snaphu_dir, logmsg, log)
-
+def snaphu_import(logmsg, log, flt, snaphu_dir):
     # === 9.3 Import result ===
-    unw_hdrs = glob.glob(os.path.join(snaphu_dir, "UnwPhase*.hdr"))
-    if not unw_hdrs:
+    unw_hdr = find_unw_hdr(snaphu_dir)
+    if not unw_hdr:
         logmsg(log, "ERROR", "SNAPHU output not found (UnwPhase*.hdr).")
         raise RuntimeError("SNAPHU output missing")
-    unw_hdr = unw_hdrs[0]
 
     p = HashMap()
     p.put("snaphuImportFile", unw_hdr)
@@ -275,22 +382,311 @@ def fixed_pipeline(
     unw = GPF.createProduct("SnaphuImport", p, [ProductIO.readProduct(unw_hdr),flt])
     # ProductIO.writeProduct(unw, os.path.join(output_dir, "ifg_unw"), "BEAM-DIMAP")
     logmsg(log, "INFO", "Step 9 done: unwrap imported.")
+    return unw, log
+
+def find_band(product, prefix):
+    for name in product.getBandNames():
+        if name.startswith(prefix):
+            return product.getBand(name)
+    return None
+
+def check_coherence(logmsg, log, flt, output_dir, aoi=None):
+    # 8️⃣+ 相干性门限：抽稀读取 coh 波段（AOI 内），结果写入 coherence_gate.json；不可用且 COH_GATE="skip" 时抛出 LowCoherenceError
+    coh_band = find_band(flt, "coh_")
+    if coh_band is None:
+        logmsg(log, "WARN", f"Coherence gate skipped: no coherence band in {list(flt.getBandNames())}")
+        return None
+    w, h = flt.getSceneRasterWidth(), flt.getSceneRasterHeight()
+    lat_tpg, lon_tpg = flt.getTiePointGrid("latitude"), flt.getTiePointGrid("longitude")
+
+    def read_row(raster, y):
+        buf = np.zeros(w, np.float32)
+        raster.readPixels(0, y, w, 1, buf)
+        return buf
+
+    read_lonlat = None
+    if lat_tpg is not None and lon_tpg is not None:
+        read_lonlat = lambda y: (read_row(lon_tpg, y), read_row(lat_tpg, y))
+    else:
+        logmsg(log, "WARN", "Coherence gate: no latitude/longitude tie-point grids, using the whole scene.")
+    polygons = s1_meta.load_aoi_polygons(aoi)
+    gate = dict(mode=COH_GATE, step=COH_GATE_STEP, min_mean=COH_GATE_MIN_MEAN, min_fraction=COH_GATE_MIN_FRACTION)
+    report = coherence_gate.evaluate(lambda y: read_row(coh_band, y), h, w, read_lonlat, polygons, **gate)
+    if read_lonlat is not None and report["metrics"]["aoi_samples"] == 0:
+        logmsg(log, "WARN", "Coherence gate: no samples inside the AOI, using the whole scene.")
+        report = coherence_gate.evaluate(lambda y: read_row(coh_band, y), h, w, **gate)
+    coherence_gate.write_report(os.path.join(output_dir, coherence_gate.REPORT), report)
+
+    m = report["metrics"]
+    if m["mean"] is not None:
+        logmsg(log, "INFO", f"Step 8.5: coherence over AOI: mean {m['mean']:.3f}, median {m['median']:.3f}, "
+                            f"γ≥{coherence_gate.PIXEL_COHERENCE} {m['coherent_fraction']:.1%} "
+                            f"({m['samples']} samples, 1/{COH_GATE_STEP}² decimation)")
+    if report["decision"] == "pass":
+        for reason in report["reasons"]:
+            logmsg(log, "WARN", f"Coherence gate: {reason}")
+        logmsg(log, "INFO", "Step 8.5 done: coherence gate passed.")
+        return report
+    reasons = "; ".join(report["reasons"])
+    if report["decision"] == "flag":
+        logmsg(log, "WARN", f"Coherence gate: pair flagged as unusable ({reasons}); continuing.")
+        return report
+    logmsg(log, "WARN", f"Coherence gate: pair skipped before unwrapping ({reasons}).")
+    raise coherence_gate.LowCoherenceError(f"low coherence: {reasons}")
+
+def numpy_unwrap(logmsg, log, flt, output_dir, state=None):
+    # 9️⃣ (--unwrapper numpy) 直接分块读取 ifg_flt 的相位/相干性并解缠，不经过 SnaphuExport/Import
+    w, h = flt.getSceneRasterWidth(), flt.getSceneRasterHeight()
+    phase_band = find_band(flt, "Phase_")
+    i_band, q_band = find_band(flt, "i_"), find_band(flt, "q_")
+    coh_band = find_band(flt, "coh_")
+    if phase_band is None and (i_band is None or q_band is None):
+        raise RuntimeError(f"No phase (or i/q) band in {list(flt.getBandNames())}")
+
+    def read_band(band, y, x, th, tw):
+        buf = np.zeros(th * tw, np.float32)
+        band.readPixels(x, y, tw, th, buf)
+        return buf.reshape(th, tw)
 
+    def read_tile(y, x, th, tw):
+        if phase_band is not None:
+            phase = read_band(phase_band, y, x, th, tw)
+        else:
+            phase = np.arctan2(read_band(q_band, y, x, th, tw), read_band(i_band, y, x, th, tw))
+        coh = read_band(coh_band, y, x, th, tw) if coh_band is not None else None
+        return phase, coh
+
+    phase_name = phase_band.getName() if phase_band is not None else "Phase_" + i_band.getName()[2:]
+    unw_name = "Unw_" + phase_name
+    logmsg(log, "INFO", f"Step 9: NumPy unwrapping {phase_name} ({w}x{h}, coherence weights: {coh_band is not None})")
+    log_fn = lambda level, msg: logmsg(log, level, msg)
+
+    if w * h * 4 <= NUMPY_UNW_INMEMORY_MB * 1024 ** 2:
+        # 小 AOI：结果留在内存中直接挂到产品上，没有任何中间文件
+        out = np.zeros((h, w), np.float32)
+        unwrap_np.unwrap_tiled(read_tile, h, w, out, NUMPY_UNW_TILE, NUMPY_UNW_OVERLAP, NUMPY_UNW_WORKERS, log_fn)
+        unw = attach_unwrapped(flt, unw_name, data=out)
+    else:
+        # 大范围：写入 memmap（ENVI），同时作为步骤 9 的检查点
+        unw_dir = os.path.join(output_dir, NUMPY_UNW_DIR)
+        os.makedirs(unw_dir, exist_ok=True)
+        out, hdr = envi_io.create_raster(os.path.join(unw_dir, "Unw_Phase.img"), w, h,
+                                         band_names=["Unw_Phase"], description="NumPy unwrapped phase")
+        unwrap_np.unwrap_tiled(read_tile, h, w, out, NUMPY_UNW_TILE, NUMPY_UNW_OVERLAP, NUMPY_UNW_WORKERS, log_fn)
+        out.flush()
+        del out
+        if state:
+            state.mark(9, [hdr])
+        unw = attach_unwrapped(flt, unw_name, hdr=hdr)
+    logmsg(log, "INFO", "Step 9 done: NumPy unwrap attached.")
+    return unw, log
+
+def attach_unwrapped(flt, unw_name, data=None, hdr=None):
+    # flt 的所有波段与元数据 + 解缠相位波段（与 SnaphuImport 的输出结构一致，供 Deburst/TC 使用）
+    return attach_band(flt, unw_name, data=data, hdr=hdr, unit="abs_phase", nodata=0.0, suffix="_unw")
+
+def attach_band(flt, band_name, data=None, hdr=None, unit=None, nodata=None, suffix="", exclude=()):
+    # flt 的波段（exclude 除外）与元数据 + 一个新波段（内存数组 data 或 ENVI 文件 hdr）
+    return attach_bands(flt, [(band_name, data, hdr, unit, nodata)], suffix, exclude)
+
+def attach_bands(flt, bands, suffix="", exclude=()):
+    # bands: [(name, data, hdr, unit, nodata)]，按顺序加到 flt 的副本上
+    Product = jpy.get_type('org.esa.snap.core.datamodel.Product')
+    ProductData = jpy.get_type('org.esa.snap.core.datamodel.ProductData')
+    ProductUtils = jpy.get_type('org.esa.snap.core.util.ProductUtils')
+    w, h = flt.getSceneRasterWidth(), flt.getSceneRasterHeight()
+    target = Product(flt.getName() + suffix, flt.getProductType(), w, h)
+    ProductUtils.copyProductNodes(flt, target)
+    for name in flt.getBandNames():
+        if name not in exclude:
+            ProductUtils.copyBand(name, flt, target, True)
+    for band_name, data, hdr, unit, nodata in bands:
+        if data is not None:
+            band = target.addBand(band_name, ProductData.TYPE_FLOAT32)
+            band.setRasterData(ProductData.createInstance(np.ascontiguousarray(data, dtype=np.float32).ravel()))
+        else:
+            envi = ProductIO.readProduct(hdr)
+            band = ProductUtils.copyBand(envi.getBandAt(0).getName(), envi, band_name, target, True)
+        if unit:
+            band.setUnit(unit)
+        if nodata is not None:
+            band.setNoDataValue(nodata)
+            band.setNoDataValueUsed(True)
+    return target
+
+def snaphu_qc(logmsg, log, snaphu_dir):
+    # 通过 memmap 分块统计 snaphu 输入/输出（不经过 SNAP，不整景读入内存），写入 snaphu/qc.json
+    qc = {}
+    for label, pattern in (("unw_phase", "UnwPhase*.hdr"), ("phase", "Phase*.hdr"), ("coherence", "coh*.hdr")):
+        hdrs = sorted(glob.glob(os.path.join(snaphu_dir, pattern)))
+        if not hdrs:
+            continue
+        try:
+            qc[label] = envi_io.block_stats(envi_io.open_raster(hdrs[0]))
+        except (OSError, ValueError) as e:
+            logmsg(log, "WARN", f"QC: cannot read {os.path.basename(hdrs[0])}: {e}")
+    with open(os.path.join(snaphu_dir, "qc.json"), "w") as f:
+        json.dump(qc, f, indent=2)
+    unw, coh = qc.get("unw_phase"), qc.get("coherence")
+    if unw:
+        logmsg(log, "INFO", f"QC unwrapped phase: valid {unw['valid_fraction']:.1%}, "
+                            f"range [{unw['min']}, {unw['max']}]")
+        if unw["valid_fraction"] < QC_MIN_VALID:
+            logmsg(log, "WARN", f"QC: only {unw['valid_fraction']:.1%} of unwrapped pixels are valid.")
+    if coh and coh["mean"] is not None:
+        logmsg(log, "INFO", f"QC coherence: mean {coh['mean']:.3f}")
+        if coh["mean"] < QC_MIN_COHERENCE:
+            logmsg(log, "WARN", f"QC: low mean coherence {coh['mean']:.3f}; DEM will be noisy.")
+    return qc
+
+def snaphu_unwrap(logmsg, log, flt, output_dir, state=None, skip_export=False):
+    # 9️⃣ Phase Unwrapping (SNAPHU)
+    snaphu_dir = os.path.join(output_dir, "snaphu")
+    os.makedirs(snaphu_dir, exist_ok=True)
+
+    if skip_export:
+        logmsg(log, "INFO", "Step 9.1: reusing existing Snaphu export.")
+    else:
+        with profiled("snaphu_export"):
+            log = snaphu_export(logmsg, log, flt, snaphu_dir)
+        if state:
+            state.mark("9.1", [os.path.join(snaphu_dir, "snaphu.conf")])
+
+    # === 9.2 Unwrap files generated ===
+    with profiled("snaphu"):
+        run_snaphu(snaphu_dir, logmsg, log)
+    if state:
+        state.mark(9, [find_unw_hdr(snaphu_dir)])
+    snaphu_qc(logmsg, log, snaphu_dir)
+
+    return snaphu_import(logmsg, log, flt, snaphu_dir)
+
+def deburst(logmsg, log, unw):
     # 🔟 Deburst（拼接 burst）
     # 将每个子波束中的 burst 片段拼接为连续条带，用于后续干涉处理
     p = HashMap()  # Deburst 无需额外参数
     logmsg(log, "INFO", "Step 10: TOPSAR Deburst...")
-    deburst = GPF.createProduct("TOPSAR-Deburst", p, unw)
-    # ProductIO.writeProduct(deburst, os.path.join(output_dir, "ifg_deburst"), "BEAM-DIMAP")
+    deb = GPF.createProduct("TOPSAR-Deburst", p, unw)
+    # ProductIO.writeProduct(deb, os.path.join(output_dir, "ifg_deburst"), "BEAM-DIMAP")
     logmsg(log, "INFO", "Step 10 done: deburst complete.")
-    print(deburst.getBandNames())
-    print(deburst.getMetadataRoot().toString())
+    print(deb.getBandNames())
+    print(deb.getMetadataRoot().toString())
+    return deb, log
+
+def pair_geometry(logmsg, log, scenes, swaths):
+    # master/slave annotation 几何（轨道 + 地理定位网格）-> [(master_geom, slave_geom)]，按共同 swath
+    master_zip, slave_zip, polarization = scenes
+    m = s1_meta.read_zip_geometry(master_zip, polarization, swaths)
+    s = s1_meta.read_zip_geometry(slave_zip, polarization, swaths)
+    common = sorted(set(m) & set(s))
+    if not common:
+        raise RuntimeError(f"No common annotation geometry for swaths {swaths}")
+    for sw in common:
+        for name, geom in ((master_zip, m[sw]), (slave_zip, s[sw])):
+            if len(geom["orbit"]) < 2 or not geom["grid"] or not geom["radar_frequency"]:
+                raise RuntimeError(f"Incomplete orbit/geolocation annotation for {sw} in {os.path.basename(name)}")
+    return [(m[sw], s[sw]) for sw in common]
+
+def slant_range_time_reader(product):
+    # 每个像元的双程斜距时间（秒）：tie-point grid slant_range_time（ns），否则由 abstracted metadata 的首像元斜距与像元间距推算
+    tpg = product.getTiePointGrid("slant_range_time")
+    if tpg is not None:
+        def read(y, x, th, tw):
+            buf = np.zeros(th * tw, np.float32)
+            tpg.readPixels(x, y, tw, th, buf)
+            return buf.reshape(th, tw).astype(np.float64) * 1e-9
+        return read
+    abs_root = product.getMetadataRoot().getElement("Abstracted_Metadata")
+    r0 = abs_root.getAttributeDouble("slant_range_to_first_pixel")
+    dr = abs_root.getAttributeDouble("range_spacing")
+
+    def read(y, x, th, tw):
+        r = r0 + (x + np.arange(tw, dtype=np.float64)) * dr
+        return np.broadcast_to(2 * r / phase_height.C, (th, tw))
+    return read
+
+def phase_to_height(logmsg, log, unw, geoms, output_dir):
+    # 🔟+ 解缠相位 -> 高程（NumPy）：按块读取 Unw_/elevation/coh_ 波段换算，不经过额外的 SNAP 写出/读入
+    w, h = unw.getSceneRasterWidth(), unw.getSceneRasterHeight()
+    unw_band = find_band(unw, "Unw_")
+    if unw_band is None:
+        raise RuntimeError(f"No unwrapped phase band in {list(unw.getBandNames())}")
+    dem_band = unw.getBand("elevation")
+    coh_band = find_band(unw, "coh_")
+    read_tau = slant_range_time_reader(unw)
+
+    def read_band(band, y, x, th, tw):
+        buf = np.zeros(th * tw, np.float32)
+        band.readPixels(x, y, tw, th, buf)
+        return buf.reshape(th, tw)
+
+    model, stats = phase_height.build_model(geoms)
+    logmsg(log, "INFO", f"Step 10.2: Phase to height ({w}x{h}): B_perp {stats['bperp_m']} m, "
+                        f"height of ambiguity {stats['height_of_ambiguity_m']} m, incidence {stats['incidence_deg']} deg, "
+                        f"k fit error {stats['k_fit_error']}")
+
+    # 高程偏移与相位符号：参考 DEM（干涉图的 elevation 波段）上的高相干像元
+    cal = None
+    if dem_band is not None:
+        samples = [(read_band(unw_band, y, x, th, tw), read_tau(y, x, th, tw), read_band(dem_band, y, x, th, tw),
+                    read_band(coh_band, y, x, th, tw) if coh_band is not None else None)
+                   for y, x, th, tw in phase_height.sample_windows(h, w)]
+        nodata = dem_band.getNoDataValue() if dem_band.isNoDataValueUsed() else None
+        cal = phase_height.calibrate(model, samples, dem_nodata=nodata)
+    if cal is None:
+        logmsg(log, "WARN", "No reference elevation for calibration: heights are relative to an arbitrary offset.")
+    else:
+        logmsg(log, "INFO", f"Height calibration: offset {cal['offset_m']} m, residual NMAD {cal['residual_nmad_m']} m "
+                            f"over {cal['pixels']} px" + (" (phase sign flipped)" if cal["sign_flipped"] else ""))
+
+    def read_tile(y, x, th, tw):
+        return read_band(unw_band, y, x, th, tw), read_tau(y, x, th, tw)
+
+    log_fn = lambda level, msg: logmsg(log, level, msg)
+    height_dir = os.path.join(output_dir, HEIGHT_DIR)
+    os.makedirs(height_dir, exist_ok=True)
+    if w * h * 4 <= HEIGHT_INMEMORY_MB * 1024 ** 2:
+        out = np.zeros((h, w), np.float32)
+        phase_height.convert_tiled(read_tile, h, w, out, model, HEIGHT_TILE, HEIGHT_WORKERS, log_fn)
+        hgt = attach_band(unw, "height", data=out, unit="m", nodata=phase_height.NODATA, suffix="_hgt",
+                          exclude=("elevation",))
+    else:
+        out, hdr = envi_io.create_raster(os.path.join(height_dir, "height.img"), w, h,
+                                         band_names=["height"], description="Height from unwrapped phase")
+        phase_height.convert_tiled(read_tile, h, w, out, model, HEIGHT_TILE, HEIGHT_WORKERS, log_fn)
+        out.flush()
+        del out
+        hgt = attach_band(unw, "height", hdr=hdr, unit="m", nodata=phase_height.NODATA, suffix="_hgt",
+                          exclude=("elevation",))
+    with open(os.path.join(height_dir, "height_model.json"), "w") as f:
+        json.dump({"geometry": stats, "calibration": cal, "sign": model.sign, "offset_m": model.offset,
+                   "tau0": model.tau0, "tau_scale": model.tau_scale, "k_coeffs": [float(c) for c in model.coeffs]},
+                  f, indent=2)
+    logmsg(log, "INFO", "Step 10.2 done: height band attached.")
+    return hgt, log
 
+def phase_to_elevation_params(dem="SRTM 1Sec HGT"):
+    p = HashMap()
+    dem_params(p, dem)
+    p.put("demResamplingMethod", "BILINEAR_INTERPOLATION")
+    return p
+
+def snap_phase_to_elevation(logmsg, log, unw, dem="SRTM 1Sec HGT"):
+    # 🔟+ (--phase_to_height snap) SNAP PhaseToElevation；输出波段改名为 height，避免与 TC 的 saveDEM 波段同名
+    logmsg(log, "INFO", "Step 10.2: SNAP Phase to Elevation...")
+    hgt = GPF.createProduct("PhaseToElevation", phase_to_elevation_params(dem), unw)
+    band = hgt.getBand("elevation")
+    if band is not None:
+        band.setName("height")
+    logmsg(log, "INFO", f"Step 10.2 done. Bands: {list(hgt.getBandNames())}")
+    return hgt, log
+
+def terrain_correction_params(dem="SRTM 1Sec HGT"):
     # 11️⃣ Terrain Correction（投影到地理坐标并输出 DEM）
     p = HashMap()
-    p.put('demName', "SRTM 1Sec HGT")
     p.put('externalDEMNoDataValue', 0.0)                        # <externalDEMNoDataValue>
     p.put('externalDEMApplyEGM', True)                           # <externalDEMApplyEGM>
+    dem_params(p, dem)
     p.put('demResamplingMethod', 'BILINEAR_INTERPOLATION')       # <demResamplingMethod>
     p.put('imgResamplingMethod', 'BILINEAR_INTERPOLATION')       # <imgResamplingMethod>
     p.put('pixelSpacingInMeter', 10.0)                           # <pixelSpacingInMeter>
@@ -302,7 +698,7 @@ def fixed_pipeline(
         'AXIS["Geodetic longitude",EAST], AXIS["Geodetic latitude",NORTH], '
         'AUTHORITY["EPSG","4326"]]'
     ))
-    p.put('alignToStandardGrid', False)                          # <alignToStandardGrid>
+    p.put('alignToStandardGrid', TC_ALIGN_GRID)                  # <alignToStandardGrid>
     p.put('standardGridOriginX', 0.0)                            # <standardGridOriginX>
     p.put('standardGridOriginY', 0.0)                            # <standardGridOriginY>
     p.put('nodataValueAtSea', True)                              # <nodataValueAtSea>
@@ -324,15 +720,406 @@ def fixed_pipeline(
     p.put('incidenceAngleForSigma0', 'Use projected local incidence angle from DEM')
     p.put('incidenceAngleForGamma0', 'Use projected local incidence angle from DEM')
     p.put('auxFile', 'Latest Auxiliary File')
+    return p
+
+def subset_params(aoi_wkt, margin=None):
+    # geoRegion 为 JTS 几何；Terrain-Correction 需要 abstracted metadata，所以 copyMetadata
+    WKTReader = jpy.get_type('org.locationtech.jts.io.WKTReader')
+    region = WKTReader().read(aoi_wkt)
+    margin = TC_SUBSET_MARGIN_DEG if margin is None else margin
+    if margin:
+        region = region.buffer(margin)
+    p = HashMap()
+    p.put('geoRegion', region)
+    p.put('subSamplingX', Integer(1))
+    p.put('subSamplingY', Integer(1))
+    p.put('copyMetadata', True)
+    return p
+
+def aoi_subset(logmsg, log, deb, aoi_wkt):
+    # 🔟+ AOI Subset：只对覆盖 AOI 的像元做 Terrain-Correction
+    logmsg(log, "INFO", "Step 10.5: Subset to AOI before Terrain-Correction...")
+    sub = GPF.createProduct("Subset", subset_params(aoi_wkt), deb)
+    full = deb.getSceneRasterWidth() * deb.getSceneRasterHeight()
+    part = sub.getSceneRasterWidth() * sub.getSceneRasterHeight()
+    logmsg(log, "INFO", f"Step 10.5 done: {sub.getSceneRasterWidth()}x{sub.getSceneRasterHeight()} px "
+                        f"({100.0 * part / max(full, 1):.1f}% of the debursted scene).")
+    return sub, log
 
+def terrain_correction(logmsg, log, deb, output_dir, write_dimap=None, dem="SRTM 1Sec HGT"):
+    p = terrain_correction_params(dem)
     logmsg(log, "INFO", "Step 11: Terrain-Correction & export GeoTIFF...")
-    tc = GPF.createProduct("Terrain-Correction", p, deburst)
-    ProductIO.writeProduct(tc, os.path.join(output_dir, "ifg_deb_TC"), "BEAM-DIMAP");
+    tc = GPF.createProduct("Terrain-Correction", p, deb)
+    if TC_WRITE_DIMAP if write_dimap is None else write_dimap:
+        ProductIO.writeProduct(tc, os.path.join(output_dir, "ifg_deb_TC"), "BEAM-DIMAP")
+        # GeoTIFF 从刚写出的 DIMAP 导出，不再重新计算一遍 Terrain-Correction
+        tc = ProductIO.readProduct(os.path.join(output_dir, "ifg_deb_TC.dim"))
     ProductIO.writeProduct(tc, os.path.join(output_dir, "DEM_output"), "GeoTIFF-BigTIFF")
     logmsg(log, "INFO", "Step 11 done: terrain correction complete. DEM exported.")
+    return tc, log
+    
+def export_cog(logmsg, log, output_dir):
+    # 1️⃣1️⃣+ COG：按行带读取 DEM_output.tif，内存只与分块行带有关
+    src = os.path.join(output_dir, "DEM_output.tif")
+    dst = os.path.join(output_dir, "DEM_cog.tif")
+    logmsg(log, "INFO", "Step 11.1: Cloud-Optimized GeoTIFF export...")
+    n = cog_export.write_cog(src, dst, COG_TILE, COG_COMPRESSION,
+                             log=lambda level, msg: logmsg(log, level, msg))
+    logmsg(log, "INFO", f"Step 11.1 done: {dst} ({n} overviews, "
+                        f"{os.path.getsize(dst) / 1024 ** 2:.1f} MB vs {os.path.getsize(src) / 1024 ** 2:.1f} MB).")
+    return dst, log
 
-    logmsg(log, "INFO", "All steps finished successfully.")
+def run_snaphu(snaphu_dir, logmsg, log):
+    # 1. 查找 snaphu 可执行路径
+    snaphu_bin = shutil.which("snaphu") or "/gs/bs/tga-guc-lab/users/vickey/snaphu/snaphu-v2.0.7/bin/snaphu"
+    if not os.path.exists(snaphu_bin):
+        raise FileNotFoundError(f"[FATAL] SNAPHU not found at {snaphu_bin}")
+
+    # 2. 分块按影像尺寸与核数重新规划（覆盖 snaphu.conf 中的 NTILEROW/NTILECOL），输出实时写入日志
+    logmsg(log, "INFO", f"Step 9.3: Running SNAPHU at {snaphu_bin} ...")
+    logmsg(log, "INFO", f"Working dir: {snaphu_dir}")
+    try:
+        snaphu_runner.run_snaphu_tiled(
+            snaphu_bin, snaphu_dir,
+            lambda level, msg: logmsg(log, level, msg),
+            cores=SNAPHU_CORES,
+            timeout=SNAPHU_TIMEOUT,
+            retries=SNAPHU_RETRIES
+        )
+        logmsg(log, "INFO", "SNAPHU unwrap completed successfully.")
+    except (RuntimeError, ValueError) as e:
+        logmsg(log, "ERROR", str(e))
+        raise RuntimeError("SNAPHU unwrap failed.")
+
+# ---------------------- aux data ----------------------
+def prefetch_aux(logmsg, log, scenes, aoi=None, iw="auto", polarization="VV"):
+    # 处理开始前准备所有景的 DEM 瓦片与轨道文件；离线模式下有缺失立即失败。未配置 AUX_DIR 时返回 None
+    if not AUX_DIR:
+        if AUX_OFFLINE:
+            raise RuntimeError("Offline mode needs an aux-data cache (--aux_dir)")
+        return None
+    aux = aux_cache.AuxCache(AUX_DIR, AUX_OFFLINE, lambda level, msg: logmsg(log, level, msg))
+    logmsg(log, "INFO", f"Aux data: {'checking' if AUX_OFFLINE else 'prefetching'} DEM/orbits for "
+                        f"{len(scenes)} scenes in {aux.root}")
+    missing = aux.prefetch(scenes, aoi, iw, polarization)
+    if missing:
+        if AUX_OFFLINE:
+            for m in missing:
+                logmsg(log, "ERROR", f"Aux data missing: {m}")
+            raise aux_cache.AuxMissing(f"{len(missing)} aux-data items missing in offline mode")
+        logmsg(log, "WARN", f"Aux data not available: {', '.join(missing)}; SNAP will try to download them.")
+    return aux
+
+def aux_dem(logmsg, log, aux, scenes, aoi=None, iw="auto", polarization="VV", dem="SRTM 1Sec HGT"):
+    # SRTM 1Sec HGT -> 缓存中拼接好的 External DEM（覆盖这些景选中的 burst）
+    if aux is None or dem != "SRTM 1Sec HGT":
+        return dem
+    bbox = aux_cache.union_bbox(aux_cache.scene_dem_bbox(p, aoi, iw, polarization) for p in scenes)
+    path = aux.dem_mosaic(bbox)
+    logmsg(log, "INFO", f"Using cached SRTM mosaic as External DEM: {path}")
+    return path
+
+
+# ---------------------- dry-run plan ----------------------
+def plan_options(cache=None):
+    # 与本次运行相同的配置 -> pair_plan 的 options
+    return {
+        "goldstein": GOLDSTEIN,
+        "goldstein_tile": GOLDSTEIN_TILE,
+        "goldstein_workers": GOLDSTEIN_WORKERS,
+        "goldstein_inmemory_mb": GOLDSTEIN_INMEMORY_MB,
+        "flt_write_dimap": FLT_WRITE_DIMAP,
+        "unwrapper": UNWRAPPER,
+        "snaphu_cores": SNAPHU_CORES,
+        "unw_tile": NUMPY_UNW_TILE,
+        "unw_overlap": NUMPY_UNW_OVERLAP,
+        "unw_workers": NUMPY_UNW_WORKERS,
+        "unw_inmemory_mb": NUMPY_UNW_INMEMORY_MB,
+        "phase_to_height": PHASE_TO_HEIGHT,
+        "height_inmemory_mb": HEIGHT_INMEMORY_MB,
+        "height_tile": HEIGHT_TILE,
+        "height_workers": HEIGHT_WORKERS,
+        "tc_subset": TC_SUBSET,
+        "subset_margin": TC_SUBSET_MARGIN_DEG,
+        "tc_write_dimap": TC_WRITE_DIMAP,
+        "cog": COG_EXPORT,
+        "cache": cache is not None,
+    }
+
+def plan_run(pairs, aoi=None, iw="auto", polarization="VV", cache=None):
+    # --plan：不创建 GPF 算子链、不启动 JVM
+    return pair_plan.plan_pairs(pairs, aoi, iw, polarization, MAX_TEMPORAL_BASELINE_DAYS, plan_options(cache))
+
+def check_pairs(logmsg, log, pairs, aoi=None, iw="auto", polarization="VV", cache=None):
+    # 处理开始前拒绝时间基线过长 / burst 不重叠的 pair；返回 (可处理的 pairs, {(master, slave): 拒绝原因})
+    plan = plan_run(pairs, aoi, iw, polarization, cache)
+    ok, rejected = [], {}
+    for (m, s, n), p in zip(pairs, plan["pairs"]):
+        if p["accepted"]:
+            ok.append((m, s, n))
+            logmsg(log, "INFO", f"Plan {pair_name(m, s)}: {p['temporal_baseline_days']} days, swaths "
+                                f"{sorted(p['swaths'])}, ~{p['disk_gb']} GB disk, ~{p['memory']['peak_gb']} GB peak memory")
+        else:
+            rejected[(m, s)] = "; ".join(p["reasons"])
+            logmsg(log, "ERROR", f"Pair {pair_name(m, s)} rejected: {rejected[(m, s)]}")
+    return ok, rejected
+
+
+# ---------------------- stage cache ----------------------
+def hashmap_items(p, exclude=()):
+    # HashMap -> [(key, value)]，用于计算阶段缓存键；exclude 去掉与输出位置相关的参数
+    return [(str(k), str(p.get(k))) for k in p.keySet().toArray() if str(k) not in exclude]
+
+
+def open_stage_cache(cache_dir=None, max_gb=None):
+    cache_dir = STAGE_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return None
+    return StageCache(cache_dir, STAGE_CACHE_GB if max_gb is None else max_gb)
+
+
+class Stage:
+    """惰性阶段节点
 
+    key = hash(上游键 + 算子参数)。product() 时若本阶段在缓存中命中，直接读取 BEAM-DIMAP，
+    上游阶段完全不构建；否则 build() 并（对 CACHE_STAGES 中的阶段）写入缓存后从磁盘重新读取。
+    读取缓存条目期间该条目被 pin（不会被淘汰），release() / dispose() 时解除。
+    """
+
+    def __init__(self, name, key, build, cache=None, cacheable=None):
+        self.name = name
+        self.key = key
+        self.build = build
+        self.cache = cache
+        self.cacheable = (name.split(":")[0] in CACHE_STAGES) if cacheable is None else cacheable
+        self._product = None
+        self._pinned = False
+        self.lock = threading.Lock()
+
+    def product(self, logmsg, log):
+        with self.lock:
+            if self._product is None:
+                self._product = self._resolve(logmsg, log)
+            return self._product
+
+    def _resolve(self, logmsg, log):
+        profiler = stage_profile.current()
+        if profiler is None:
+            return self._load_or_build(logmsg, log)
+        with profiler.stage(self.name) as rec:
+            return self._load_or_build(logmsg, log, profiler, rec)
+
+    def _load_or_build(self, logmsg, log, profiler=None, rec=None):
+        use_cache = self.cache is not None and self.cacheable
+        if use_cache:
+            path = self.cache.lookup(self.key)
+            if path:
+                product = ProductIO.readProduct(path)
+                if product is not None:
+                    logmsg(log, "INFO", f"Stage {self.name}: cache hit {self.key[:12]} ({path})")
+                    if rec is not None:
+                        rec["cached"] = True
+                    self._pinned = True
+                    return product
+                self.cache.release(self.key)
+                logmsg(log, "WARN", f"Stage {self.name}: unreadable cache entry {path}, rebuilding")
+
+        product = self.build(logmsg, log)
+        if use_cache and self.cacheable:  # build 可能关闭 cacheable（如 ESD 回退）
+            tmp_dir, base = self.cache.staging_path(self.key)
+            try:
+                ProductIO.writeProduct(product, base, "BEAM-DIMAP")
+            except Exception:
+                self.cache.abort(tmp_dir)
+                raise
+            path = self.cache.commit(self.key, tmp_dir, {"stage": self.name})
+            self._pinned = True
+            logmsg(log, "INFO", f"Stage {self.name}: cached {self.key[:12]} ({path})")
+        elif profiler is not None and profiler.materialize and self.name != "read":
+            # 强制落盘：惰性图的计算开销记在本阶段，而不是下游第一个 writeProduct
+            os.makedirs(profiler.scratch_dir, exist_ok=True)
+            base = os.path.join(profiler.scratch_dir, f"{self.name}_{self.key[:12]}")
+            ProductIO.writeProduct(product, base, "BEAM-DIMAP")
+            path = base + ".dim"
+            rec["materialized"] = True
+        else:
+            return product
+        # 下游从落盘结果读取，避免再次计算整条惰性链
+        return ProductIO.readProduct(path)
+
+    def release(self):
+        # 不再读取本阶段的缓存条目（pair 结束）：解除 pin，使其可以按 LRU 淘汰
+        if self._pinned:
+            self._pinned = False
+            self.cache.release(self.key)
+
+    def dispose(self):
+        with self.lock:
+            if self._product is not None:
+                self._product.dispose()
+                self._product = None
+            self.release()
+
+
+def release_stages(stages):
+    for stage in stages:
+        stage.release()
+
+
+def profiled(name):
+    # 非 Stage 步骤（snaphu、Terrain-Correction）的计时；未启用 profiling 时为空操作
+    profiler = stage_profile.current()
+    return profiler.stage(name) if profiler else contextlib.nullcontext()
+
+
+def make_profiler(output_dir, materialize=False):
+    return StageProfiler(heap_mb=jvm_heap_used_mb, materialize=materialize,
+                         scratch_dir=os.path.join(output_dir, PROFILE_SCRATCH))
+
+
+def jvm_heap_used_mb():
+    rt = jpy.get_type('java.lang.Runtime').getRuntime()
+    return (rt.totalMemory() - rt.freeMemory()) / 1024 ** 2
+
+
+def op_stage(name, op, params, sources, cache=None, build=None, key_params=None):
+    # 单个 GPF 算子阶段；build 省略时直接 GPF.createProduct(op, params, 上游产品)
+    items = hashmap_items(params) if key_params is None else key_params
+    key = stage_key(name, op, items, [s.key for s in sources])
+    if build is None:
+        def build(logmsg, log):
+            products = [s.product(logmsg, log) for s in sources]
+            logmsg(log, "INFO", f"Stage {name}: {op}")
+            return GPF.createProduct(op, params, products if len(products) > 1 else products[0])
+    return Stage(name, key, build, cache)
+
+
+# ---------------------- checkpoint / resume ----------------------
+STATE_NAME = "pipeline_state.json"
+
+
+class PipelineState:
+    """output_dir/pipeline_state.json：输入参数 + 已完成步骤（时间、产物路径）"""
+
+    def __init__(self, output_dir, inputs):
+        self.path = os.path.join(output_dir, STATE_NAME)
+        self.inputs = inputs
+        self.steps = {}
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("inputs") != self.inputs:
+            return False
+        self.steps = data.get("steps", {})
+        return True
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"inputs": self.inputs, "steps": self.steps}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def mark(self, step, outputs=()):
+        self.steps[str(step)] = {
+            "done": datetime.datetime.now().isoformat(timespec="seconds"),
+            "outputs": [o for o in outputs if o],
+        }
+        self.save()
+
+    def done(self, step):
+        return str(step) in self.steps
+
+    def next_step(self):
+        # 最高的、产物仍在磁盘上的已完成步骤 + 1；
+        # 阶段缓存命中时其上游步骤（1-7）不会被构建和标记，因此不要求步骤连续
+        done = [int(s) for s, rec in self.steps.items()
+                if s.isdigit() and all(os.path.exists(o) for o in rec.get("outputs", []))]
+        return max(done, default=0) + 1
+
+
+def resume_step(logmsg, log, state, output_dir, resume=False, from_step=None):
+    """根据 state 和磁盘上的检查点确定实际起始步骤（1 / 9 / 10）
+
+    可复用的检查点：步骤 8 的 ifg_flt.dim（-> 从 9 开始），步骤 9 的 snaphu/UnwPhase*
+    或 unw_numpy/Unw_Phase.*（-> 从 10 开始）；
+    步骤 10 的 Deburst 不落盘，--from-step 11 等同于 10。
+    """
+    if not resume and from_step is None:
+        return 1
+    if not state.load():
+        logmsg(log, "WARN", f"No usable {STATE_NAME} for these inputs, starting from step 1.")
+        return 1
+
+    requested = from_step if from_step is not None else state.next_step()
+    flt_ok = state.done(8) and os.path.exists(os.path.join(output_dir, "ifg_flt.dim"))
+    if UNWRAPPER == "numpy":
+        unw_ok = flt_ok and state.done(9) and os.path.exists(os.path.join(output_dir, NUMPY_UNW_DIR, "Unw_Phase.hdr"))
+    else:
+        unw_ok = flt_ok and state.done(9) and find_unw_hdr(os.path.join(output_dir, "snaphu"), require_data=True)
+    if requested >= 10 and unw_ok:
+        start = 10
+    elif requested >= 9 and flt_ok:
+        start = 9
+    else:
+        start = 1
+    if start != requested:
+        logmsg(log, "INFO", f"Requested step {requested}, nearest checkpoint allows step {start}.")
+    logmsg(log, "INFO", f"Resuming from step {start}.")
+    return start
+
+
+# ---------------------- pipeline ----------------------
+def fixed_pipeline(
+    master_zip,
+    slave_zip,
+    output_dir,
+    iw="auto",
+    polarization="VV",
+    dem="SRTM 1Sec HGT",
+    cache=None,
+    aoi=None,
+    resume=False,
+    from_step=None,
+    profile=False,
+    materialize=False
+):
+    start_time = datetime.datetime.now()  # Start time
+    os.makedirs(output_dir, exist_ok=True)
+    log_path = os.path.join(output_dir, "log.txt")
+    log = open(log_path, "a" if (resume or from_step) else "w")
+    _, rejected = check_pairs(logmsg, log, [(master_zip, slave_zip, None)], aoi, iw, polarization, cache)
+    if rejected:
+        log.close()
+        raise RuntimeError(f"Pair rejected: {rejected[(master_zip, slave_zip)]}")
+    init_snap()
+    if SNAP_CONFIG:
+        logmsg(log, "INFO", f"SNAP config: {snap_config.describe(SNAP_CONFIG)}")
+
+    # DEM / 轨道：共享缓存（离线模式下缺失即失败）
+    aux = prefetch_aux(logmsg, log, [master_zip, slave_zip], aoi, iw, polarization)
+    dem = aux_dem(logmsg, log, aux, [master_zip, slave_zip], aoi, iw, polarization, dem)
+
+    # 1️⃣-4️⃣ Read -> Apply-Orbit -> TOPSAR-Split -> Re-apply orbit（惰性，由 process_pair 拉取）
+    master = prepare_scene(logmsg, log, master_zip, iw, polarization, cache, aoi)
+    slave = prepare_scene(logmsg, log, slave_zip, iw, polarization, cache, aoi)
+
+    state = PipelineState(output_dir, pair_inputs(master_zip, slave_zip, iw, polarization, dem, aoi))
+    start_step = resume_step(logmsg, log, state, output_dir, resume, from_step)
+    try:
+        if profile or materialize:
+            run_profiled(logmsg, log, make_profiler(output_dir, materialize), output_dir,
+                         process_pair, logmsg, log, master, slave, output_dir, dem, cache, state, start_step, aoi,
+                         (master_zip, slave_zip, polarization))
+        else:
+            process_pair(logmsg, log, master, slave, output_dir, dem, cache, state, start_step, aoi,
+                         (master_zip, slave_zip, polarization))
+    finally:
+        # 流水线模式在同一进程内连续处理多个 pair：两景的缓存条目不再 pin
+        release_stages(list(master.values()) + list(slave.values()))
     
     end_time = datetime.datetime.now()  # End time
     duration = end_time - start_time
@@ -340,14 +1127,674 @@ def fixed_pipeline(
     log.close()
 
 
+def run_profiled(logmsg, log, profiler, output_dir, fn, *args):
+    # 失败时也写出已完成阶段的记录；强制落盘的临时产品在结束后删除
+    try:
+        with profiler.active():
+            return fn(*args)
+    finally:
+        path = profiler.write(output_dir)
+        logmsg(log, "INFO", f"Stage profile written: {path}")
+        shutil.rmtree(profiler.scratch_dir, ignore_errors=True)
+
+
+def pair_inputs(master_zip, slave_zip, iw, polarization, dem, aoi=None):
+    # 写入 state 的输入标识；不一致时不允许 resume
+    return {
+        "master": os.path.basename(master_zip.rstrip("/\\")),
+        "slave": os.path.basename(slave_zip.rstrip("/\\")),
+        "iw": iw,
+        "polarization": polarization,
+        "dem": dem,
+        "aoi": list(s1_meta.load_aoi_bbox(aoi)),
+    }
+
+
+def prepare_scene(logmsg, log, zip_path, iw="auto", polarization="VV", cache=None, aoi=None):
+    # Steps 1-4 for ONE scene (read -> Apply-Orbit -> TOPSAR-Split -> Apply-Orbit)
+    # 返回 {swath: 惰性 Stage}；swath/burst 由 AOI 决定，读取与第一次 Apply-Orbit 在各 swath 间共享
+    # batch_pipeline 把同一组 Stage 共享给所有包含该景的 pair
+    scene = os.path.basename(zip_path.rstrip("/\\"))
+
+    def build_read(logmsg, log):
+        logmsg(log, "INFO", f"Reading {scene}")
+        product = ProductIO.readProduct(safe_input_path(zip_path))
+        if product is None:
+            logmsg(log, "ERROR", f"Failed to read {zip_path}")
+            raise RuntimeError("ReadProduct returned None")
+        logmsg(log, "INFO", f"Step 1 done: read {scene}.")
+        return product
+
+    bursts = select_scene_bursts(logmsg, log, zip_path, polarization, aoi, iw)
+    read = Stage("read", input_key(zip_path), build_read, cache)
+    orb = op_stage("orbit", "Apply-Orbit-File", orbit_params(), [read], cache)
+    swaths = {}
+    for sw, (first, last) in bursts.items():
+        split = op_stage(f"split:{sw}", "TOPSAR-Split", split_params(sw, polarization, first, last), [orb], cache)
+        swaths[sw] = op_stage(f"split_orb:{sw}", "Apply-Orbit-File", orbit_params(), [split], cache)
+    return swaths
+
+
+def process_pair(logmsg, log, master_split_orb, slave_split_orb, output_dir, dem="SRTM 1Sec HGT", cache=None,
+                 state=None, start_step=1, aoi=None, scenes=None):
+    # pair 结束（成功或失败）后解除本 pair 各阶段对缓存条目的 pin；景级阶段（1-4）由调用方释放
+    stages = []
+    try:
+        return _process_pair(stages, logmsg, log, master_split_orb, slave_split_orb, output_dir, dem, cache,
+                             state, start_step, aoi, scenes)
+    finally:
+        release_stages(stages)
+
+
+def _process_pair(stages, logmsg, log, master_split_orb, slave_split_orb, output_dir, dem="SRTM 1Sec HGT",
+                  cache=None, state=None, start_step=1, aoi=None, scenes=None):
+    # Steps 5-11 on split + orbit-corrected master/slave Stages（{swath: Stage}，来自 prepare_scene）
+    # 从最后一个阶段往回拉取：缓存命中的阶段之前的部分不会被构建
+    # start_step 9/10：用 output_dir 中的 ifg_flt.dim / snaphu 结果替换对应阶段（键不变）
+    # 多个 swath：每个 swath 做 5-7 与 Deburst，再 TOPSAR-Merge，之后的 8-11 在合并产品上进行（不再 Deburst）
+    # COH_GATE：步骤 8 之后、解缠之前检查 AOI 内相干性，不可用的 pair 抛出 LowCoherenceError
+    # PHASE_TO_HEIGHT：Deburst 之后换算高程（scenes=(master_zip, slave_zip, polarization) 提供 annotation 几何）
+    # TC_SUBSET：Terrain-Correction 之前按 AOI 多边形裁剪
+    os.makedirs(output_dir, exist_ok=True)
+
+    def pair_stage(*args, **kwargs):
+        stage = op_stage(*args, **kwargs)
+        stages.append(stage)
+        return stage
+    mark = state.mark if state else (lambda step, outputs=(): None)
+    if start_step == 1 and state:
+        state.steps = {}
+        state.save()
+
+    swaths = sorted(set(master_split_orb) & set(slave_split_orb))
+    if not swaths:
+        logmsg(log, "ERROR", f"No common sub-swath: master {sorted(master_split_orb)}, slave {sorted(slave_split_orb)}")
+        raise RuntimeError("Master and slave have no common sub-swath over the AOI")
+    multi = len(swaths) > 1
+
+    def swath_ifg(sw, master, slave):
+        suffix = f":{sw}" if multi else ""
+
+        # 5️⃣ Back-Geocoding (stack)
+        def build_bg(logmsg, log):
+            master_product, slave_product = master.product(logmsg, log), slave.product(logmsg, log)
+            for step in (1, 2, 3, 4):
+                mark(step)
+            bg, log = back_geocoding(logmsg, log, dem, master_product, slave_product)
+            # ProductIO.writeProduct(bg, os.path.join(output_dir, "stack_bg"), "BEAM-DIMAP")
+            logmsg(log, "INFO", f"Step 5 done ({sw}). Bands: {list(bg.getBandNames())}")
+            mark(5)
+            return bg
+        bg = pair_stage("bg" + suffix, "Back-Geocoding", back_geocoding_params(dem), [master, slave], cache, build_bg)
+
+        # 6️⃣ Enhanced Spectral Diversity (optional, auto-fallback；单个 burst 时没有重叠区，会回退)
+        def build_esd(logmsg, log):
+            bg_product = bg.product(logmsg, log)
+            try:
+                logmsg(log, "INFO", f"Step 6: Running Enhanced-Spectral-Diversity ({sw})...")
+                esd_product, log = enhanced_spectral_diversity(logmsg, log, bg_product)
+                logmsg(log, "INFO", f"Step 6 done. ESD bands: {list(esd_product.getBandNames())}")
+                mark(6)
+                return esd_product
+            except Exception as e:
+                logmsg(log, "WARN", f"ESD failed: {e}. Using Back-Geocoding result.")
+                esd.cacheable = False
+                mark(6)
+                return bg_product
+        esd = pair_stage("esd" + suffix, "Enhanced-Spectral-Diversity", esd_params(), [bg], cache, build_esd)
+
+        # 7️⃣ Interferogram Formation
+        def build_ifg(logmsg, log):
+            ifg, log = interferogram(logmsg, log, esd.product(logmsg, log), dem)
+            ifg_bands = list(ifg.getBandNames())
+            logmsg(log, "INFO", f"Step 7 done ({sw}). IFG bands: {ifg_bands}")
+            if len(ifg_bands) == 0:
+                logmsg(log, "ERROR", "Interferogram has no bands. Check overlap/bursts/metadata.")
+                raise RuntimeError("IFG empty")
+            mark(7)
+            return ifg
+        return pair_stage("ifg" + suffix, "Interferogram", interferogram_params(dem), [esd], cache, build_ifg)
+
+    ifgs = [swath_ifg(sw, master_split_orb[sw], slave_split_orb[sw]) for sw in swaths]
+    if multi:
+        # 各 swath Deburst 后 TOPSAR-Merge
+        def swath_deburst(ifg_stage):
+            def build(logmsg, log):
+                deb, log = deburst(logmsg, log, ifg_stage.product(logmsg, log))
+                return deb
+            return build
+        debs = [pair_stage(f"deburst:{sw}", "TOPSAR-Deburst", HashMap(), [ifg_stage], cache, swath_deburst(ifg_stage))
+                for sw, ifg_stage in zip(swaths, ifgs)]
+        logmsg(log, "INFO", f"Merging sub-swaths {swaths} with TOPSAR-Merge.")
+        ifg = pair_stage("merge", "TOPSAR-Merge", HashMap(), debs, cache)
+    else:
+        ifg = ifgs[0]
+
+    # 8️⃣ Goldstein Phase Filtering（本身写出 ifg_flt.dim，不再进缓存）
+    def build_flt(logmsg, log):
+        flt, log = goldstein_phase_filtering(logmsg, log, ifg.product(logmsg, log), output_dir)
+        logmsg(log, "INFO", "Step 8 done.")
+        mark(8, [os.path.join(output_dir, "ifg_flt.dim")] if FLT_WRITE_DIMAP else [])
+        return flt
+    flt_key = hashmap_items(goldstein_params())
+    if GOLDSTEIN == "numpy":
+        flt_key.append(("backend", "numpy"))
+    flt = pair_stage("flt", "GoldsteinPhaseFiltering", None, [ifg], cache, build_flt, key_params=flt_key)
+    if start_step >= 9:
+        def read_flt(logmsg, log):
+            logmsg(log, "INFO", "Step 8: reusing ifg_flt.dim checkpoint.")
+            return ProductIO.readProduct(os.path.join(output_dir, "ifg_flt.dim"))
+        flt.build = read_flt
+
+    # 9️⃣ SNAPHU export -> snaphu -> import
+    def build_unw(logmsg, log):
+        if COH_GATE != "off":
+            check_coherence(logmsg, log, flt.product(logmsg, log), output_dir, aoi)
+            mark("8.5", [os.path.join(output_dir, coherence_gate.REPORT)])
+        if UNWRAPPER == "numpy":
+            unw, log = numpy_unwrap(logmsg, log, flt.product(logmsg, log), output_dir, state)
+            return unw
+        # 从步骤 9 续跑且导出已完成时，直接重跑 snaphu
+        snaphu_conf = os.path.join(output_dir, "snaphu", "snaphu.conf")
+        skip_export = start_step >= 9 and bool(state) and state.done("9.1") and os.path.exists(snaphu_conf)
+        unw, log = snaphu_unwrap(logmsg, log, flt.product(logmsg, log), output_dir, state, skip_export)
+        return unw
+    if UNWRAPPER == "numpy":
+        unw_key = [("unwrapper", "numpy"), ("tile", NUMPY_UNW_TILE), ("overlap", NUMPY_UNW_OVERLAP),
+                   ("max_iter", unwrap_np.MAX_ITER), ("tol", unwrap_np.TOL)]
+    else:
+        unw_key = hashmap_items(snaphu_export_params(""), exclude=("targetFolder",))
+    unw = pair_stage("unw", "SNAPHU" if UNWRAPPER == "snaphu" else "NumPyUnwrap", None, [flt], cache, build_unw,
+                   key_params=unw_key)
+    if start_step >= 10:
+        def import_unw(logmsg, log):
+            flt_product = flt.product(logmsg, log)
+            if UNWRAPPER == "numpy":
+                logmsg(log, "INFO", "Step 9: reusing NumPy unwrap checkpoint.")
+                return attach_unwrapped(flt_product, "Unw_" + find_band(flt_product, "Phase_").getName(),
+                                        hdr=os.path.join(output_dir, NUMPY_UNW_DIR, "Unw_Phase.hdr"))
+            logmsg(log, "INFO", "Step 9: reusing SNAPHU output checkpoint.")
+            unw, log = snaphu_import(logmsg, log, flt_product, os.path.join(output_dir, "snaphu"))
+            return unw
+        unw.build = import_unw
+
+    # 🔟 Deburst（多 swath 时已在合并前完成）
+    def build_deburst(logmsg, log):
+        deb, log = deburst(logmsg, log, unw.product(logmsg, log))
+        mark(10)
+        return deb
+    deb = unw if multi else pair_stage("deburst", "TOPSAR-Deburst", HashMap(), [unw], cache, build_deburst)
+
+    # 🔟+ 相位 -> 高程（不进缓存：换算很快，输入已由 unw/deburst 缓存）
+    if PHASE_TO_HEIGHT == "numpy" and not scenes:
+        logmsg(log, "WARN", "Phase to height skipped: scene paths not given (no annotation geometry).")
+    elif PHASE_TO_HEIGHT in ("numpy", "snap"):
+        def build_height(logmsg, log):
+            if PHASE_TO_HEIGHT == "snap":
+                hgt, log = snap_phase_to_elevation(logmsg, log, deb_unw.product(logmsg, log), dem)
+                return hgt
+            geoms = pair_geometry(logmsg, log, scenes, swaths)
+            hgt, log = phase_to_height(logmsg, log, deb_unw.product(logmsg, log), geoms, output_dir)
+            return hgt
+        if PHASE_TO_HEIGHT == "numpy":
+            height_key = [("backend", "numpy"), ("degree", phase_height.POLY_DEGREE), ("delta_h", phase_height.DELTA_H),
+                          ("cal_windows", phase_height.CAL_WINDOWS), ("cal_window", phase_height.CAL_WINDOW),
+                          ("cal_min_coherence", phase_height.CAL_MIN_COHERENCE)]
+        else:
+            height_key = hashmap_items(phase_to_elevation_params(dem))
+        deb_unw = deb
+        deb = pair_stage("height", "PhaseToElevation" if PHASE_TO_HEIGHT == "snap" else "NumPyPhaseToHeight", None,
+                       [deb_unw], cache, build_height, key_params=height_key)
+
+    # 🔟+ AOI Subset
+    if TC_SUBSET:
+        aoi_wkt = s1_meta.load_aoi_wkt(aoi)
+        def build_subset(logmsg, log):
+            sub, log = aoi_subset(logmsg, log, deb_full.product(logmsg, log), aoi_wkt)
+            return sub
+        deb_full = deb
+        deb = pair_stage("subset", "Subset", subset_params(aoi_wkt), [deb_full], cache, build_subset)
+
+    # 11️⃣ Terrain Correction
+    deb_product = deb.product(logmsg, log)
+    with profiled("terrain_correction"):
+        terrain_correction(logmsg, log, deb_product, output_dir, dem=dem)
+    outputs = [os.path.join(output_dir, "DEM_output.tif")]
+    if TC_WRITE_DIMAP:
+        outputs.insert(0, os.path.join(output_dir, "ifg_deb_TC.dim"))
+    if COG_EXPORT:
+        with profiled("cog_export"):
+            cog, log = export_cog(logmsg, log, output_dir)
+        outputs.append(cog)
+    mark(11, outputs)
+
+    logmsg(log, "INFO", "All steps finished successfully.")
+
+
+# ---------------------- batch ----------------------
+def load_pair_list(path):
+    # 每行 "master,slave[,name]"，# 开头为注释
+    pairs = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = [x.strip() for x in line.split(",")]
+            if len(parts) < 2:
+                raise ValueError(f"Bad pair line: {line}")
+            pairs.append((parts[0], parts[1], parts[2] if len(parts) > 2 else None))
+    return pairs
+
+
+def network_pairs(scene_dir, max_days=48, max_neighbors=2, catalog=None, aoi=None, mode=None):
+    # 下载目录中的景 -> 小基线网络；catalog 为 slc_dl 的 scene_catalog.sqlite（提供 path/frame）
+    # mode="baseline"：按垂直基线排序（每景最多 max_neighbors 个 pair），基线缓存在 scene_dir/baseline_cache.json
+    scenes = s1_meta.find_scenes(scene_dir)
+    tracks = s1_meta.catalog_tracks(catalog)
+    if (mode or NETWORK_MODE) == "baseline":
+        pairs = baseline_network.build_network(
+            scenes, aoi, tracks, os.path.join(scene_dir, baseline_network.CACHE_NAME), BPERP_RANGE[0], BPERP_RANGE[1],
+            max_days, max_neighbors)
+        for line in baseline_network.pair_lines(pairs):
+            print(f"[INFO] {line}")
+        return [(p["master"], p["slave"], None) for p in pairs]
+    return [(m, s, None) for m, s in s1_meta.small_baseline_pairs(scenes, max_days, max_neighbors, tracks)]
+
+
+def pair_name(master_zip, slave_zip):
+    m, s = s1_meta.scene_info(master_zip), s1_meta.scene_info(slave_zip)
+    if m and s:
+        return f"{m['start']:%Y%m%d}_{s['start']:%Y%m%d}"
+    strip = lambda p: os.path.splitext(os.path.basename(p.rstrip("/\\")))[0]
+    return f"{strip(master_zip)}__{strip(slave_zip)}"
+
+
+class SceneCache:
+    """Steps 1-4 按景共享：多个 pair 使用同一个 Stage（只计算一次）；最后一个 pair 用完后 dispose"""
+
+    def __init__(self, logmsg, log, iw, polarization, refcounts, cache=None, aoi=None):
+        self.logmsg, self.log = logmsg, log
+        self.iw, self.polarization = iw, polarization
+        self.cache = cache
+        self.aoi = aoi
+        self.refcounts = dict(refcounts)
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        # Stage 构建是惰性的，实际计算发生在第一个 pair 调用 product() 时（Stage 内部加锁）
+        with self.lock:
+            if path not in self.stages:
+                self.stages[path] = prepare_scene(self.logmsg, self.log, path, self.iw, self.polarization,
+                                                  self.cache, self.aoi)
+            return self.stages[path]
+
+    def release(self, path):
+        with self.lock:
+            self.refcounts[path] -= 1
+            if self.refcounts[path] > 0 or path not in self.stages:
+                return
+            stages = self.stages.pop(path)
+        try:
+            for stage in stages.values():
+                stage.dispose()
+        except Exception as e:
+            self.logmsg(self.log, "WARN", f"dispose failed for {os.path.basename(path)}: {e}")
+
+
+def batch_pipeline(
+    pairs,
+    output_root,
+    iw="auto",
+    polarization="VV",
+    dem="SRTM 1Sec HGT",
+    workers=BATCH_WORKERS,
+    memory_gb=None,
+    pair_memory_gb=PAIR_MEMORY_GB,
+    cache=None,
+    aoi=None,
+    resume=False,
+    from_step=None,
+    profile=False,
+    materialize=False
+):
+    # 一个 SNAP/JVM 会话内处理多个 pair：
+    # - 每景的 read + orbit + split 只做一次（SceneCache）
+    # - pair 级线程池，并发数受内存预算限制：min(workers, memory_gb // pair_memory_gb)
+    start_time = datetime.datetime.now()
+    os.makedirs(output_root, exist_ok=True)
+    log = open(os.path.join(output_root, "batch_log.txt"), "a")
+    pairs, rejected = check_pairs(logmsg, log, pairs, aoi, iw, polarization, cache)
+    init_snap()
+    if SNAP_CONFIG:
+        logmsg(log, "INFO", f"SNAP config: {snap_config.describe(SNAP_CONFIG)}")
+
+    if memory_gb is None:
+        memory_gb = jvm_max_memory_gb()
+    workers = max(1, min(workers, int(memory_gb // pair_memory_gb) if pair_memory_gb else workers))
+    if (profile or materialize) and workers > 1:
+        # CPU、写出字节数、RSS/堆峰值都是进程级的：并发 pair 会互相计入
+        logmsg(log, "WARN", f"--profile: CPU/IO/memory are process-wide, processing pairs one at a time "
+                            f"instead of {workers}.")
+        workers = 1
+    logmsg(log, "INFO", f"Batch: {len(pairs)} pairs, {workers} workers "
+                        f"(memory budget {memory_gb:.1f} GB, {pair_memory_gb} GB per pair)")
+
+    refcounts = {}
+    for m, s, _ in pairs:
+        refcounts[m] = refcounts.get(m, 0) + 1
+        refcounts[s] = refcounts.get(s, 0) + 1
+    aux = prefetch_aux(logmsg, log, sorted(refcounts), aoi, iw, polarization)
+    scenes = SceneCache(logmsg, log, iw, polarization, refcounts, cache, aoi)
+
+    def run_one(master_zip, slave_zip, name):
+        out_dir = os.path.join(output_root, name or pair_name(master_zip, slave_zip))
+        os.makedirs(out_dir, exist_ok=True)
+        pair_log = open(os.path.join(out_dir, "log.txt"), "a" if (resume or from_step) else "w")
+        t0 = datetime.datetime.now()
+        try:
+            logmsg(pair_log, "INFO", f"Pair master={os.path.basename(master_zip)}, slave={os.path.basename(slave_zip)}")
+            master = scenes.get(master_zip)
+            slave = scenes.get(slave_zip)
+            pair_dem = aux_dem(logmsg, pair_log, aux, [master_zip, slave_zip], aoi, iw, polarization, dem)
+            state = PipelineState(out_dir, pair_inputs(master_zip, slave_zip, iw, polarization, pair_dem, aoi))
+            start_step = resume_step(logmsg, pair_log, state, out_dir, resume, from_step)
+            if profile or materialize:
+                run_profiled(logmsg, pair_log, make_profiler(out_dir, materialize), out_dir,
+                             process_pair, logmsg, pair_log, master, slave, out_dir, pair_dem, cache, state,
+                             start_step, aoi, (master_zip, slave_zip, polarization))
+            else:
+                process_pair(logmsg, pair_log, master, slave, out_dir, pair_dem, cache, state, start_step, aoi,
+                             (master_zip, slave_zip, polarization))
+            logmsg(pair_log, "INFO", f"Total execution time: {datetime.datetime.now() - t0}")
+            return out_dir
+        finally:
+            pair_log.close()
+            scenes.release(master_zip)
+            scenes.release(slave_zip)
+
+    results = {k: RuntimeError(f"rejected: {v}") for k, v in rejected.items()}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_one, m, s, n): (m, s) for m, s, n in pairs}
+        for fut in as_completed(futures):
+            m, s = futures[fut]
+            label = pair_name(m, s)
+            try:
+                out_dir = fut.result()
+                results[(m, s)] = None
+                logmsg(log, "INFO", f"Pair {label} done -> {out_dir}")
+            except coherence_gate.LowCoherenceError as e:
+                results[(m, s)] = e
+                logmsg(log, "WARN", f"Pair {label} skipped: {e}")
+            except Exception as e:
+                results[(m, s)] = e
+                logmsg(log, "ERROR", f"Pair {label} failed: {e}")
+
+    if profile or materialize:
+        # 汇总 output_root 下所有 pair 的 profile.json（包括之前批次的结果）
+        profiles = sorted(glob.glob(os.path.join(output_root, "*", "profile.json")))
+        stage_profile.write_summary(output_root, profiles)
+        logmsg(log, "INFO", f"Profile summary over {len(profiles)} pairs: {os.path.join(output_root, 'profile_summary.csv')}")
+
+    skipped = sum(1 for e in results.values() if isinstance(e, coherence_gate.LowCoherenceError))
+    failed = sum(1 for e in results.values() if e is not None) - skipped
+    logmsg(log, "INFO", f"Batch finished: {len(results) - failed - skipped} ok, {skipped} skipped (low coherence), "
+                        f"{failed} failed, total time {datetime.datetime.now() - start_time}")
+    log.close()
+    return results
+
+
+def pair_done(out_dir, master_zip, slave_zip):
+    # 流水线重启时跳过已完成的 pair：同一 master/slave 的 pipeline_state.json 已记录步骤 11
+    try:
+        with open(os.path.join(out_dir, STATE_NAME), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+    inputs = data.get("inputs", {})
+    return (inputs.get("master") == os.path.basename(master_zip.rstrip("/\\")) and
+            inputs.get("slave") == os.path.basename(slave_zip.rstrip("/\\")) and "11" in data.get("steps", {}))
+
+
+def stream_pipeline_run(
+    session_dir,
+    output_root,
+    iw="auto",
+    polarization="VV",
+    dem="SRTM 1Sec HGT",
+    workers=BATCH_WORKERS,
+    memory_gb=None,
+    pair_memory_gb=PAIR_MEMORY_GB,
+    cache=None,
+    aoi=None,
+    max_days=48,
+    max_neighbors=2,
+    catalog=None,
+    download_workers=stream_pipeline.DOWNLOAD_WORKERS,
+    queue_size=stream_pipeline.QUEUE_SIZE,
+    max_bandwidth=None,
+    bursts=False,
+    profile=False,
+    materialize=False
+):
+    # slc_dl 搜索会话 -> 边下载边处理：两景都下载并校验通过的候选 pair 立即进入处理队列
+    # 每个 pair 走 fixed_pipeline（各自的 log/state；重启时已完成的 pair 跳过，未完成的从检查点续跑）
+    import slc_dl  # asf_search 只在流水线模式需要
+
+    start_time = datetime.datetime.now()
+    os.makedirs(output_root, exist_ok=True)
+    log = open(os.path.join(output_root, "stream_log.txt"), "a")
+    init_snap()
+    if SNAP_CONFIG:
+        logmsg(log, "INFO", f"SNAP config: {snap_config.describe(SNAP_CONFIG)}")
+    if memory_gb is None:
+        memory_gb = jvm_max_memory_gb()
+    workers = max(1, min(workers, int(memory_gb // pair_memory_gb) if pair_memory_gb else workers))
+    if (profile or materialize) and workers > 1:
+        # CPU、写出字节数、RSS/堆峰值都是进程级的：并发 pair 会互相计入
+        logmsg(log, "WARN", f"--profile: CPU/IO/memory are process-wide, processing pairs one at a time "
+                            f"instead of {workers}.")
+        workers = 1
+
+    # 会话的搜索结果 + 目录库（单 AOI：BASE_DIR/<时间戳>；多 AOI：BASE_DIR/<AOI>/<时间戳>）
+    session_dir = session_dir.rstrip("/\\")
+    base_dir = os.path.dirname(session_dir)
+    cfg = slc_dl.default_config()
+    if catalog is None:
+        for d in (base_dir, os.path.dirname(base_dir)):
+            if os.path.exists(os.path.join(d, slc_dl.CATALOG_NAME)):
+                catalog = os.path.join(d, slc_dl.CATALOG_NAME)
+                break
+    cfg.update({"catalog": catalog, "base_dir": base_dir, "burst_mode": bursts, "burst_polarization": polarization,
+                "roi": ",".join(str(v) for v in s1_meta.load_aoi_bbox(aoi))})
+    saved = slc_dl.load_search_results(os.path.join(session_dir, "search_results.json"))
+    if not saved:
+        log.close()
+        raise RuntimeError(f"No search_results.json in {session_dir}")
+    products = slc_dl.session_products(cfg, saved)
+    if products is None:
+        log.close()
+        raise RuntimeError("Cannot resolve the session's products")
+    asc_dir, des_dir, _ = slc_dl.session_paths(session_dir)
+    jobs = {}
+    for target_dir, group in ((asc_dir, products[0]), (des_dir, products[1])):
+        os.makedirs(target_dir, exist_ok=True)
+        for product in group:
+            jobs[slc_dl.scene_path(cfg, product, target_dir)] = (product, target_dir)
+
+    session = slc_dl.authenticate_for_download()
+    if session is None:
+        log.close()
+        raise RuntimeError("ASF authentication failed")
+    slc_dl.tune_session_pool(session, max(10, download_workers * cfg["chunk_workers"]))
+    limiter = slc_dl.RateLimiter(max_bandwidth * 1024 * 1024) if max_bandwidth else None
+
+    def fetch(path):
+        product, target_dir = jobs[path]
+        t0 = datetime.datetime.now()
+        slc_dl.download_scene(session, cfg, session_dir, product, target_dir, limiter)
+        logmsg(log, "INFO", f"Scene ready: {os.path.basename(path)} ({datetime.datetime.now() - t0})")
+
+    def process(master_zip, slave_zip):
+        out_dir = os.path.join(output_root, pair_name(master_zip, slave_zip))
+        if pair_done(out_dir, master_zip, slave_zip):
+            logmsg(log, "INFO", f"Pair {pair_name(master_zip, slave_zip)} already done -> {out_dir}")
+            return
+        logmsg(log, "INFO", f"Pair {pair_name(master_zip, slave_zip)} processing -> {out_dir}")
+        fixed_pipeline(master_zip, slave_zip, out_dir, iw, polarization, dem, cache, aoi,
+                       resume=os.path.exists(os.path.join(out_dir, STATE_NAME)),
+                       profile=profile, materialize=materialize)
+        logmsg(log, "INFO", f"Pair {pair_name(master_zip, slave_zip)} done -> {out_dir}")
+
+    pipeline = stream_pipeline.StreamPipeline(
+        sorted(jobs), fetch, process, max_days, max_neighbors, s1_meta.catalog_tracks(catalog),
+        download_workers, workers, queue_size, lambda level, msg: logmsg(log, level, msg))
+    results = pipeline.run()
+    logmsg(log, "INFO", f"Stream total time {datetime.datetime.now() - start_time}")
+    log.close()
+    return results
+
+
+def fuse_outputs(output_root, aoi=None, method=dem_fusion.METHOD, workers=dem_fusion.WORKERS, fuse_dir=None):
+    # 融合 output_root 下各 pair 的 DEM_output.tif；网格固定为 AOI 外包框，增量更新时网格不变
+    fuse_dir = fuse_dir or os.path.join(output_root, FUSION_DIR)
+    os.makedirs(fuse_dir, exist_ok=True)
+    log = open(os.path.join(fuse_dir, "log.txt"), "a")
+    try:
+        return dem_fusion.fuse([output_root], fuse_dir, method, aoi if aoi is not None else s1_meta.DEFAULT_AOI,
+                               workers=workers, log=lambda level, msg: logmsg(log, level, msg))
+    finally:
+        log.close()
+
+
+def jvm_max_memory_gb():
+    # 内存预算默认取 JVM 最大堆（snap.conf / snappy.ini 的 -Xmx）
+    Runtime = jpy.get_type('java.lang.Runtime')
+    return Runtime.getRuntime().maxMemory() / 1024 ** 3
+
+
 # ---------------------- main ----------------------
 def parse_args():
-    parser = argparse.ArgumentParser(description="Sentinel-1 IW2 VV InSAR DEM Pipeline")
-    parser.add_argument('--master_zip', type=str, required=True, help='Path to the master zip file')
-    parser.add_argument('--slave_zip', type=str, required=True, help='Path to the slave zip file')
-    parser.add_argument('--output_dir', type=str, required=True, help='Output directory')
-    parser.add_argument('--iw', type=str, choices=['IW1', 'IW2', 'IW3'], default='IW2', help='IW selection: IW1, IW2, or IW3')
-    return parser.parse_args()
+    parser = argparse.ArgumentParser(description="Sentinel-1 IW VV InSAR DEM Pipeline")
+    parser.add_argument('--master_zip', type=str, help='Path to the master zip file (or burst-subset .SAFE directory)')
+    parser.add_argument('--slave_zip', type=str, help='Path to the slave zip file (or burst-subset .SAFE directory)')
+    parser.add_argument('--output_dir', type=str, help='Output directory (batch: one sub-directory per pair)')
+    parser.add_argument('--iw', type=str, choices=['auto', 'IW1', 'IW2', 'IW3'], default='auto',
+                        help='IW selection: auto (all sub-swaths covering the AOI) or IW1/IW2/IW3')
+    parser.add_argument('--aoi', type=str, default=None,
+                        help='AOI as GeoJSON file or "minLon,minLat,maxLon,maxLat" (default: data/aoi.geojson); selects sub-swaths and bursts')
+    # batch
+    parser.add_argument('--pairs', type=str, help='Batch: pair list file, one "master,slave[,name]" per line')
+    parser.add_argument('--network', type=str, help='Batch: build a small-baseline network from scenes under this directory')
+    parser.add_argument('--catalog', type=str, help='scene_catalog.sqlite from slc_dl (path/frame grouping for --network)')
+    parser.add_argument('--max_days', type=int, default=MAX_TEMPORAL_BASELINE_DAYS,
+                        help='Max temporal baseline in days (network building and pair check)')
+    parser.add_argument('--max_neighbors', type=int, default=2, help='Network: pairs per scene with later acquisitions')
+    parser.add_argument('--network_mode', choices=['temporal', 'baseline'], default=NETWORK_MODE,
+                        help='Network: nearest acquisitions in time, or pairs ranked by perpendicular/temporal baseline '
+                             '(orbit state vectors from the annotations, cached per scene)')
+    parser.add_argument('--bperp', type=str, default=','.join(f'{v:g}' for v in BPERP_RANGE),
+                        help='Network baseline mode: perpendicular baseline range in metres "min,max"')
+    parser.add_argument('--stream', type=str, metavar='SESSION_DIR',
+                        help='Download-to-process: fetch the slc_dl search session and process each network pair as soon as both scenes are verified')
+    parser.add_argument('--download_workers', type=int, default=stream_pipeline.DOWNLOAD_WORKERS, help='Stream: concurrent scene downloads')
+    parser.add_argument('--queue_size', type=int, default=stream_pipeline.QUEUE_SIZE,
+                        help='Stream: ready pairs waiting for processing before downloads pause')
+    parser.add_argument('--max_bandwidth', type=float, help='Stream: total download bandwidth cap in MB/s')
+    parser.add_argument('--bursts', action='store_true', help='Stream: download only the bursts covering the AOI (.SAFE subsets)')
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='Batch/stream: concurrent pairs')
+    parser.add_argument('--fuse', action='store_true',
+                        help='Batch/stream: fuse all pair DEMs into <output_dir>/fused/DSM_fused.tif afterwards (incremental on reruns)')
+    parser.add_argument('--fuse_method', choices=['mean', 'median'], default=dem_fusion.METHOD,
+                        help='Fusion: outlier-rejected coherence-weighted mean or weighted median')
+    parser.add_argument('--align_grid', action='store_true',
+                        help='Align the Terrain-Correction grid to multiples of the pixel spacing so all pairs share one grid')
+    parser.add_argument('--memory_gb', type=float, help='Batch: memory budget (default: JVM max heap)')
+    parser.add_argument('--pair_memory_gb', type=float, default=PAIR_MEMORY_GB, help='Batch: estimated memory per pair')
+    # stage cache
+    parser.add_argument('--cache_dir', type=str, default=STAGE_CACHE_DIR, help='Stage cache directory (BEAM-DIMAP, content-addressed); off if omitted')
+    parser.add_argument('--cache_gb', type=float, default=STAGE_CACHE_GB, help='Stage cache size cap in GB (LRU eviction)')
+    # checkpoint / resume
+    parser.add_argument('--resume', action='store_true', help=f'Restart from the last good checkpoint recorded in {STATE_NAME}')
+    parser.add_argument('--from-step', dest='from_step', type=int, choices=range(1, 12), metavar='N',
+                        help='Restart from step N (1-11), reusing ifg_flt.dim / snaphu outputs where possible')
+    # snaphu
+    parser.add_argument('--snaphu_cores', type=int, default=SNAPHU_CORES, help='SNAPHU parallel tile processes (default: all cores)')
+    parser.add_argument('--snaphu_timeout', type=float, default=SNAPHU_TIMEOUT, help='SNAPHU timeout in seconds; retried with coarser tiling')
+    parser.add_argument('--snaphu_retries', type=int, default=SNAPHU_RETRIES, help='Retries with coarser tiling after a timeout')
+    parser.add_argument('--goldstein', choices=['snap', 'numpy'], default=GOLDSTEIN,
+                        help='Goldstein filter backend: SNAP operator or tiled NumPy FFT (multithreaded, same alpha/FFT size/window)')
+    parser.add_argument('--goldstein_workers', type=int, default=GOLDSTEIN_WORKERS, help='Threads for the NumPy Goldstein filter')
+    parser.add_argument('--no_flt_dimap', action='store_true',
+                        help='Do not write ifg_flt.dim after filtering (resume from step 9 is then unavailable)')
+    parser.add_argument('--unwrapper', choices=['snaphu', 'numpy'], default=UNWRAPPER,
+                        help='Phase unwrapping backend: external SNAPHU or in-process NumPy weighted least squares')
+    parser.add_argument('--unw_tile', type=int, default=NUMPY_UNW_TILE, help='NumPy unwrapper tile size (px)')
+    parser.add_argument('--phase_to_height', choices=['numpy', 'snap', 'none'], default=PHASE_TO_HEIGHT,
+                        help='Convert unwrapped phase to height before Terrain-Correction: tiled NumPy (orbit geometry, '
+                             'DEM-calibrated offset), SNAP PhaseToElevation, or none')
+    parser.add_argument('--coherence_gate', choices=['skip', 'flag', 'off'], default=COH_GATE,
+                        help='Before unwrapping, sample AOI coherence (decimated coh band): skip or only flag pairs '
+                             'below --min_coherence / --min_coherent_fraction; decision in coherence_gate.json. '
+                             f'A single pair skipped by the gate exits with status {coherence_gate.EXIT_SKIPPED}')
+    parser.add_argument('--min_coherence', type=float, default=COH_GATE_MIN_MEAN,
+                        help='Coherence gate: minimum mean AOI coherence')
+    parser.add_argument('--min_coherent_fraction', type=float, default=COH_GATE_MIN_FRACTION,
+                        help=f'Coherence gate: minimum fraction of AOI pixels with coherence >= {coherence_gate.PIXEL_COHERENCE}')
+    parser.add_argument('--height_workers', type=int, default=HEIGHT_WORKERS, help='Threads for the NumPy phase-to-height conversion')
+    # AOI subset / output
+    parser.add_argument('--no_subset', action='store_true', help='Terrain-correct the whole debursted strip instead of the AOI subset')
+    parser.add_argument('--subset_margin', type=float, default=TC_SUBSET_MARGIN_DEG, help='AOI subset margin in degrees')
+    parser.add_argument('--no_tc_dimap', action='store_true', help='Skip the ifg_deb_TC BEAM-DIMAP copy; only write DEM_output.tif')
+    parser.add_argument('--cog', action='store_true', help='Also write DEM_cog.tif (Cloud-Optimized GeoTIFF: tiled, compressed, overviews)')
+    parser.add_argument('--cog_compression', choices=['deflate', 'zstd'], default=COG_COMPRESSION,
+                        help='COG compression (zstd needs the zstandard package)')
+    # aux data
+    parser.add_argument('--aux_dir', type=str, default=AUX_DIR, help='Shared SRTM/orbit cache (see aux_cache.py); DEM becomes a cached External DEM mosaic')
+    parser.add_argument('--offline', action='store_true', help='Never download aux data; fail before processing if anything is missing from --aux_dir')
+    # JVM / SNAP tuning
+    parser.add_argument('--snap_preset', choices=['auto', 'small', 'medium', 'large'],
+                        help='JVM heap / tile cache / parallelism / tile size preset sized from this machine')
+    parser.add_argument('--snap_config', type=str, help='JSON file with "preset" and/or max_heap_gb, tile_cache_mb, parallelism, tile_size')
+    parser.add_argument('--max_heap_gb', type=int, help='JVM max heap (GB); overrides the preset')
+    parser.add_argument('--tile_cache_mb', type=int, help='snap.jai.tileCacheSize (MB); overrides the preset')
+    parser.add_argument('--parallelism', type=int, help='snap.parallelism (GPF threads); overrides the preset')
+    parser.add_argument('--tile_size', type=int, help='snap.jai.defaultTileSize (px) used when products are computed/written')
+    # dry run
+    parser.add_argument('--plan', action='store_true',
+                        help='Only read manifests/annotations and print a JSON plan (bursts, stage sizes, disk, SNAPHU tiles, memory); no SNAP/JVM')
+    parser.add_argument('--plan_out', type=str, help='Write the --plan JSON to this file instead of stdout')
+    # profiling
+    parser.add_argument('--profile', action='store_true', help='Record per-stage wall/CPU time, heap/RSS peaks and bytes written (profile.json/csv)')
+    parser.add_argument('--materialize', action='store_true', help='With profiling: write every stage to disk so lazy costs land on the right stage')
+    args = parser.parse_args()
+    if not (args.pairs or args.network or args.stream) and not (args.master_zip and args.slave_zip):
+        parser.error("--master_zip and --slave_zip are required unless --pairs, --network or --stream is given")
+    if args.stream and args.plan:
+        parser.error("--plan needs local scenes; it cannot be combined with --stream")
+    if not args.output_dir and not args.plan:
+        parser.error("--output_dir is required unless --plan is given")
+    if args.offline and not args.aux_dir:
+        parser.error("--offline needs --aux_dir")
+    return args
+
+def failed_result(e):
+    # 批处理/流水线的退出码：相干性门限跳过的 pair 不算失败
+    return e is not None and not isinstance(e, coherence_gate.LowCoherenceError)
+
+def snap_config_from_args(args):
+    overrides = {k: getattr(args, k) for k in snap_config.KEYS if getattr(args, k) is not None}
+    if args.snap_config:
+        cfg = snap_config.load(args.snap_config)
+    elif args.snap_preset:
+        cfg = snap_config.preset(args.snap_preset)
+    elif overrides:
+        cfg = {"preset": "custom"}
+    else:
+        return None
+    cfg.update(overrides)
+    return cfg
 
 if __name__ == "__main__":
     args = parse_args()
@@ -355,7 +1802,92 @@ if __name__ == "__main__":
     slave_zip = args.slave_zip
     output_dir = args.output_dir
     iw = args.iw
-    
+    SNAPHU_CORES, SNAPHU_TIMEOUT, SNAPHU_RETRIES = args.snaphu_cores, args.snaphu_timeout, args.snaphu_retries
+    GOLDSTEIN, GOLDSTEIN_WORKERS, FLT_WRITE_DIMAP = args.goldstein, args.goldstein_workers, not args.no_flt_dimap
+    UNWRAPPER, NUMPY_UNW_TILE = args.unwrapper, args.unw_tile
+    PHASE_TO_HEIGHT, HEIGHT_WORKERS = args.phase_to_height, args.height_workers
+    COH_GATE = args.coherence_gate
+    COH_GATE_MIN_MEAN, COH_GATE_MIN_FRACTION = args.min_coherence, args.min_coherent_fraction
+    TC_SUBSET, TC_SUBSET_MARGIN_DEG, TC_WRITE_DIMAP = not args.no_subset, args.subset_margin, not args.no_tc_dimap
+    TC_ALIGN_GRID, FUSE = args.align_grid, args.fuse
+    COG_EXPORT, COG_COMPRESSION = args.cog, args.cog_compression
+    AUX_DIR, AUX_OFFLINE = args.aux_dir, args.offline
+    SNAP_CONFIG = snap_config_from_args(args)
+    MAX_TEMPORAL_BASELINE_DAYS = args.max_days
+    NETWORK_MODE, BPERP_RANGE = args.network_mode, tuple(float(v) for v in args.bperp.split(","))
+
+    if args.pairs or args.network:
+        pairs = load_pair_list(args.pairs) if args.pairs else network_pairs(
+            args.network, args.max_days, args.max_neighbors, args.catalog, args.aoi)
+        if not pairs:
+            print("[FATAL] No pairs to process")
+            sys.exit(1)
+    else:
+        pairs = [(master_zip, slave_zip, None)]
+
+    if args.plan:
+        plan = plan_run(pairs, args.aoi, iw, "VV", args.cache_dir)
+        text = json.dumps(plan, indent=2)
+        if args.plan_out:
+            with open(args.plan_out, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        sys.exit(0 if plan["summary"]["rejected"] == 0 else 1)
+
+    cache = open_stage_cache(args.cache_dir, args.cache_gb)
+
+    if args.stream:
+        try:
+            results = stream_pipeline_run(
+                args.stream,
+                output_root=output_dir,
+                iw=iw,
+                polarization="VV",
+                dem="SRTM 1Sec HGT",
+                workers=args.workers,
+                memory_gb=args.memory_gb,
+                pair_memory_gb=args.pair_memory_gb,
+                cache=cache,
+                aoi=args.aoi,
+                max_days=args.max_days,
+                max_neighbors=args.max_neighbors,
+                catalog=args.catalog,
+                download_workers=args.download_workers,
+                queue_size=args.queue_size,
+                max_bandwidth=args.max_bandwidth,
+                bursts=args.bursts,
+                profile=args.profile,
+                materialize=args.materialize
+            )
+        except Exception as e:
+            print(f"[FATAL] {e}")
+            sys.exit(1)
+        if FUSE:
+            fuse_outputs(output_dir, args.aoi, args.fuse_method, args.workers)
+        sys.exit(1 if any(failed_result(e) for e in results.values()) else 0)
+
+    if args.pairs or args.network:
+        results = batch_pipeline(
+            pairs,
+            output_root=output_dir,
+            iw=iw,
+            polarization="VV",
+            dem="SRTM 1Sec HGT",
+            workers=args.workers,
+            memory_gb=args.memory_gb,
+            pair_memory_gb=args.pair_memory_gb,
+            cache=cache,
+            aoi=args.aoi,
+            resume=args.resume,
+            from_step=args.from_step,
+            profile=args.profile,
+            materialize=args.materialize
+        )
+        if FUSE:
+            fuse_outputs(output_dir, args.aoi, args.fuse_method, args.workers)
+        sys.exit(1 if any(failed_result(e) for e in results.values()) else 0)
+
     try:
         fixed_pipeline(
             master_zip=master_zip,
@@ -363,8 +1895,18 @@ if __name__ == "__main__":
             output_dir=output_dir,
             iw=iw,
             polarization="VV",
-            dem="SRTM 1Sec HGT"
+            dem="SRTM 1Sec HGT",
+            cache=cache,
+            aoi=args.aoi,
+            resume=args.resume,
+            from_step=args.from_step,
+            profile=args.profile,
+            materialize=args.materialize
         )
+    except coherence_gate.LowCoherenceError as e:
+        # 与批处理一致：跳过不算失败，用单独的退出码与崩溃区分（判定写在 coherence_gate.json）
+        print(f"[SKIPPED] {e}")
+        sys.exit(coherence_gate.EXIT_SKIPPED)
     except Exception as e:
         print(f"[FATAL] {e}")
         sys.exit(1)
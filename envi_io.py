@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+ENVI / 原始栅格的 numpy.memmap 访问层
+
+SnaphuExport 写出的 Phase/coh/UnwPhase（FLOAT + .hdr）以及 NumPy 解缠结果都通过这里读写：
+- read_header：解析 ENVI 头（samples/lines/bands/data type/interleave/byte order/header offset ...）
+- open_raster：按头信息把数据文件映射为 memmap 视图，不读入内存
+- create_raster：新建 memmap + ENVI 头；SNAP 直接用 ProductIO.readProduct(hdr) 读取同一个文件，无额外拷贝
+- iter_blocks / block_stats：按行块遍历与统计，内存只与块大小有关
+"""
+import os
+import re
+
+import numpy as np
+
+# ENVI data type -> numpy dtype（不含字节序）
+ENVI_DTYPES = {
+    1: np.uint8, 2: np.int16, 3: np.int32, 4: np.float32, 5: np.float64,
+    6: np.complex64, 9: np.complex128, 12: np.uint16, 13: np.uint32, 14: np.int64, 15: np.uint64,
+}
+DTYPE_CODES = {np.dtype(v): k for k, v in ENVI_DTYPES.items()}
+DATA_EXTS = (".img", ".dat", ".bin", ".raw", "")
+BLOCK_ROWS = 512
+
+
+def read_header(hdr_path):
+    """ENVI 头 -> dict；数值字段转为 int，{...} 列表字段转为 list"""
+    with open(hdr_path, "r") as f:
+        text = f.read()
+    if not text.lstrip().startswith("ENVI"):
+        raise ValueError(f"Not an ENVI header: {hdr_path}")
+    header = {}
+    # 花括号内的值可以跨行
+    for key, value in re.findall(r"^\s*([^=\n]+?)\s*=\s*(\{[^}]*\}|[^\n]*)", text, re.M):
+        key = key.strip().lower()
+        value = value.strip()
+        if value.startswith("{"):
+            value = [v.strip() for v in value[1:-1].split(",") if v.strip()]
+        elif re.fullmatch(r"-?\d+", value):
+            value = int(value)
+        header[key] = value
+    for key in ("samples", "lines"):
+        if key not in header:
+            raise ValueError(f"ENVI header without '{key}': {hdr_path}")
+    header.setdefault("bands", 1)
+    header.setdefault("header offset", 0)
+    header.setdefault("data type", 4)
+    header.setdefault("interleave", "bsq")
+    header.setdefault("byte order", 0)
+    return header
+
+
+def header_dtype(header):
+    dtype = np.dtype(ENVI_DTYPES[header["data type"]])
+    return dtype.newbyteorder(">" if header["byte order"] == 1 else "<")
+
+
+def data_path(hdr_path):
+    """头文件对应的数据文件：同名的 .img/.dat/.bin/.raw 或无扩展名"""
+    base = os.path.splitext(hdr_path)[0]
+    for ext in DATA_EXTS:
+        if os.path.exists(base + ext) and base + ext != hdr_path:
+            return base + ext
+    raise FileNotFoundError(f"No data file for {hdr_path}")
+
+
+def header_path(path):
+    """数据文件或头文件 -> 头文件路径"""
+    if path.endswith(".hdr"):
+        return path
+    for cand in (os.path.splitext(path)[0] + ".hdr", path + ".hdr"):
+        if os.path.exists(cand):
+            return cand
+    raise FileNotFoundError(f"No ENVI header for {path}")
+
+
+def open_raster(path, mode="r", band=None):
+    """ENVI 栅格 -> memmap 视图
+
+    单波段返回 (lines, samples)；多波段返回 (bands, lines, samples)，band 指定时只返回该波段。
+    BIL/BIP 通过转置得到同样的形状（仍是视图，不拷贝）
+    """
+    hdr = header_path(path)
+    h = read_header(hdr)
+    nb, nl, ns = h["bands"], h["lines"], h["samples"]
+    interleave = str(h["interleave"]).lower()
+    shape = {"bsq": (nb, nl, ns), "bil": (nl, nb, ns), "bip": (nl, ns, nb)}[interleave]
+    mm = np.memmap(data_path(hdr), dtype=header_dtype(h), mode=mode, offset=h["header offset"], shape=shape)
+    if interleave == "bil":
+        mm = mm.transpose(1, 0, 2)
+    elif interleave == "bip":
+        mm = mm.transpose(2, 0, 1)
+    if band is not None:
+        return mm[band]
+    return mm[0] if nb == 1 else mm
+
+
+def open_raw(path, width, dtype=np.float32, mode="r"):
+    """无头文件的原始栅格（如 snaphu 的 FLOAT 输出）：行数由文件大小推算"""
+    dtype = np.dtype(dtype)
+    lines = os.path.getsize(path) // (width * dtype.itemsize)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(lines, width))
+
+
+def write_header(hdr_path, width, height, dtype=np.float32, band_names=None, description=None, bands=1):
+    dtype = np.dtype(dtype)
+    with open(hdr_path, "w") as f:
+        f.write("ENVI\n")
+        if description:
+            f.write(f"description = {{{description}}}\n")
+        f.write(f"samples = {width}\nlines = {height}\nbands = {bands}\nheader offset = 0\n")
+        f.write(f"file type = ENVI Standard\ndata type = {DTYPE_CODES[dtype.newbyteorder('=')]}\n")
+        f.write(f"interleave = bsq\nbyte order = {1 if dtype.byteorder == '>' else 0}\n")
+        if band_names:
+            f.write("band names = { " + ", ".join(band_names) + " }\n")
+
+
+def create_raster(path, width, height, dtype=np.float32, band_names=None, description=None):
+    """新建单波段 memmap（path 为 .img）与同名 .hdr；返回 (memmap, hdr_path)"""
+    hdr = os.path.splitext(path)[0] + ".hdr"
+    write_header(hdr, width, height, dtype, band_names, description)
+    mm = np.memmap(path, dtype=dtype, mode="w+", shape=(height, width))
+    return mm, hdr
+
+
+def iter_blocks(arr, block_rows=BLOCK_ROWS):
+    """按行块遍历 2D 数组/memmap：yield (row0, block)；block 为视图"""
+    for r0 in range(0, arr.shape[0], block_rows):
+        yield r0, arr[r0:r0 + block_rows]
+
+
+def block_stats(arr, nodata=0.0, block_rows=BLOCK_ROWS):
+    """分块统计：有效像元比例、最小/最大/均值/标准差（忽略 nodata 与 NaN）"""
+    n = valid = 0
+    s = s2 = 0.0
+    vmin, vmax = np.inf, -np.inf
+    for _, block in iter_blocks(arr, block_rows):
+        b = np.asarray(block, dtype=np.float64)
+        n += b.size
+        mask = np.isfinite(b)
+        if nodata is not None:
+            mask &= b != nodata
+        v = b[mask]
+        if v.size == 0:
+            continue
+        valid += v.size
+        s += v.sum()
+        s2 += np.square(v).sum()
+        vmin, vmax = min(vmin, v.min()), max(vmax, v.max())
+    if valid == 0:
+        return {"pixels": n, "valid_fraction": 0.0, "min": None, "max": None, "mean": None, "std": None}
+    mean = s / valid
+    return {
+        "pixels": n,
+        "valid_fraction": round(valid / n, 4),
+        "min": float(vmin),
+        "max": float(vmax),
+        "mean": float(mean),
+        "std": float(np.sqrt(max(s2 / valid - mean * mean, 0.0))),
+    }
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Goldstein 相位滤波（NumPy/FFT，SNAP GoldsteinPhaseFiltering 的替代后端）
+
+Goldstein & Werner (1998)：对复干涉图的 FFT_SIZE x FFT_SIZE patch 做 FFT，
+谱幅度经 WINDOW x WINDOW 均值平滑后取 alpha 次幂作为滤波器，再逆 FFT。
+- patch 步长 FFT_SIZE/2（50% 重叠），每个 patch 只输出中央 step x step 区域，因此每个像元只来自一个 patch
+- patch 网格按整幅图像对齐（分块边长取 step 的整数倍，块边缘带 (FFT_SIZE - step)/2 的读入外扩），
+  分块结果与整幅一次滤波完全相同；图像外按 0 填充
+- 同一块内的 patch 批量做 FFT（np.fft.fft2 作用于 (n, N, N)），块在线程池中并行，读块/写出在调用线程中按顺序进行
+- 输入为 0 的像元（无数据）输出仍为 0
+
+python goldstein_np.py --check [--snap]：合成干涉图上的正确性检查（分块一致性、相位噪声、与 SNAP 输出比较）
+python goldstein_np.py --benchmark：吞吐量（Mpx/s），按线程数；加 --snap 同时计时 SNAP 算子
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ALPHA = 0.7
+FFT_SIZE = 32
+WINDOW = 3
+TILE = 1024          # 分块边长（像元，向下取整到 step 的倍数）
+WORKERS = 2
+BATCH = 512          # 每次批量 FFT 的 patch 数
+
+# --check 的通过阈值：与 SNAP 输出的相位差（弧度，按相干像元统计）
+CHECK_MAX_MEDIAN_RAD = 0.1
+CHECK_MIN_SNAP_CORRELATION = 0.95
+
+
+def step_size(fft_size=FFT_SIZE):
+    return max(1, fft_size // 2)
+
+
+def margin(fft_size=FFT_SIZE):
+    return (fft_size - step_size(fft_size)) // 2
+
+
+def _smooth(amp, window):
+    # 谱幅度的 window x window 均值（循环边界：谱是周期的），作用于最后两维
+    r = window // 2
+    acc = np.zeros_like(amp)
+    for d in range(-r, r + 1):
+        acc += np.roll(amp, d, axis=-1)
+    out = np.zeros_like(acc)
+    for d in range(-r, r + 1):
+        out += np.roll(acc, d, axis=-2)
+    return out / (window * window)
+
+
+def filter_patches(patches, alpha=ALPHA, window=WINDOW):
+    """(n, N, N) 复数 patch -> 滤波后的 (n, N, N)"""
+    spec = np.fft.fft2(patches)
+    s = _smooth(np.abs(spec), window)
+    s /= np.maximum(s.max(axis=(-2, -1), keepdims=True), 1e-30)
+    return np.fft.ifft2(spec * s ** alpha)
+
+
+def filter_block(z, alpha=ALPHA, fft_size=FFT_SIZE, window=WINDOW, batch=BATCH):
+    """z：带 margin() 外扩的复数块，形状 (h + 2m, w + 2m)，h、w 为 step 的倍数 -> 滤波结果 (h, w) complex64"""
+    step, m = step_size(fft_size), margin(fft_size)
+    ny, nx = (z.shape[0] - 2 * m) // step, (z.shape[1] - 2 * m) // step
+    out = np.zeros((ny * step, nx * step), np.complex64)
+    rows = max(1, batch // max(nx, 1))
+    for py0 in range(0, ny, rows):
+        py1 = min(ny, py0 + rows)
+        patches = np.empty(((py1 - py0) * nx, fft_size, fft_size), np.complex64)
+        k = 0
+        for py in range(py0, py1):
+            for px in range(nx):
+                patches[k] = z[py * step:py * step + fft_size, px * step:px * step + fft_size]
+                k += 1
+        flt = filter_patches(patches, alpha, window)[:, m:m + step, m:m + step]
+        # (rows, nx, step, step) -> (rows * step, nx * step)
+        out[py0 * step:py1 * step] = flt.reshape(py1 - py0, nx, step, step).transpose(0, 2, 1, 3).reshape(
+            (py1 - py0) * step, nx * step)
+    return out
+
+
+def tiles(height, width, tile=TILE, fft_size=FFT_SIZE):
+    step = step_size(fft_size)
+    tile = max(step, tile // step * step)
+    for y0 in range(0, height, tile):
+        for x0 in range(0, width, tile):
+            yield y0, x0, min(tile, height - y0), min(tile, width - x0)
+
+
+def read_padded(read_tile, height, width, win, fft_size=FFT_SIZE):
+    """块 win=(y0, x0, h, w) 的滤波输入：外扩 margin，尺寸补到 step 的倍数，图像外为 0"""
+    y0, x0, h, w = win
+    step, m = step_size(fft_size), margin(fft_size)
+    ph, pw = math.ceil(h / step) * step, math.ceil(w / step) * step
+    z = np.zeros((ph + 2 * m, pw + 2 * m), np.complex64)
+    ry0, rx0 = max(0, y0 - m), max(0, x0 - m)
+    ry1, rx1 = min(height, y0 + ph + m), min(width, x0 + pw + m)
+    z[ry0 - (y0 - m):ry1 - (y0 - m), rx0 - (x0 - m):rx1 - (x0 - m)] = read_tile(ry0, rx0, ry1 - ry0, rx1 - rx0)
+    return z
+
+
+def filter_tiled(read_tile, height, width, write_tile, alpha=ALPHA, fft_size=FFT_SIZE, window=WINDOW,
+                 tile=TILE, workers=WORKERS, log=None):
+    """分块 Goldstein 滤波
+
+    read_tile(y0, x0, h, w) -> 复数数组（窗口在图像内）；write_tile(y0, x0, z) 接收滤波后的块（complex64）；
+    读块与写出在调用线程中按顺序进行，滤波在 workers 个线程中进行（同时在途的块数有上限）
+    """
+    windows = list(tiles(height, width, tile, fft_size))
+    m = margin(fft_size)
+    if log:
+        log("INFO", f"NumPy Goldstein {width}x{height}: alpha {alpha}, FFT {fft_size}, window {window}, "
+                    f"{len(windows)} tiles, {workers} workers")
+
+    def work(win, z):
+        y0, x0, h, w = win
+        flt = filter_block(z, alpha, fft_size, window)[:h, :w]
+        flt[z[m:m + h, m:m + w] == 0] = 0
+        return win, flt
+
+    def store(win, flt):
+        write_tile(win[0], win[1], flt)
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for win in windows:
+            pending.append(pool.submit(work, win, read_padded(read_tile, height, width, win, fft_size)))
+            while len(pending) > max(1, workers):
+                store(*pending.popleft().result())
+        while pending:
+            store(*pending.popleft().result())
+    return len(windows)
+
+
+def filter_array(z, alpha=ALPHA, fft_size=FFT_SIZE, window=WINDOW, tile=TILE, workers=WORKERS):
+    """整幅数组滤波（内存中），返回 complex64"""
+    z = np.asarray(z)
+    out = np.zeros(z.shape, np.complex64)
+
+    def read_tile(y, x, h, w):
+        return z[y:y + h, x:x + w]
+
+    def write_tile(y, x, flt):
+        out[y:y + flt.shape[0], x:x + flt.shape[1]] = flt
+    filter_tiled(read_tile, z.shape[0], z.shape[1], write_tile, alpha, fft_size, window, tile, workers)
+    return out
+
+
+def tile_memory_mb(tile=TILE, workers=WORKERS, fft_size=FFT_SIZE, batch=BATCH):
+    # 每个在途块：complex64 输入/输出 + 一批 patch 的 complex128 谱与中间数组
+    per_tile = (tile + fft_size) ** 2 * 8 * 2 + batch * fft_size * fft_size * 16 * 4
+    return math.ceil(per_tile * (workers + 1) / 1024 ** 2)
+
+
+# ---------------------- check / benchmark ----------------------
+def synthetic(height=1024, width=1024, seed=0):
+    """合成干涉图：地形条纹（斜坡 + 高斯山体）+ 按相干性的复噪声 -> (复干涉图, 真实相位, 相干性)"""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    phase = 2 * np.pi * (x / 57.0 + y / 131.0)
+    for _ in range(4):
+        cy, cx, r = rng.uniform(0, height), rng.uniform(0, width), rng.uniform(40, 160)
+        phase += rng.uniform(10, 40) * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * r * r))
+    coh = np.clip(0.35 + 0.6 * (x / max(width - 1, 1)), 0, 1)
+    # 相干性 γ：信号 + 独立噪声，噪声功率 (1 - γ) / γ
+    noise = (rng.normal(size=phase.shape) + 1j * rng.normal(size=phase.shape)) / np.sqrt(2)
+    z = np.exp(1j * phase) + np.sqrt((1 - coh) / coh) * noise
+    return z.astype(np.complex64), phase, coh
+
+
+def _phase_diff(a, b):
+    return np.abs(np.angle(a * np.conj(b)))
+
+
+def snap_filter(z, alpha=ALPHA, fft_size=FFT_SIZE, window=WINDOW):
+    """SNAP GoldsteinPhaseFiltering 处理同一复数组（需要 esa_snappy）-> (complex64, 秒)"""
+    import esa_snappy
+    jpy = esa_snappy.jpy
+    Product = jpy.get_type('org.esa.snap.core.datamodel.Product')
+    ProductData = jpy.get_type('org.esa.snap.core.datamodel.ProductData')
+    AbstractMetadata = jpy.get_type('org.esa.snap.engine_utilities.datamodel.AbstractMetadata')
+    height, width = z.shape
+    src = Product("synthetic_ifg", "SLC", width, height)
+    AbstractMetadata.addAbstractedMetadataHeader(src.getMetadataRoot())
+    for name, unit, data in (("i_ifg", "real", z.real), ("q_ifg", "imaginary", z.imag)):
+        band = src.addBand(name, ProductData.TYPE_FLOAT32)
+        band.setUnit(unit)
+        band.setRasterData(ProductData.createInstance(np.ascontiguousarray(data, dtype=np.float32).ravel()))
+    p = esa_snappy.HashMap()
+    p.put("alpha", float(alpha))
+    p.put("FFTSizeString", str(fft_size))
+    p.put("WindowSize", int(window))
+    t0 = time.perf_counter()
+    flt = esa_snappy.GPF.createProduct("GoldsteinPhaseFiltering", p, src)
+    out = []
+    for prefix in ("i_", "q_"):
+        band = next(flt.getBand(n) for n in flt.getBandNames() if n.startswith(prefix))
+        buf = np.zeros(width * height, np.float32)
+        band.readPixels(0, 0, width, height, buf)
+        out.append(buf.reshape(height, width))
+    return (out[0] + 1j * out[1]).astype(np.complex64), time.perf_counter() - t0
+
+
+def check(size=1024, tile=256, workers=WORKERS, snap=False):
+    """合成干涉图上的正确性检查 -> dict（ok 为总体结论）"""
+    z, truth, coh = synthetic(size, size)
+    whole = filter_array(z, tile=size + FFT_SIZE, workers=1)
+    tiled = filter_array(z, tile=tile, workers=workers)
+    ref = np.exp(1j * truth)
+    inner = (slice(FFT_SIZE, -FFT_SIZE), slice(FFT_SIZE, -FFT_SIZE))
+    result = {
+        "size": size,
+        "tile": tile,
+        "tile_max_abs_diff": float(np.abs(whole - tiled).max()),
+        "noise_rad_before": round(float(np.median(_phase_diff(z, ref)[inner])), 4),
+        "noise_rad_after": round(float(np.median(_phase_diff(tiled, ref)[inner])), 4),
+    }
+    ok = result["tile_max_abs_diff"] < 1e-4 and result["noise_rad_after"] < result["noise_rad_before"]
+    if snap:
+        try:
+            snap_out, _ = snap_filter(z)
+            d = _phase_diff(tiled, snap_out)[inner]
+            a, b = tiled[inner], snap_out[inner]
+            corr = np.abs(np.sum(a * np.conj(b))) / np.sqrt(np.sum(np.abs(a) ** 2) * np.sum(np.abs(b) ** 2))
+            result["snap"] = {
+                "median_phase_diff_rad": round(float(np.median(d)), 4),
+                "p95_phase_diff_rad": round(float(np.percentile(d, 95)), 4),
+                "noise_rad_after": round(float(np.median(_phase_diff(snap_out, ref)[inner])), 4),
+                "complex_correlation": round(float(corr), 4),
+            }
+            ok = ok and (result["snap"]["median_phase_diff_rad"] <= CHECK_MAX_MEDIAN_RAD
+                         and result["snap"]["complex_correlation"] >= CHECK_MIN_SNAP_CORRELATION)
+        except Exception as e:
+            result["snap"] = {"error": str(e)}
+            ok = False
+    result["ok"] = bool(ok)
+    return result
+
+
+def benchmark(size=2048, workers=(1, 2, 4), repeat=2, tile=TILE, snap=False):
+    """合成干涉图上的吞吐量（Mpx/s，取 repeat 次中最快的一次）"""
+    z, _, _ = synthetic(size, size)
+    mpx = size * size / 1e6
+    result = {"size": size, "tile": tile, "fft_size": FFT_SIZE, "cores": os.cpu_count(), "numpy": {}}
+    for n in workers:
+        best = min(_timed(filter_array, z, tile=tile, workers=n) for _ in range(max(1, repeat)))
+        result["numpy"][str(n)] = {"seconds": round(best, 3), "mpx_per_s": round(mpx / best, 2)}
+    if snap:
+        try:
+            best = min(snap_filter(z)[1] for _ in range(max(1, repeat)))
+            result["snap"] = {"seconds": round(best, 3), "mpx_per_s": round(mpx / best, 2)}
+        except Exception as e:
+            result["snap"] = {"error": str(e)}
+    return result
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy Goldstein phase filter: correctness check and benchmark")
+    parser.add_argument("--check", action="store_true", help="Check tiling consistency and noise reduction on a synthetic interferogram")
+    parser.add_argument("--benchmark", action="store_true", help="Measure throughput on a synthetic interferogram")
+    parser.add_argument("--snap", action="store_true", help="Also run SNAP GoldsteinPhaseFiltering (needs esa_snappy)")
+    parser.add_argument("--size", type=int, default=None, help="Synthetic interferogram size (px; check 1024, benchmark 2048)")
+    parser.add_argument("--tile", type=int, default=TILE, help="Tile size (px)")
+    parser.add_argument("--workers", type=str, default="1,2,4", help="Comma-separated thread counts for --benchmark")
+    parser.add_argument("-o", "--output", help="Write the results as JSON")
+    args = parser.parse_args()
+    if not (args.check or args.benchmark):
+        parser.error("nothing to do: give --check and/or --benchmark")
+
+    result = {}
+    if args.check:
+        result["check"] = check(args.size or 1024, workers=WORKERS, snap=args.snap)
+    if args.benchmark:
+        workers = [int(w) for w in args.workers.split(",") if w]
+        result["benchmark"] = benchmark(args.size or 2048, workers, tile=args.tile, snap=args.snap)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result.get("check", {}).get("ok", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
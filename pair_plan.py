@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Dry-run 规划：只读 SAFE 的 annotation（不创建 GPF 算子链、不启动 JVM）估计一个 pair 的规模
+
+- 每景按 AOI 选中的 swath/burst，master/slave 的 burst 重叠与时间基线（不满足条件的 pair 直接拒绝）
+- 各阶段栅格尺寸（雷达几何：split -> bg/esd/ifg -> deburst/merge -> flt/unw -> height -> subset；地理网格：TC）
+- 中间结果与输出的磁盘占用、SNAPHU 分块（snaphu_runner.plan_tiling）或 NumPy 解缠/滤波/高程换算分块数、内存估计
+
+字节数按各阶段的波段数估算（SNAP 的 DIMAP/GeoTIFF 不压缩），内存为经验模型，用于调度时装箱，不是精确值。
+"""
+import os
+import math
+import datetime
+
+import s1_meta
+import snaphu_runner
+import unwrap_np
+import phase_height
+import goldstein_np
+
+GB = 1024 ** 3
+
+# 各阶段每像元字节数：split 为 i/q int16；bg/esd 为 master i/q int16 + slave i/q float32；
+# ifg/flt 为 i/q/coh float32；unw 再加一个解缠相位；height 再加高程；TC 输出 i/q/coh/unw(/height) + elevation
+STAGE_BYTES = {
+    "split": 4, "bg": 12, "esd": 12, "ifg": 12, "deburst": 12, "merge": 12,
+    "flt": 12, "unw": 16, "height": 20, "subset": 16, "tc": 20,
+}
+HEIGHT_BAND_BYTES = 4
+SNAPHU_EXPORT_BYTES = 12     # Phase + coh + UnwPhase（float32）
+COG_RATIO = 0.8              # COG（压缩 + 概视图）相对 DEM_output.tif 的大小
+TC_SPACING_DEG = 8.983152841195215E-5
+
+# 内存模型：JVM = 基础开销 + Back-Geocoding 栅格的一部分（按瓦片计算，但 ESD/重采样按 burst 缓存）；
+# snaphu 每个分块进程的代价数组约 SNAPHU_BYTES_PER_PIXEL
+JVM_BASE_GB = 2.0
+JVM_RASTER_FRACTION = 0.25
+SNAPHU_BYTES_PER_PIXEL = 64
+
+
+def _time(text):
+    if not text:
+        return None
+    return datetime.datetime.fromisoformat(text.rstrip("Z")[:26])
+
+
+def _stage(width, height, bytes_per_pixel):
+    width, height = int(width), int(height)
+    return {"width": width, "height": height, "bytes": width * height * bytes_per_pixel}
+
+
+def _bbox_area(b):
+    return max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
+
+
+def _intersection(a, b):
+    if not a or not b or not s1_meta.bbox_intersects(a, b):
+        return None
+    return max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+
+
+def _expand(b, margin):
+    return b[0] - margin, b[1] - margin, b[2] + margin, b[3] + margin
+
+
+def deburst_lines(ann, first, last):
+    """Deburst 后的行数：相邻 burst 方位向起始时间差 / 方位向采样间隔；缺少时间信息时按 burst 行数累加"""
+    lpb = ann["lines_per_burst"]
+    bursts = [b for b in ann["bursts"] if first <= b["index"] <= last]
+    ati = ann.get("azimuth_time_interval")
+    times = [_time(b["azimuth_time"]) for b in bursts]
+    if len(bursts) < 2 or not ati or None in times:
+        return lpb * len(bursts)
+    step = (times[-1] - times[0]).total_seconds() / ati / (len(bursts) - 1)
+    return int(round(min(lpb, step) * (len(bursts) - 1) + lpb))
+
+
+def scene_plan(path, polarization="VV", aoi=None, iw="auto"):
+    """单景：名称/时间/轨道（来自文件名，缺少时用 annotation）与 AOI 选中的 burst"""
+    info = s1_meta.scene_info(path) or {}
+    anns = s1_meta.read_zip_annotations(path, polarization)
+    if iw not in (None, "auto"):
+        anns = [a for a in anns if a["swath"] == iw]
+    bursts = s1_meta.select_bursts(anns, s1_meta.load_aoi_bbox(aoi))
+    start = info.get("start") or min((_time(a["start_time"]) for a in anns if a.get("start_time")), default=None)
+    return {
+        "path": path,
+        "name": info.get("name") or os.path.basename(path.rstrip("/\\")),
+        "start": start,
+        "rel_orbit": info.get("rel_orbit"),
+        "annotations": {a["swath"]: a for a in anns},
+        "bursts": bursts,
+    }
+
+
+def plan_pair(master, slave, aoi=None, max_days=None, options=None):
+    """master/slave 为 scene_plan() 结果 -> 可 JSON 序列化的计划
+
+    options: goldstein, goldstein_tile, goldstein_workers, goldstein_inmemory_mb, flt_write_dimap, unwrapper, snaphu_cores, unw_tile, unw_overlap, unw_workers, unw_inmemory_mb,
+    phase_to_height, height_inmemory_mb, height_tile, height_workers, tc_subset, subset_margin, tc_write_dimap, cog, cache（与 dsm.py 的同名配置一致）
+    """
+    opt = options or {}
+    reasons = []
+    plan = {
+        "master": master["name"],
+        "slave": slave["name"],
+        "temporal_baseline_days": None,
+        "swaths": {},
+    }
+
+    # 时间基线 / 轨道
+    if master["start"] and slave["start"]:
+        days = abs((slave["start"] - master["start"]).total_seconds()) / 86400.0
+        plan["temporal_baseline_days"] = round(days, 2)
+        if max_days is not None and days > max_days:
+            reasons.append(f"temporal baseline {days:.1f} days exceeds {max_days} days")
+    if master["rel_orbit"] and slave["rel_orbit"] and master["rel_orbit"] != slave["rel_orbit"]:
+        reasons.append(f"different relative orbits ({master['rel_orbit']} vs {slave['rel_orbit']})")
+
+    # burst 选择与重叠（各 swath 的选中 burst 外包框求交）
+    for scene, label in ((master, "master"), (slave, "slave")):
+        if not scene["bursts"]:
+            reasons.append(f"{label}: no burst intersects the AOI")
+    swaths = sorted(set(master["bursts"]) & set(slave["bursts"]))
+    if master["bursts"] and slave["bursts"] and not swaths:
+        reasons.append(f"no common sub-swath: master {sorted(master['bursts'])}, slave {sorted(slave['bursts'])}")
+    overlapping = []
+    for sw in swaths:
+        m_box = s1_meta.bursts_bbox([master["annotations"][sw]], {sw: master["bursts"][sw]})
+        s_box = s1_meta.bursts_bbox([slave["annotations"][sw]], {sw: slave["bursts"][sw]})
+        inter = _intersection(m_box, s_box)
+        overlap = _bbox_area(inter) / _bbox_area(m_box) if inter and _bbox_area(m_box) else 0.0
+        plan["swaths"][sw] = {
+            "master_bursts": list(master["bursts"][sw]),
+            "slave_bursts": list(slave["bursts"][sw]),
+            "overlap": round(overlap, 3),
+        }
+        if overlap > 0:
+            overlapping.append(sw)
+    if swaths and not overlapping:
+        reasons.append("no burst overlap between master and slave")
+
+    plan["accepted"] = not reasons
+    plan["reasons"] = reasons
+    if not overlapping:
+        return plan
+
+    # 各阶段尺寸（按 master 几何；slave 重采样到 master）
+    stages = {}
+    deb_dims = []
+    for sw in overlapping:
+        ann = master["annotations"][sw]
+        first, last = master["bursts"][sw]
+        width, n = ann["samples_per_burst"], last - first + 1
+        sfx = f":{sw}" if len(overlapping) > 1 else ""
+        for name in ("split", "bg", "esd", "ifg"):
+            stages[name + sfx] = _stage(width, n * ann["lines_per_burst"], STAGE_BYTES[name])
+        deb_dims.append((width, deburst_lines(ann, first, last)))
+        if sfx:
+            stages["deburst" + sfx] = _stage(*deb_dims[-1], STAGE_BYTES["deburst"])
+    if len(overlapping) > 1:
+        # TOPSAR-Merge：相邻 swath 的重叠未扣除（上限）
+        width, height = sum(d[0] for d in deb_dims), max(d[1] for d in deb_dims)
+        stages["merge"] = _stage(width, height, STAGE_BYTES["merge"])
+        unw_dims = flt_dims = (width, height)
+    else:
+        # 单 swath：flt/unw 仍是 burst 几何，Deburst 在解缠之后
+        flt_dims = (stages["ifg"]["width"], stages["ifg"]["height"])
+        unw_dims = flt_dims
+    stages["flt"] = _stage(*flt_dims, STAGE_BYTES["flt"])
+    stages["unw"] = _stage(*unw_dims, STAGE_BYTES["unw"])
+    if len(overlapping) == 1:
+        stages["deburst"] = _stage(*deb_dims[0], STAGE_BYTES["deburst"])
+    deb = stages.get("merge") or stages["deburst"]
+    height_backend = opt.get("phase_to_height", "none")
+    extra = HEIGHT_BAND_BYTES if height_backend != "none" else 0
+    if extra:
+        stages["height"] = _stage(deb["width"], deb["height"], STAGE_BYTES["height"])
+
+    scene_box = s1_meta.bursts_bbox([master["annotations"][sw] for sw in overlapping],
+                                    {sw: master["bursts"][sw] for sw in overlapping})
+    tc_box = scene_box
+    if opt.get("tc_subset", True):
+        aoi_box = _expand(s1_meta.load_aoi_bbox(aoi), opt.get("subset_margin") or 0.0)
+        tc_box = _intersection(aoi_box, scene_box) or scene_box
+        fx = (tc_box[2] - tc_box[0]) / max(scene_box[2] - scene_box[0], 1e-9)
+        fy = (tc_box[3] - tc_box[1]) / max(scene_box[3] - scene_box[1], 1e-9)
+        stages["subset"] = _stage(math.ceil(deb["width"] * fx), math.ceil(deb["height"] * fy),
+                                  STAGE_BYTES["subset"] + extra)
+    stages["tc"] = _stage(math.ceil((tc_box[2] - tc_box[0]) / TC_SPACING_DEG),
+                          math.ceil((tc_box[3] - tc_box[1]) / TC_SPACING_DEG), STAGE_BYTES["tc"] + extra)
+    plan["stages"] = stages
+    plan["tc_bbox"] = [round(v, 6) for v in tc_box]
+
+    # Goldstein 滤波（NumPy：分块批量 FFT；i/q 较大时写 memmap）
+    filter_gb = 0.0
+    fw, fh = flt_dims
+    if opt.get("goldstein", "snap") == "numpy":
+        tile = opt.get("goldstein_tile", goldstein_np.TILE)
+        workers = opt.get("goldstein_workers", goldstein_np.WORKERS)
+        in_memory = fw * fh * 8 <= opt.get("goldstein_inmemory_mb", 512) * 1024 ** 2
+        filter_gb = goldstein_np.tile_memory_mb(tile, workers) / 1024 + (fw * fh * 8 / GB if in_memory else 0)
+        plan["filter"] = {
+            "backend": "numpy",
+            "tiles": sum(1 for _ in goldstein_np.tiles(fh, fw, tile)),
+            "tile": tile,
+            "in_memory": in_memory,
+            "memory_gb": round(filter_gb, 2),
+        }
+    else:
+        plan["filter"] = {"backend": "snap"}
+
+    # 解缠
+    uw, uh = unw_dims
+    if opt.get("unwrapper", "snaphu") == "numpy":
+        tile = opt.get("unw_tile", unwrap_np.TILE)
+        overlap = opt.get("unw_overlap", unwrap_np.OVERLAP)
+        workers = opt.get("unw_workers", 1)
+        in_memory = uw * uh * 4 <= opt.get("unw_inmemory_mb", 512) * 1024 ** 2
+        unwrap_gb = unwrap_np.tile_memory_mb(tile, workers) / 1024 + (uw * uh * 4 / GB if in_memory else 0)
+        plan["unwrap"] = {
+            "backend": "numpy",
+            "tiles": sum(1 for _ in unwrap_np.tiles(uh, uw, tile, overlap)),
+            "tile": tile,
+            "in_memory": in_memory,
+            "memory_gb": round(unwrap_gb, 2),
+        }
+    else:
+        tiling = snaphu_runner.plan_tiling(uw, uh, opt.get("snaphu_cores"))
+        tile_px = (uh / tiling["ntilerow"] + tiling["rowovrlp"]) * (uw / tiling["ntilecol"] + tiling["colovrlp"])
+        unwrap_gb = tiling["nproc"] * tile_px * SNAPHU_BYTES_PER_PIXEL / GB
+        plan["unwrap"] = {
+            "backend": "snaphu",
+            "tiles": tiling["ntilerow"] * tiling["ntilecol"],
+            "tiling": tiling,
+            "memory_gb": round(unwrap_gb, 2),
+        }
+
+    # 相位 -> 高程（NumPy：分块换算；结果较大时写 memmap）
+    height_gb = 0.0
+    if height_backend == "numpy":
+        dw, dh = deb["width"], deb["height"]
+        tile = opt.get("height_tile", phase_height.TILE)
+        workers = opt.get("height_workers", phase_height.WORKERS)
+        in_memory = dw * dh * 4 <= opt.get("height_inmemory_mb", 512) * 1024 ** 2
+        height_gb = phase_height.tile_memory_mb(tile, workers) / 1024 + (dw * dh * 4 / GB if in_memory else 0)
+        plan["height"] = {
+            "backend": "numpy",
+            "tiles": sum(1 for _ in phase_height.tiles(dh, dw, tile)),
+            "tile": tile,
+            "in_memory": in_memory,
+            "memory_gb": round(height_gb, 2),
+        }
+    elif height_backend == "snap":
+        plan["height"] = {"backend": "snap"}
+
+    # 磁盘：ifg_flt.dim、解缠中间文件、TC 输出、COG；启用阶段缓存时加上缓存的各阶段
+    disk = {}
+    if opt.get("flt_write_dimap", True):
+        disk["ifg_flt"] = stages["flt"]["bytes"]
+    if plan["filter"].get("in_memory") is False:
+        disk["flt_numpy"] = fw * fh * 8
+    if plan["unwrap"]["backend"] == "snaphu":
+        disk["snaphu"] = uw * uh * SNAPHU_EXPORT_BYTES
+    elif not plan["unwrap"]["in_memory"]:
+        disk["unw_numpy"] = uw * uh * 4
+    if plan.get("height", {}).get("in_memory") is False:
+        disk["height"] = deb["width"] * deb["height"] * 4
+    if opt.get("tc_write_dimap", True):
+        disk["ifg_deb_TC"] = stages["tc"]["bytes"]
+    disk["DEM_output"] = stages["tc"]["bytes"]
+    if opt.get("cog"):
+        disk["DEM_cog"] = int(stages["tc"]["bytes"] * COG_RATIO)
+    if opt.get("cache"):
+        cached = ("split", "bg", "esd", "ifg", "merge", "unw", "deburst")
+        # split_orb 按景缓存（master + slave）
+        disk["stage_cache"] = sum(st["bytes"] * (2 if name.startswith("split") else 1)
+                                  for name, st in stages.items() if name.split(":")[0] in cached)
+    plan["disk"] = disk
+    plan["disk_gb"] = round(sum(disk.values()) / GB, 2)
+
+    bg_bytes = sum(st["bytes"] for name, st in stages.items() if name.split(":")[0] == "bg")
+    jvm_gb = JVM_BASE_GB + JVM_RASTER_FRACTION * bg_bytes / GB
+    plan["memory"] = {
+        "jvm_gb": round(jvm_gb, 2),
+        "unwrap_gb": round(unwrap_gb, 2),
+        "filter_gb": round(filter_gb, 2),
+        "height_gb": round(height_gb, 2),
+        # 滤波/解缠/高程换算时 JVM 仍然存活
+        "peak_gb": round(jvm_gb + max(filter_gb, unwrap_gb, height_gb), 2),
+    }
+    return plan
+
+
+def plan_pairs(pairs, aoi=None, iw="auto", polarization="VV", max_days=None, options=None):
+    """[(master, slave, name)] -> {"pairs": [...], "summary": {...}}；每景的 annotation 只读一次"""
+    scenes = {}
+
+    def scene(path):
+        if path not in scenes:
+            scenes[path] = scene_plan(path, polarization, aoi, iw)
+        return scenes[path]
+
+    plans = []
+    for master, slave, name in pairs:
+        try:
+            plan = plan_pair(scene(master), scene(slave), aoi, max_days, options)
+        except (OSError, ValueError, KeyError) as e:
+            plan = {"master": master, "slave": slave, "accepted": False, "reasons": [f"cannot read annotations: {e}"]}
+        if name:
+            plan["name"] = name
+        plans.append(plan)
+    accepted = [p for p in plans if p["accepted"]]
+    return {
+        "pairs": plans,
+        "summary": {
+            "pairs": len(plans),
+            "accepted": len(accepted),
+            "rejected": len(plans) - len(accepted),
+            "disk_gb": round(sum(p.get("disk_gb", 0) for p in accepted), 2),
+            "peak_memory_gb": max((p["memory"]["peak_gb"] for p in accepted), default=0),
+        },
+    }
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+解缠相位 -> 高程（NumPy，分块、多线程）
+
+- 几何：master/slave annotation 的轨道状态矢量（三次 Hermite 插值）与地理定位网格点。
+  对每个网格点求两颗卫星的零多普勒位置，数值求高程敏感度 k = dφ/dh = 4π/λ · ∂(R_s - R_m)/∂h
+  （h 沿 master 等斜距方向变化，即同一像元内的地形高度）；
+  同时给出垂直基线 B⊥ = -∂(R_s - R_m)/∂h · R · sinθ 与模糊高度 2π/|k|，便于核对
+- k 随斜距平滑变化：对斜距时间拟合多项式，每个像元按其斜距时间取 k（与 burst/deburst/merge 的行布局无关）
+- 高程 = φ/k + offset；offset 由参考 DEM（干涉图的 elevation 波段）在高相干像元上的中位数差确定，
+  同时检查相位符号约定（与参考 DEM 负相关时翻转）
+- 分块读取/写出在调用线程中进行，换算在线程池中进行，内存只与块大小有关
+"""
+import math
+import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+C = 299792458.0
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+EPOCH = datetime.datetime(2000, 1, 1)
+
+DELTA_H = 50.0          # 数值求导的高程步长（米）
+POLY_DEGREE = 3         # k(斜距时间) 多项式阶数
+TILE = 1024             # 分块边长（像元）
+WORKERS = 2
+NODATA = -32768.0
+CAL_WINDOWS = 8         # 标定：CAL_WINDOWS x CAL_WINDOWS 个采样窗口
+CAL_WINDOW = 32         # 采样窗口边长（像元）
+CAL_MIN_COHERENCE = 0.4
+CAL_MIN_PIXELS = 100
+
+
+def _seconds(t):
+    return (t - EPOCH).total_seconds()
+
+
+def ecef(lat, lon, h):
+    """WGS84 大地坐标（度、米）-> 地心地固坐标，形状 (..., 3)"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * np.sin(lat) ** 2)
+    return np.stack([(n + h) * np.cos(lat) * np.cos(lon),
+                     (n + h) * np.cos(lat) * np.sin(lon),
+                     (n * (1 - WGS84_E2) + h) * np.sin(lat)], axis=-1)
+
+
+def normal(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class Orbit:
+    """轨道状态矢量的三次 Hermite 插值（位置与速度同时使用）"""
+
+    def __init__(self, vectors):
+        self.t = np.array([_seconds(v[0]) for v in vectors])
+        self.pos = np.array([v[1] for v in vectors], dtype=np.float64)
+        self.vel = np.array([v[2] for v in vectors], dtype=np.float64)
+        if len(self.t) < 2:
+            raise ValueError("Orbit needs at least two state vectors")
+
+    def at(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        i = np.clip(np.searchsorted(self.t, t) - 1, 0, len(self.t) - 2)
+        dt = (self.t[i + 1] - self.t[i])[..., None]
+        s = ((t - self.t[i]) / (self.t[i + 1] - self.t[i]))[..., None]
+        p0, p1, v0, v1 = self.pos[i], self.pos[i + 1], self.vel[i] * dt, self.vel[i + 1] * dt
+        s2, s3 = s * s, s * s * s
+        pos = (2 * s3 - 3 * s2 + 1) * p0 + (s3 - 2 * s2 + s) * v0 + (-2 * s3 + 3 * s2) * p1 + (s3 - s2) * v1
+        vel = ((6 * s2 - 6 * s) * p0 + (3 * s2 - 4 * s + 1) * v0 + (-6 * s2 + 6 * s) * p1 + (3 * s2 - 2 * s) * v1) / dt
+        return pos, vel
+
+    def zero_doppler(self, points, t0=None, iterations=8):
+        """地面点 (..., 3) 的零多普勒时刻；t0 省略时从最近的状态矢量开始迭代"""
+        points = np.asarray(points, dtype=np.float64)
+        if t0 is None:
+            d = np.linalg.norm(points[..., None, :] - self.pos, axis=-1)
+            t = self.t[np.argmin(d, axis=-1)]
+        else:
+            t = np.array(t0, dtype=np.float64)
+        for _ in range(iterations):
+            pos, vel = self.at(t)
+            t = t + np.sum((points - pos) * vel, axis=-1) / np.sum(vel * vel, axis=-1)
+        return t
+
+    def range(self, points, t0=None):
+        t = self.zero_doppler(points, t0)
+        pos, _ = self.at(t)
+        return np.linalg.norm(points - pos, axis=-1), t
+
+
+def sensitivity(master_geom, slave_geom):
+    """master/slave 同一 swath 的 s1_meta.parse_geometry() 结果 -> 网格点上的 dict(数组)
+
+    tau（双程斜距时间，秒）, k（rad/m）, bperp（米）, incidence（度）, range（米）
+    """
+    grid = master_geom["grid"]
+    lat = np.array([g["lat"] for g in grid])
+    lon = np.array([g["lon"] for g in grid])
+    h = np.array([g["height"] for g in grid])
+    t_m = np.array([_seconds(g["azimuth_time"]) for g in grid])
+    inc = np.array([g["incidence"] for g in grid])
+    tau = np.array([g["slant_range_time"] for g in grid])
+    wavelength = C / master_geom["radar_frequency"]
+
+    master, slave = Orbit(master_geom["orbit"]), Orbit(slave_geom["orbit"])
+    up = normal(lat, lon)
+    p0 = ecef(lat, lon, h)
+    r_m0, tm = master.range(p0, t_m)
+    r_s0, ts = slave.range(p0)
+    # 同一 master 像元（斜距不变）内升高：竖直抬升 DELTA_H 后沿 master 视线移回原斜距
+    pos_m, _ = master.at(tm)
+    los = (pos_m - p0) / r_m0[..., None]
+    p1 = p0 + DELTA_H * up
+    r_m1, _ = master.range(p1, tm)
+    p1 = p1 + (r_m1 - r_m0)[..., None] * los
+    dh = np.sum((p1 - p0) * up, axis=-1)
+    r_m1, _ = master.range(p1, tm)
+    r_s1, _ = slave.range(p1, ts)
+    d = ((r_s1 - r_m1) - (r_s0 - r_m0)) / dh
+    return {
+        "tau": tau,
+        "k": 4 * np.pi / wavelength * d,
+        "bperp": -d * r_m0 * np.sin(np.radians(inc)),
+        "incidence": inc,
+        "range": r_m0,
+    }
+
+
+class HeightModel:
+    """k(tau) 多项式 + 高程偏移；height(phase, tau) -> 高程（米）"""
+
+    def __init__(self, tau, k, degree=POLY_DEGREE):
+        tau, k = np.asarray(tau, dtype=np.float64), np.asarray(k, dtype=np.float64)
+        self.tau0 = float(tau.mean())
+        self.tau_scale = float(max(tau.std(), 1e-12))
+        x = (tau - self.tau0) / self.tau_scale
+        self.coeffs = np.polyfit(x, k, min(degree, max(len(np.unique(tau)) - 1, 0)))
+        fit = np.polyval(self.coeffs, x)
+        # 同一斜距上沿方位向的变化与拟合残差（相对值），用于判断模型是否足够
+        self.fit_error = float(np.max(np.abs(fit - k) / np.maximum(np.abs(k), 1e-12)))
+        self.offset = 0.0
+        self.sign = 1.0
+
+    def k(self, tau):
+        return np.polyval(self.coeffs, (np.asarray(tau, dtype=np.float64) - self.tau0) / self.tau_scale)
+
+    def relative(self, phase, tau):
+        return self.sign * np.asarray(phase, dtype=np.float64) / self.k(tau)
+
+    def height(self, phase, tau, nodata=NODATA):
+        phase = np.asarray(phase)
+        out = self.relative(phase, tau) + self.offset
+        out[(phase == 0) | ~np.isfinite(out)] = nodata
+        return out.astype(np.float32)
+
+
+def build_model(pairs, degree=POLY_DEGREE):
+    """pairs: [(master_geom, slave_geom)]（各 swath）-> (HeightModel, 统计 dict)"""
+    parts = [sensitivity(m, s) for m, s in pairs]
+    tau = np.concatenate([p["tau"] for p in parts])
+    k = np.concatenate([p["k"] for p in parts])
+    bperp = np.concatenate([p["bperp"] for p in parts])
+    model = HeightModel(tau, k, degree)
+    stats = {
+        "bperp_m": [round(float(bperp.min()), 2), round(float(np.median(bperp)), 2), round(float(bperp.max()), 2)],
+        "height_of_ambiguity_m": round(float(np.median(2 * np.pi / np.abs(k))), 2),
+        "incidence_deg": [round(float(np.concatenate([p["incidence"] for p in parts]).min()), 2),
+                          round(float(np.concatenate([p["incidence"] for p in parts]).max()), 2)],
+        "k_fit_error": round(model.fit_error, 5),
+    }
+    return model, stats
+
+
+def sample_windows(height, width, n=CAL_WINDOWS, size=CAL_WINDOW):
+    """标定用的规则采样窗口 (y0, x0, h, w)"""
+    ys = np.linspace(0, max(height - size, 0), n).astype(int)
+    xs = np.linspace(0, max(width - size, 0), n).astype(int)
+    return sorted({(int(y), int(x), min(size, height), min(size, width)) for y in ys for x in xs})
+
+
+def calibrate(model, samples, min_coherence=CAL_MIN_COHERENCE, dem_nodata=None):
+    """samples: [(phase, tau, dem, coh)]（coh 可为 None）-> 统计 dict；设置 model.offset / model.sign
+
+    参考像元不足 CAL_MIN_PIXELS 时返回 None（offset 保持 0，即相对高程）
+    """
+    rel, ref = [], []
+    for phase, tau, dem, coh in samples:
+        phase, dem = np.asarray(phase, dtype=np.float64), np.asarray(dem, dtype=np.float64)
+        valid = (phase != 0) & np.isfinite(phase) & np.isfinite(dem)
+        if dem_nodata is not None:
+            valid &= dem != dem_nodata
+        if coh is not None:
+            valid &= np.asarray(coh) >= min_coherence
+        rel.append(phase[valid] / model.k(np.asarray(tau)[valid]))
+        ref.append(dem[valid])
+    rel, ref = np.concatenate(rel), np.concatenate(ref)
+    if rel.size < CAL_MIN_PIXELS:
+        return None
+    flipped = bool(rel.std() > 0 and ref.std() > 0 and np.corrcoef(rel, ref)[0, 1] < 0)
+    model.sign = -1.0 if flipped else 1.0
+    rel = model.sign * rel
+    model.offset = float(np.median(ref - rel))
+    residual = ref - (rel + model.offset)
+    return {
+        "pixels": int(rel.size),
+        "offset_m": round(model.offset, 3),
+        "sign_flipped": flipped,
+        "residual_median_m": round(float(np.median(residual)), 3),
+        "residual_nmad_m": round(float(1.4826 * np.median(np.abs(residual - np.median(residual)))), 3),
+    }
+
+
+def tiles(height, width, tile=TILE):
+    for y0 in range(0, height, tile):
+        for x0 in range(0, width, tile):
+            yield y0, x0, min(tile, height - y0), min(tile, width - x0)
+
+
+def convert_tiled(read_tile, height, width, out, model, tile=TILE, workers=WORKERS, log=None):
+    """分块换算写入 out（ndarray 或 np.memmap，形状 (height, width)）
+
+    read_tile(y0, x0, h, w) -> (phase, tau)；读块与写出在调用线程中按顺序进行，换算在 workers 个线程中进行
+    """
+    windows = list(tiles(height, width, tile))
+    if log:
+        log("INFO", f"Phase to height {width}x{height}: {len(windows)} tiles of {tile} px, {workers} workers")
+
+    def work(win, phase, tau):
+        return win, model.height(phase, tau)
+
+    def store(win, h):
+        y0, x0, th, tw = win
+        out[y0:y0 + th, x0:x0 + tw] = h
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for win in windows:
+            phase, tau = read_tile(*win)
+            pending.append(pool.submit(work, win, phase, tau))
+            while len(pending) > max(1, workers):
+                store(*pending.popleft().result())
+        while pending:
+            store(*pending.popleft().result())
+    return out
+
+
+def tile_memory_mb(tile=TILE, workers=WORKERS):
+    # 每个在途块：相位/斜距时间 float32 读入 + 若干 float64 中间数组
+    return math.ceil(tile * tile * (2 * 4 + 4 * 8) * (workers + 1) / 1024 ** 2)
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+Sentinel-1 SAFE 元数据与 AOI 工具（仅依赖标准库）
+
+slc_dl.py（按 burst 下载）与 dsm.py（按 AOI 选择 swath/burst）共用：
+- AOI：ROI 字符串 / GeoJSON 文件 -> 经纬度外包框 / WKT 多边形
+- annotation XML：swath、极化、burst 列表（byteOffset）以及每个 burst 的地理范围
+"""
+import os
+import json
+import sqlite3
+import zipfile
+import datetime
+import xml.etree.ElementTree as ET
+
+DEFAULT_AOI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "aoi.geojson")
+
+
+# ---------------------- AOI ----------------------
+def geometry_bbox(geometry):
+    """GeoJSON 几何的外包框 (min_lon, min_lat, max_lon, max_lat)；无坐标时返回 None"""
+    coords = []
+
+    def _walk(c):
+        if c and isinstance(c[0], (int, float)):
+            coords.append(c)
+        else:
+            for sub in c or []:
+                _walk(sub)
+
+    _walk((geometry or {}).get("coordinates"))
+    if not coords:
+        return None
+    lons = [c[0] for c in coords]
+    lats = [c[1] for c in coords]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def load_aoi_bbox(aoi=None):
+    """AOI -> 外包框
+
+    aoi 可以是 GeoJSON 文件路径、'minLon,minLat,maxLon,maxLat' 字符串或 4 元组；
+    省略时使用仓库自带的 data/aoi.geojson
+    """
+    aoi = DEFAULT_AOI if aoi is None else aoi
+    if isinstance(aoi, (tuple, list)):
+        return tuple(float(v) for v in aoi)
+    if os.path.exists(aoi):
+        with open(aoi, "r", encoding="utf-8") as f:
+            gj = json.load(f)
+        features = gj.get("features") or [gj if gj.get("type") == "Feature" else {"geometry": gj}]
+        boxes = [b for b in (geometry_bbox(ft.get("geometry")) for ft in features) if b]
+        if not boxes:
+            raise ValueError(f"No geometry in AOI file: {aoi}")
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+    return tuple(float(v) for v in aoi.split(","))
+
+
+def _ring_wkt(ring):
+    return "(" + ", ".join(f"{c[0]} {c[1]}" for c in ring) + ")"
+
+
+def load_aoi_polygons(aoi=None):
+    """AOI -> 多边形列表，每个多边形为环列表（外环 + 洞），环为 [(lon, lat), ...]
+
+    GeoJSON 中的 Polygon/MultiPolygon 原样保留（多个要素合并），
+    其他几何与 ROI 字符串使用外包框
+    """
+    aoi = DEFAULT_AOI if aoi is None else aoi
+    polygons = []
+    if isinstance(aoi, str) and os.path.exists(aoi):
+        with open(aoi, "r", encoding="utf-8") as f:
+            gj = json.load(f)
+        features = gj.get("features") or [gj if gj.get("type") == "Feature" else {"geometry": gj}]
+        for ft in features:
+            geom = ft.get("geometry") or {}
+            if geom.get("type") == "Polygon":
+                polygons.append(geom["coordinates"])
+            elif geom.get("type") == "MultiPolygon":
+                polygons.extend(geom["coordinates"])
+            else:
+                polygons = []
+                break
+    if not polygons:
+        x0, y0, x1, y1 = load_aoi_bbox(aoi)
+        polygons = [[[(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]]]
+    return polygons
+
+
+def load_aoi_wkt(aoi=None):
+    """AOI -> WKT 多边形（SNAP Subset 的 geoRegion），多个多边形合为 MULTIPOLYGON"""
+    bodies = ["(" + ", ".join(_ring_wkt(r) for r in poly) + ")" for poly in load_aoi_polygons(aoi)]
+    if len(bodies) == 1:
+        return "POLYGON " + bodies[0]
+    return "MULTIPOLYGON (" + ", ".join(bodies) + ")"
+
+
+def bbox_intersects(a, b):
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+# ---------------------- annotation ----------------------
+def _text(node, path, cast=str, default=None):
+    el = node.find(path)
+    if el is None or el.text is None:
+        return default
+    return cast(el.text.strip())
+
+
+def parse_annotation(xml_bytes):
+    """解析 swath annotation XML（annotation/s1?-iw?-slc-??-*.xml）
+
+    返回 dict：swath, polarisation, lines, samples, lines_per_burst, samples_per_burst,
+    azimuth_time_interval（秒）, range/azimuth_pixel_spacing（米）,
+    bursts=[{"index": 从1开始, "azimuth_time", "byte_offset", "bbox", "polygon"}]
+    （polygon 为 burst 首尾网格行围成的 [(lon, lat)] 轮廓，bbox 为其外包框）
+    """
+    root = ET.fromstring(xml_bytes)
+    ann = {
+        "swath": _text(root, "adsHeader/swath"),
+        "polarisation": _text(root, "adsHeader/polarisation"),
+        "start_time": _text(root, "adsHeader/startTime"),
+        "lines": _text(root, "imageAnnotation/imageInformation/numberOfLines", int),
+        "samples": _text(root, "imageAnnotation/imageInformation/numberOfSamples", int),
+        "lines_per_burst": _text(root, "swathTiming/linesPerBurst", int),
+        "samples_per_burst": _text(root, "swathTiming/samplesPerBurst", int),
+        "azimuth_time_interval": _text(root, "imageAnnotation/imageInformation/azimuthTimeInterval", float),
+        "range_pixel_spacing": _text(root, "imageAnnotation/imageInformation/rangePixelSpacing", float),
+        "azimuth_pixel_spacing": _text(root, "imageAnnotation/imageInformation/azimuthPixelSpacing", float),
+    }
+
+    # 地理定位网格：按行号分组
+    grid = {}
+    for pt in root.iterfind("geolocationGrid/geolocationGridPointList/geolocationGridPoint"):
+        line = _text(pt, "line", int)
+        grid.setdefault(line, []).append((_text(pt, "pixel", int, 0), _text(pt, "longitude", float),
+                                          _text(pt, "latitude", float)))
+    grid_lines = sorted(grid)
+
+    bursts = []
+    lpb = ann["lines_per_burst"]
+    for i, b in enumerate(root.iterfind("swathTiming/burstList/burst")):
+        first, last = i * lpb, (i + 1) * lpb
+        # 取覆盖 [first, last] 的最近网格行
+        lo = max([ln for ln in grid_lines if ln <= first] or grid_lines[:1])
+        hi = min([ln for ln in grid_lines if ln >= last] or grid_lines[-1:])
+        pts = [p[1:] for ln in grid_lines if lo <= ln <= hi for p in grid[ln]]
+        bbox = polygon = None
+        if pts:
+            bbox = (min(p[0] for p in pts), min(p[1] for p in pts),
+                    max(p[0] for p in pts), max(p[1] for p in pts))
+            polygon = [p[1:] for p in sorted(grid[lo])] + [p[1:] for p in sorted(grid[hi], reverse=True)]
+        bursts.append({
+            "index": i + 1,
+            "azimuth_time": _text(b, "azimuthTime"),
+            "byte_offset": _text(b, "byteOffset", int),
+            "bbox": bbox,
+            "polygon": polygon,
+        })
+    ann["bursts"] = bursts
+    return ann
+
+
+def parse_geometry(xml_bytes):
+    """annotation XML 中相位转高程所需的几何信息
+
+    返回 dict：swath, radar_frequency（Hz）, slant_range_time（首像元双程时间，秒）,
+    orbit=[(时间, (x, y, z), (vx, vy, vz))]（地固系，米），
+    grid=[{"azimuth_time", "slant_range_time", "line", "pixel", "lat", "lon", "height", "incidence"}]
+    时间均为 datetime
+    """
+    root = ET.fromstring(xml_bytes)
+    orbit = []
+    for o in root.iterfind("generalAnnotation/orbitList/orbit"):
+        orbit.append((
+            _parse_time(_text(o, "time")),
+            tuple(_text(o, f"position/{c}", float) for c in "xyz"),
+            tuple(_text(o, f"velocity/{c}", float) for c in "xyz"),
+        ))
+    grid = []
+    for pt in root.iterfind("geolocationGrid/geolocationGridPointList/geolocationGridPoint"):
+        grid.append({
+            "azimuth_time": _parse_time(_text(pt, "azimuthTime")),
+            "slant_range_time": _text(pt, "slantRangeTime", float),
+            "line": _text(pt, "line", int),
+            "pixel": _text(pt, "pixel", int),
+            "lat": _text(pt, "latitude", float),
+            "lon": _text(pt, "longitude", float),
+            "height": _text(pt, "height", float, 0.0),
+            "incidence": _text(pt, "incidenceAngle", float),
+        })
+    return {
+        "swath": _text(root, "adsHeader/swath"),
+        "radar_frequency": _text(root, "generalAnnotation/productInformation/radarFrequency", float),
+        "slant_range_time": _text(root, "imageAnnotation/imageInformation/slantRangeTime", float),
+        "orbit": sorted(orbit),
+        "grid": grid,
+    }
+
+
+def _parse_time(text):
+    # 2020-12-17T08:41:40.123456（可能没有小数部分）
+    if not text:
+        return None
+    return datetime.datetime.fromisoformat(text.strip().rstrip("Z")[:26])
+
+
+def read_zip_geometry(zip_path, polarization=None, swaths=None):
+    """SAFE zip / .SAFE 目录中各 swath 的 parse_geometry() 结果 {swath: dict}"""
+    out = {}
+
+    def add(name, data):
+        swath, pol = annotation_key(name)
+        if polarization and pol != polarization.upper():
+            return
+        if swaths and swath not in swaths:
+            return
+        out[swath] = parse_geometry(data)
+
+    if os.path.isdir(zip_path):
+        ann_dir = os.path.join(zip_path, "annotation")
+        for fn in sorted(os.listdir(ann_dir)):
+            if fn.endswith(".xml"):
+                with open(os.path.join(ann_dir, fn), "rb") as f:
+                    add(fn, f.read())
+        return out
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in zf.namelist():
+            if is_swath_annotation(name):
+                add(name, zf.read(name))
+    return out
+
+
+def burst_nbytes(ann):
+    """单个 burst 在 measurement TIFF 中的字节数（CInt16 复数，每像元 4 字节）"""
+    return ann["lines_per_burst"] * ann["samples_per_burst"] * 4
+
+
+def point_in_polygon(x, y, polygon):
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        (xi, yi), (xj, yj) = polygon[i], polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _aoi_samples(aoi_bbox, n=8):
+    # AOI 矩形边界上的采样点（含四角）
+    x0, y0, x1, y1 = aoi_bbox
+    t = [k / n for k in range(n + 1)]
+    return ([(x0 + (x1 - x0) * f, y) for f in t for y in (y0, y1)] +
+            [(x, y0 + (y1 - y0) * f) for f in t[1:-1] for x in (x0, x1)])
+
+
+def _covers(polygons, samples):
+    return bool(polygons) and all(any(point_in_polygon(x, y, p) for p in polygons) for x, y in samples)
+
+
+def select_bursts(annotations, aoi_bbox):
+    """选出覆盖 AOI 的最少 swath 及每个 swath 的连续 burst 范围
+
+    先找单个 swath：burst 轮廓（不是外包框；IW burst 倾斜且与相邻 swath 重叠）能覆盖整个 AOI 的，
+    取其中覆盖 AOI 的最短连续 burst 段（burst 最少者优先）；没有时取覆盖 AOI 的最少相邻 swath
+    （各取外包框与 AOI 相交的 burst）；AOI 超出景范围时返回所有与之相交的 swath
+    annotations: parse_annotation() 结果列表（同一极化的各 swath）
+    返回 {swath: (first_burst, last_burst)}（burst 序号从 1 开始），按 swath 排序
+    """
+    hits = {}
+    for ann in annotations:
+        bursts = [b for b in ann["bursts"] if b["bbox"] and bbox_intersects(b["bbox"], aoi_bbox)]
+        if bursts:
+            hits[ann["swath"]] = sorted(bursts, key=lambda b: b["index"])
+    swaths = sorted(hits)
+    samples = _aoi_samples(aoi_bbox)
+    polygons = lambda bursts: [b["polygon"] for b in bursts if b.get("polygon")]
+    span = lambda bursts: (bursts[0]["index"], bursts[-1]["index"])
+
+    single = []
+    for sw in swaths:
+        bursts = hits[sw]
+        for n in range(1, len(bursts) + 1):
+            run = next((bursts[i:i + n] for i in range(len(bursts) - n + 1)
+                        if _covers(polygons(bursts[i:i + n]), samples)), None)
+            if run:
+                single.append((n, sw, span(run)))
+                break
+    if single:
+        _, sw, rng = min(single)
+        return {sw: rng}
+    for size in range(2, len(swaths)):
+        groups = [swaths[i:i + size] for i in range(len(swaths) - size + 1)]
+        groups = [g for g in groups if _covers([p for sw in g for p in polygons(hits[sw])], samples)]
+        if groups:
+            best = min(groups, key=lambda g: sum(len(hits[sw]) for sw in g))
+            return {sw: span(hits[sw]) for sw in best}
+    return {sw: span(hits[sw]) for sw in swaths}
+
+
+def bursts_bbox(annotations, bursts):
+    """select_bursts() 选中的 burst 的合并外包框；没有时返回 None"""
+    boxes = []
+    for ann in annotations:
+        if ann["swath"] not in bursts:
+            continue
+        first, last = bursts[ann["swath"]]
+        boxes += [b["bbox"] for b in ann["bursts"] if b["bbox"] and first <= b["index"] <= last]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def is_swath_annotation(name):
+    """SAFE 内 swath annotation 的路径（不含 calibration/noise/rfi 子目录）"""
+    parts = name.replace("\\", "/").split("/")
+    return len(parts) >= 2 and parts[-2] == "annotation" and parts[-1].endswith(".xml")
+
+
+def annotation_key(name):
+    """annotation / measurement 文件名 -> (swath, polarisation)，如 ('IW2', 'VV')"""
+    # s1a-iw2-slc-vv-20201217t084141-...
+    fields = os.path.basename(name).split("-")
+    for i, f in enumerate(fields):
+        if f.startswith("s1") and i + 3 < len(fields):
+            return fields[i + 1].upper(), fields[i + 3].upper()
+    return None, None
+
+
+def read_annotations(zf, polarisation=None):
+    """从已打开的 SAFE zip（zipfile.ZipFile，可以是远程 Range 文件）读取 swath annotation"""
+    anns = []
+    for name in zf.namelist():
+        if not is_swath_annotation(name):
+            continue
+        swath, pol = annotation_key(name)
+        if polarisation and pol != polarisation.upper():
+            continue
+        ann = parse_annotation(zf.read(name))
+        ann["path"] = name
+        anns.append(ann)
+    return sorted(anns, key=lambda a: (a["swath"] or "", a["polarisation"] or ""))
+
+
+def read_zip_annotations(zip_path, polarisation=None):
+    """本地 SAFE zip（或 .SAFE 目录）的 swath annotation"""
+    if os.path.isdir(zip_path):
+        ann_dir = os.path.join(zip_path, "annotation")
+        anns = []
+        for fn in sorted(os.listdir(ann_dir)):
+            if fn.endswith(".xml") and (not polarisation or annotation_key(fn)[1] == polarisation.upper()):
+                with open(os.path.join(ann_dir, fn), "rb") as f:
+                    ann = parse_annotation(f.read())
+                ann["path"] = os.path.join(ann_dir, fn)
+                anns.append(ann)
+        return anns
+    with zipfile.ZipFile(zip_path) as zf:
+        return read_annotations(zf, polarisation)
+
+
+# ---------------------- scene names / pair network ----------------------
+def scene_info(path):
+    """S1 产品名 -> dict(name, mission, start, stop, abs_orbit, rel_orbit)；不是 S1 SLC 命名时返回 None
+
+    S1A_IW_SLC__1SDV_20201217T084140_20201217T084207_024740_02F148_C219
+    """
+    name = os.path.basename(path.rstrip("/\\"))
+    for ext in (".zip", ".SAFE"):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    fields = name.split("_")
+    fields = [f for f in fields if f]  # "SLC__1SDV" 中的双下划线
+    if len(fields) < 8 or not fields[0].startswith("S1"):
+        return None
+    try:
+        start = datetime.datetime.strptime(fields[4], "%Y%m%dT%H%M%S")
+        stop = datetime.datetime.strptime(fields[5], "%Y%m%dT%H%M%S")
+        abs_orbit = int(fields[6])
+    except ValueError:
+        return None
+    mission = fields[0]
+    offset = {"S1A": 73, "S1B": 27}.get(mission, 0)
+    return {
+        "name": name,
+        "path": path,
+        "mission": mission,
+        "start": start,
+        "stop": stop,
+        "abs_orbit": abs_orbit,
+        "rel_orbit": (abs_orbit - offset) % 175 + 1,
+    }
+
+
+def catalog_tracks(db_path):
+    """slc_dl 目录库中的 {sceneName: (orbitDirection, pathNumber, frameNumber)}"""
+    if not db_path or not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT sceneName, orbitDirection, pathNumber, frameNumber FROM scenes")
+        return {r[0]: (r[1], r[2], r[3]) for r in rows}
+    finally:
+        conn.close()
+
+
+def find_scenes(root):
+    """递归查找目录下的 SLC zip 与 burst 子集 .SAFE 目录（同名时优先 zip）"""
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for d in list(dirnames):
+            if d.endswith(".SAFE"):
+                dirnames.remove(d)
+                info = scene_info(d)
+                if info:
+                    found.setdefault(info["name"], os.path.join(dirpath, d))
+        for fn in filenames:
+            info = scene_info(fn) if fn.endswith(".zip") else None
+            if info:
+                found[info["name"]] = os.path.join(dirpath, fn)
+    return sorted(found.values())
+
+
+def track_key(info, tracks=None):
+    """同一轨道/帧的分组键：优先用目录库的 path/frame，否则用相对轨道号 + 过境时刻（秒）"""
+    if tracks and info["name"] in tracks:
+        direction, path, frame = tracks[info["name"]]
+        return ("catalog", direction, path, frame)
+    t = info["start"]
+    return ("orbit", info["rel_orbit"], t.hour * 3600 + t.minute * 60 + t.second)
+
+
+def group_tracks(infos, tracks=None, tod_tolerance=10):
+    """按轨道/帧分组；无目录库时，相对轨道号相同且过境时刻相差 tod_tolerance 秒以内视为同一帧"""
+    groups = {}
+    for info in infos:
+        key = track_key(info, tracks)
+        if key[0] == "orbit":
+            for k in groups:
+                if k[0] == "orbit" and k[1] == key[1] and abs(k[2] - key[2]) <= tod_tolerance:
+                    key = k
+                    break
+        groups.setdefault(key, []).append(info)
+    return {k: sorted(v, key=lambda i: i["start"]) for k, v in groups.items()}
+
+
+def small_baseline_pairs(paths, max_days=48, max_neighbors=2, tracks=None):
+    """小基线网络：同一轨道/帧内，每景与其后最多 max_neighbors 景、时间间隔不超过 max_days 天的景配对
+
+    返回 [(master_path, slave_path), ...]，master 为较早一景
+    """
+    infos = [i for i in (scene_info(p) for p in paths) if i]
+    pairs = []
+    for group in group_tracks(infos, tracks).values():
+        for i, m in enumerate(group):
+            for s in group[i + 1:i + 1 + max_neighbors]:
+                if (s["start"] - m["start"]).days <= max_days:
+                    pairs.append((m["path"], s["path"]))
+    return pairs
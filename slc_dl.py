@@ -6,8 +6,21 @@ import asf_search as asf
 from asf_search import ASFSession
 import os
 import time
+import sys
 import json
-from datetime import datetime
+import hashlib
+import argparse
+import random
+import sqlite3
+import struct
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import requests
+
+import s1_meta
 
 # -----------------------------
 # 配置区：用户可调整的过滤参数
@@ -22,9 +35,34 @@ DIRECTION = None         # "ASCENDING" 或 "DESCENDING" 或 None 不限制
 BURST_IDS = None         # 如 [3,4,5] 或 None（不限制）
 ROI = "139.6874,35.6105,139.8258,35.7151"  # 东京经纬度矩形（minLon,minLat,maxLon,maxLat）
 
+# 下载引擎参数
+DOWNLOAD_WORKERS = 4              # 同时下载的景数（场景级线程池）
+CHUNK_WORKERS = 4                 # 单个文件内并行下载的 Range 分块数
+CHUNK_SIZE = 64 * 1024 * 1024     # 每个 Range 分块大小（字节）
+MAX_RETRIES = 5                   # 每次请求的最大重试次数
+RETRY_BACKOFF = 2.0               # 重试退避基数（秒），按 2^n 增长并带随机抖动
+MAX_BANDWIDTH = None              # 所有下载合计的带宽上限（MB/s），None 不限制
+AOI_WORKERS = 2                   # 命令行多 AOI 时并发处理的 AOI 数
+
+# 按 burst 下载：只取覆盖 ROI 的 burst（Range 读取远程 zip），输出精简的 .SAFE 目录
+BURST_MODE = False
+BURST_POLARIZATION = "VV"         # dsm.py 只处理 VV
+BURST_SUBSET_FLAG = "burst_subset.json"  # 写在 .SAFE 内，存在即表示该景子集已完整
+
+# 完整性校验参数
+VERIFY_WORKERS = 4                # 并行校验的文件数
+VERIFY_MD5 = False                # 是否校验 MD5（需读完整个文件，较慢）
+VERIFY_MANIFEST = "verify_manifest.json"  # 会话目录下的校验清单
+
 # 输出路径（基础目录）
 BASE_DIR = "/gucnas2/vickey/s1/SLC/download"
 
+# 本地景目录库（位于 BASE_DIR 下，跨会话共享）
+CATALOG_NAME = "scene_catalog.sqlite"
+INCREMENTAL = True        # 增量搜索：只请求目录库同步水位线之后的新数据
+SYNC_OVERLAP_DAYS = 3     # 水位线回退天数，覆盖 ASF 入库延迟的景
+SEARCH_WORKERS = 4        # 按年切分的子查询并发数
+
 # ASF 认证信息（下载时需要）
 # 优先从环境变量读取，未提供则在认证时回退到 ~/.netrc
 ASF_USERNAME = os.getenv("ASF_USERNAME", "").strip()
@@ -39,6 +77,39 @@ SEARCH_RESULT_FILE = None
 # -----------------------------
 # 工具函数
 # -----------------------------
+def default_config():
+    """由配置区常量生成一份运行配置；命令行/配置文件在此基础上按 AOI 覆盖"""
+    return {
+        "name": None,                   # AOI 名称（多 AOI 时作为 BASE_DIR 下的子目录）
+        "roi": ROI,
+        "start": START_DATE,
+        "end": END_DATE,
+        "platform": PLATFORM,
+        "beam_mode": BEAMMODE,
+        "product_type": PRODUCT_TYPE,
+        "polarization": POLARIZATION,
+        "direction": DIRECTION,
+        "burst_ids": BURST_IDS,
+        "base_dir": BASE_DIR,
+        "catalog": None,                # 目录库路径，None 表示 BASE_DIR 下的默认位置
+        "incremental": INCREMENTAL,
+        "workers": DOWNLOAD_WORKERS,
+        "chunk_workers": CHUNK_WORKERS,
+        "chunk_size": CHUNK_SIZE,
+        "verify_workers": VERIFY_WORKERS,
+        "check_md5": VERIFY_MD5,
+        "burst_mode": BURST_MODE,
+        "burst_polarization": BURST_POLARIZATION,
+    }
+
+def create_asf_session():
+    """创建已认证的 ASFSession（优先环境变量，否则 ~/.netrc）"""
+    if ASF_USERNAME and ASF_PASSWORD:
+        return ASFSession().auth_with_creds(ASF_USERNAME, ASF_PASSWORD)
+    # 当没有环境变量时，创建ASFSession但不调用auth_with_creds
+    # ASFSession会自动使用~/.netrc进行认证
+    return ASFSession()
+
 def test_asf_authentication():
     """测试ASF认证是否正常工作"""
     print("\n🧪 测试ASF认证...")
@@ -46,12 +117,9 @@ def test_asf_authentication():
     try:
         if ASF_USERNAME and ASF_PASSWORD:
             print(f"   使用环境变量: {ASF_USERNAME}")
-            session = ASFSession().auth_with_creds(ASF_USERNAME, ASF_PASSWORD)
         else:
             print("   使用 ~/.netrc 文件")
-            # 当没有环境变量时，创建ASFSession但不调用auth_with_creds
-            # ASFSession会自动使用~/.netrc进行认证
-            session = ASFSession()
+        session = create_asf_session()
         
         # 尝试一个简单的搜索来验证认证
         test_search = asf.search(
@@ -66,21 +134,26 @@ def test_asf_authentication():
     except Exception as e:
         print(f"❌ 认证测试失败: {e}")
         return False
-def create_session_directory():
+def session_paths(session_dir):
+    """会话文件夹下的 (升轨目录, 降轨目录, 搜索结果文件)"""
+    return (os.path.join(session_dir, "Ascending"),
+            os.path.join(session_dir, "Descending"),
+            os.path.join(session_dir, "search_results.json"))
+
+def create_session_directory(base_dir=None):
     """创建以当前时间命名的会话文件夹"""
     global CURRENT_SESSION_DIR, ASC_DIR, DES_DIR, SEARCH_RESULT_FILE
+    base_dir = base_dir or BASE_DIR
     
     # 创建基础目录
-    os.makedirs(BASE_DIR, exist_ok=True)
+    os.makedirs(base_dir, exist_ok=True)
     
     # 生成时间戳文件夹名
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    CURRENT_SESSION_DIR = os.path.join(BASE_DIR, timestamp)
+    CURRENT_SESSION_DIR = os.path.join(base_dir, timestamp)
     
     # 创建会话文件夹和子文件夹
-    ASC_DIR = os.path.join(CURRENT_SESSION_DIR, "Ascending")
-    DES_DIR = os.path.join(CURRENT_SESSION_DIR, "Descending")
-    SEARCH_RESULT_FILE = os.path.join(CURRENT_SESSION_DIR, "search_results.json")
+    ASC_DIR, DES_DIR, SEARCH_RESULT_FILE = session_paths(CURRENT_SESSION_DIR)
     
     os.makedirs(CURRENT_SESSION_DIR, exist_ok=True)
     os.makedirs(ASC_DIR, exist_ok=True)
@@ -90,16 +163,17 @@ def create_session_directory():
     
     return CURRENT_SESSION_DIR
 
-def find_latest_session_directory():
+def find_latest_session_directory(base_dir=None):
     """查找最新的会话文件夹"""
     global CURRENT_SESSION_DIR, ASC_DIR, DES_DIR, SEARCH_RESULT_FILE
+    base_dir = base_dir or BASE_DIR
     
-    if not os.path.exists(BASE_DIR):
+    if not os.path.exists(base_dir):
         return None
     
     # 获取所有时间戳文件夹
-    session_dirs = [d for d in os.listdir(BASE_DIR) 
-                    if os.path.isdir(os.path.join(BASE_DIR, d)) and 
+    session_dirs = [d for d in os.listdir(base_dir) 
+                    if os.path.isdir(os.path.join(base_dir, d)) and 
                     d.replace('_', '').replace('-', '').isdigit()]
     
     if not session_dirs:
@@ -107,10 +181,8 @@ def find_latest_session_directory():
     
     # 按时间排序，获取最新的
     session_dirs.sort(reverse=True)
-    CURRENT_SESSION_DIR = os.path.join(BASE_DIR, session_dirs[0])
-    ASC_DIR = os.path.join(CURRENT_SESSION_DIR, "Ascending")
-    DES_DIR = os.path.join(CURRENT_SESSION_DIR, "Descending")
-    SEARCH_RESULT_FILE = os.path.join(CURRENT_SESSION_DIR, "search_results.json")
+    CURRENT_SESSION_DIR = os.path.join(base_dir, session_dirs[0])
+    ASC_DIR, DES_DIR, SEARCH_RESULT_FILE = session_paths(CURRENT_SESSION_DIR)
     
     return CURRENT_SESSION_DIR
 
@@ -138,29 +210,888 @@ def load_search_results(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+# -----------------------------
+# 下载引擎：场景级线程池 + HTTP Range 分块 + .part 断点续传 + 指数退避重试
+# -----------------------------
+_print_lock = threading.Lock()
+
+def log_line(msg):
+    """多线程安全的打印"""
+    with _print_lock:
+        print(msg, flush=True)
+
+class RateLimiter:
+    """令牌桶限速：所有下载线程共享，控制合计带宽（字节/秒）"""
+    def __init__(self, bytes_per_sec):
+        self.rate = float(bytes_per_sec)
+        self.allowance = self.rate
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+                self.last = now
+                if self.allowance >= n or self.allowance >= self.rate:
+                    self.allowance -= n
+                    return
+                wait = (n - self.allowance) / self.rate
+            time.sleep(wait)
+
+class RetryableError(Exception):
+    """可重试的下载错误（连接中断、5xx、429、分块长度不符等）"""
+
+def check_response(resp):
+    """检查 HTTP 状态：5xx/408/429 视为可重试，其余 4xx 直接抛出"""
+    if resp.status_code in (408, 429) or resp.status_code >= 500:
+        raise RetryableError(f"HTTP {resp.status_code}")
+    resp.raise_for_status()
+
+def with_retries(func, desc, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    """按指数退避（带抖动）重试 func，替代固定的 time.sleep"""
+    for attempt in range(max_retries + 1):
+        try:
+            return func()
+        except requests.HTTPError:
+            # 401/403/404 等客户端错误重试无意义
+            raise
+        except (requests.RequestException, RetryableError) as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            log_line(f"       ⚠️  {desc} 出错 ({e})，{delay:.1f}s 后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+
+def tune_session_pool(session, pool_size):
+    """扩大 session 的连接池，使多线程共享同一个已认证 session 时不必反复建连（只增不减）"""
+    if getattr(session, "_download_pool_size", 0) >= pool_size:
+        return session
+    session._download_pool_size = pool_size
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def probe_remote(session, url):
+    """探测远程文件，返回 (重定向后的最终URL, 文件大小, 是否支持Range)
+
+    ASF 的下载链接会经 Earthdata 认证后重定向到带签名的 S3 地址，签名只对 GET 有效，
+    因此这里用 Range: bytes=0-0 的 GET 代替 HEAD。
+    """
+    def _probe():
+        with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=60) as resp:
+            check_response(resp)
+            if resp.status_code == 206:
+                # Content-Range: bytes 0-0/12345
+                total = resp.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                if total.isdigit():
+                    return resp.url, int(total), True
+            length = resp.headers.get("Content-Length", "")
+            return resp.url, int(length) if length.isdigit() else None, False
+    return with_retries(_probe, "探测")
+
+def _load_part_state(state_path, size, chunk_size):
+    """读取 .part 的分块完成记录；文件大小或分块大小变化时作废"""
+    if not os.path.exists(state_path):
+        return set()
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if state.get("size") != size or state.get("chunk_size") != chunk_size:
+        return set()
+    return set(state.get("done", []))
+
+def _save_part_state(state_path, size, chunk_size, done):
+    tmp = state_path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"size": size, "chunk_size": chunk_size, "done": sorted(done)}, f)
+    os.replace(tmp, state_path)
+
+def _refresh_expired_url(session, url_ref, resp):
+    """预签名地址过期（401/403）时回到原始链接重新认证/重定向，并触发重试"""
+    if resp.status_code in (401, 403) and url_ref["url"] != url_ref["origin"]:
+        url_ref["url"] = probe_remote(session, url_ref["origin"])[0]
+        raise RetryableError(f"HTTP {resp.status_code}，已刷新下载地址")
+
+def _fetch_range(session, url_ref, part_path, start, end, desc, limiter=None):
+    """下载 [start, end] 字节写入 part_path 对应位置；失败时整块重下"""
+    def _fetch():
+        headers = {"Range": f"bytes={start}-{end}"}
+        with session.get(url_ref["url"], headers=headers, stream=True, timeout=120) as resp:
+            _refresh_expired_url(session, url_ref, resp)
+            check_response(resp)
+            if resp.status_code != 206:
+                raise RetryableError("服务器未按 Range 返回分块")
+            written = 0
+            with open(part_path, 'r+b') as f:
+                f.seek(start)
+                for block in resp.iter_content(chunk_size=1024 * 1024):
+                    if limiter is not None:
+                        limiter.consume(len(block))
+                    f.write(block)
+                    written += len(block)
+            if written != end - start + 1:
+                raise RetryableError(f"分块长度不符: {written}/{end - start + 1}")
+    with_retries(_fetch, desc)
+
+def _download_stream(session, url, part_path, size, desc, limiter=None):
+    """服务器不支持 Range 时的单流下载（无法续传，从头开始）"""
+    def _fetch():
+        with session.get(url, stream=True, timeout=120) as resp:
+            check_response(resp)
+            written = 0
+            with open(part_path, 'wb') as f:
+                for block in resp.iter_content(chunk_size=1024 * 1024):
+                    if limiter is not None:
+                        limiter.consume(len(block))
+                    f.write(block)
+                    written += len(block)
+            if size is not None and written != size:
+                raise RetryableError(f"文件长度不符: {written}/{size}")
+    with_retries(_fetch, desc)
+
+def download_file(session, url, dest, expected_size=None,
+                  chunk_size=CHUNK_SIZE, chunk_workers=CHUNK_WORKERS, limiter=None):
+    """下载单个文件到 dest
+
+    数据先写入 dest + ".part"，已完成的分块记录在 dest + ".part.json"；
+    中断后再次调用会跳过已完成的分块，全部完成后原子重命名为 dest。
+    """
+    name = os.path.basename(dest)
+    part_path = dest + ".part"
+    state_path = part_path + ".json"
+
+    final_url, size, ranged = probe_remote(session, url)
+    if size is None:
+        size = expected_size
+    elif expected_size and size != expected_size:
+        log_line(f"       ⚠️  {name}: 服务器大小 {size} 与元数据 {expected_size} 不一致，以服务器为准")
+
+    if not ranged or not size:
+        _download_stream(session, final_url, part_path, size, name, limiter)
+    else:
+        done = _load_part_state(state_path, size, chunk_size)
+        if not done or not os.path.exists(part_path) or os.path.getsize(part_path) != size:
+            done = set()
+            # 预分配（稀疏）文件，各分块按偏移写入
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+        elif done:
+            log_line(f"       ↩️  {name}: 续传，已完成 {len(done)} 个分块")
+
+        chunks = [(i, start, min(start + chunk_size, size) - 1)
+                  for i, start in enumerate(range(0, size, chunk_size)) if i not in done]
+        url_ref = {"origin": url, "url": final_url}
+        state_lock = threading.Lock()
+
+        def _run(chunk):
+            i, start, end = chunk
+            _fetch_range(session, url_ref, part_path, start, end, f"{name} 分块{i}", limiter)
+            with state_lock:
+                done.add(i)
+                _save_part_state(state_path, size, chunk_size, done)
+
+        with ThreadPoolExecutor(max_workers=max(1, chunk_workers)) as pool:
+            for fut in as_completed([pool.submit(_run, c) for c in chunks]):
+                fut.result()
+
+    os.replace(part_path, dest)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return dest
+
+def download_scenes(session, jobs, workers=DOWNLOAD_WORKERS,
+                    chunk_size=CHUNK_SIZE, chunk_workers=CHUNK_WORKERS, limiter=None):
+    """用有界线程池并行下载多景
+
+    jobs: [(url, dest, expected_size), ...]
+    limiter: 可选的 RateLimiter，多个调用方共享即可限制合计带宽
+    返回 {dest: None 表示成功，否则为异常对象}
+    """
+    tune_session_pool(session, max(10, workers * chunk_workers))
+    results = {}
+
+    def _job(url, dest, expected_size):
+        t0 = time.time()
+        download_file(session, url, dest, expected_size,
+                      chunk_size=chunk_size, chunk_workers=chunk_workers, limiter=limiter)
+        mb = os.path.getsize(dest) / 1024 / 1024
+        dt = max(time.time() - t0, 1e-6)
+        log_line(f"       ✅ 下载完成: {os.path.basename(dest)} ({mb:.0f} MB, {mb / dt:.1f} MB/s)")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(_job, url, dest, size): dest for url, dest, size in jobs}
+        for fut in as_completed(futures):
+            dest = futures[fut]
+            try:
+                fut.result()
+                results[dest] = None
+            except Exception as e:
+                log_line(f"       ❌ 下载失败: {os.path.basename(dest)}: {e}")
+                results[dest] = e
+    return results
+
+# -----------------------------
+# 按 burst 下载：Range 读取远程 zip，只取覆盖 AOI 的 burst 与对应 annotation
+# -----------------------------
+class HttpRangeFile:
+    """只读的远程文件对象（seek/read/tell），read 转为 Range 请求
+
+    可直接交给 zipfile.ZipFile，从而只读取远程 zip 的中央目录和需要的条目，
+    不必下载整个 SLC zip。
+    """
+    READAHEAD = 256 * 1024  # 小读取（zip 头、中央目录）合并为一次请求
+
+    def __init__(self, session, url, limiter=None):
+        self.session = session
+        self.limiter = limiter
+        final_url, self.size, ranged = probe_remote(session, url)
+        if not ranged or not self.size:
+            raise RuntimeError("服务器不支持 Range，无法按 burst 下载")
+        self.url_ref = {"origin": url, "url": final_url}
+        self.pos = 0
+        self._buf_start = 0
+        self._buf = b""
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self.pos = offset
+        elif whence == 1:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = min(n, self.size - self.pos)
+        if n <= 0:
+            return b""
+        buf_end = self._buf_start + len(self._buf)
+        if not (self._buf_start <= self.pos and self.pos + n <= buf_end):
+            if n >= self.READAHEAD:
+                data = self._get(self.pos, self.pos + n - 1)
+                self.pos += len(data)
+                return data
+            self._buf_start = self.pos
+            self._buf = self._get(self.pos, min(self.pos + self.READAHEAD, self.size) - 1)
+        off = self.pos - self._buf_start
+        data = self._buf[off:off + n]
+        self.pos += len(data)
+        return data
+
+    def _get(self, start, end):
+        def _fetch():
+            headers = {"Range": f"bytes={start}-{end}"}
+            with self.session.get(self.url_ref["url"], headers=headers, timeout=120) as resp:
+                _refresh_expired_url(self.session, self.url_ref, resp)
+                check_response(resp)
+                if resp.status_code != 206:
+                    raise RetryableError("服务器未按 Range 返回数据")
+                data = resp.content
+            if len(data) != end - start + 1:
+                raise RetryableError(f"长度不符: {len(data)}/{end - start + 1}")
+            if self.limiter is not None:
+                self.limiter.consume(len(data))
+            return data
+        return with_retries(_fetch, f"Range {start}-{end}")
+
+    def read_at(self, offset, n):
+        """[offset, offset + n) 的一次 Range 请求（不经过预读缓冲，也不改变 pos）"""
+        n = min(n, self.size - offset)
+        return self._get(offset, offset + n - 1) if n > 0 else b""
+
+    def close(self):
+        pass
+
+def _stored_data_offset(remote, info):
+    """未压缩（ZIP_STORED）条目的数据在 zip 中的起始偏移：本地文件头 30 字节 + 文件名 + extra 字段"""
+    header = remote.read_at(info.header_offset, 30)
+    if len(header) != 30 or header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"本地文件头损坏: {info.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_len + extra_len
+
+def _merge_regions(regions):
+    merged = []
+    for start, end in sorted(r for r in regions if r[1] > r[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4,
+                   16: 8, 17: 8, 18: 8}
+
+def tiff_metadata_regions(read_at, file_size):
+    """TIFF/BigTIFF 头、各 IFD 以及 IFD 外置的标签值（StripOffsets、GeoTIFF 标签等）所在的 [start, end) 区域
+
+    read_at(offset, n) -> bytes；不包含影像数据本身
+    """
+    head = read_at(0, 16)
+    order = {b"II": "<", b"MM": ">"}.get(head[:2])
+    if order is None:
+        raise ValueError("不是 TIFF 文件")
+    version = struct.unpack(order + "H", head[2:4])[0]
+    if version == 42:
+        big, regions, ifd = False, [(0, 8)], struct.unpack(order + "I", head[4:8])[0]
+    elif version == 43:
+        big, regions, ifd = True, [(0, 16)], struct.unpack(order + "Q", head[8:16])[0]
+    else:
+        raise ValueError(f"未知的 TIFF 版本: {version}")
+    count_fmt, count_size, entry_size, off_fmt, inline = ("Q", 8, 20, "Q", 8) if big else ("H", 2, 12, "I", 4)
+    seen = set()
+    while ifd and ifd not in seen and ifd < file_size:
+        seen.add(ifd)
+        n = struct.unpack(order + count_fmt, read_at(ifd, count_size))[0]
+        body = read_at(ifd + count_size, n * entry_size + inline)
+        regions.append((ifd, ifd + count_size + len(body)))
+        for k in range(n):
+            entry = body[k * entry_size:(k + 1) * entry_size]
+            typ = struct.unpack(order + "H", entry[2:4])[0]
+            count = struct.unpack(order + off_fmt, entry[4:4 + inline])[0]
+            nbytes = TIFF_TYPE_SIZES.get(typ, 1) * count
+            if nbytes > inline:
+                value_off = struct.unpack(order + off_fmt, entry[4 + inline:4 + 2 * inline])[0]
+                regions.append((value_off, min(value_off + nbytes, file_size)))
+        ifd = struct.unpack(order + off_fmt, body[n * entry_size:n * entry_size + inline])[0]
+    return _merge_regions(regions)
+
+def _copy_regions(read_at, dest, regions, file_size, block_size=16 * 1024 * 1024):
+    """把条目中的若干 [start, end) 区域（read_at(offset, n) 读取）写到 dest 的相同偏移，其余保持为空洞"""
+    tmp = dest + ".part"
+    with open(tmp, 'wb') as out:
+        out.truncate(file_size)  # 稀疏文件：未下载的 burst 不占用磁盘
+        for start, end in _merge_regions(regions):
+            out.seek(start)
+            pos = start
+            while pos < end:
+                block = read_at(pos, min(end - pos, block_size))
+                if not block:
+                    raise RetryableError(f"条目提前结束: {os.path.basename(dest)}")
+                out.write(block)
+                pos += len(block)
+    os.replace(tmp, dest)
+
+def _entry_reader(remote, zf, info):
+    """条目内偏移的读取函数 read_at(offset, n)
+
+    未压缩条目：直接对远程 zip 发 Range 请求（数据区起点由本地文件头算出）；
+    压缩条目只能顺序解压（调用方需按偏移升序读取）
+    """
+    if info.compress_type == zipfile.ZIP_STORED:
+        base = _stored_data_offset(remote, info)
+
+        def read_stored(offset, n):
+            return remote.read_at(base + offset, min(n, info.file_size - offset))
+        return read_stored, None
+    src = zf.open(info)
+
+    def read_at(offset, n):
+        src.seek(offset)
+        return src.read(n)
+    return read_at, src
+
+def download_burst_subset(session, url, target_dir, scene_name, aoi_bbox,
+                          polarization=BURST_POLARIZATION, limiter=None):
+    """只下载覆盖 AOI 的 burst，生成 SNAP 可读的精简 SAFE 目录 <target_dir>/<scene>.SAFE
+
+    - manifest.safe、support/、preview/ 原样保留
+    - 只保留所选 swath/极化的 annotation、calibration、noise
+    - measurement TIFF 保持原始大小与字节布局（TIFF 头/IFD 完整），只写入所选 burst
+      （偏移取自 annotation 的 byteOffset），其余 burst 为稀疏空洞，annotation 无需改写
+    返回 {swath: (first_burst, last_burst)}
+    """
+    safe_dir = os.path.join(target_dir, scene_name + ".SAFE")
+    flag_path = os.path.join(safe_dir, BURST_SUBSET_FLAG)
+    if os.path.exists(flag_path):
+        with open(flag_path, 'r', encoding='utf-8') as f:
+            return {k: tuple(v) for k, v in json.load(f)["bursts"].items()}
+
+    remote = HttpRangeFile(session, url, limiter)
+    with zipfile.ZipFile(remote) as zf:
+        anns = s1_meta.read_annotations(zf, polarization)
+        selected = s1_meta.select_bursts(anns, aoi_bbox)
+        if not selected:
+            raise ValueError("AOI 与该景的任何 burst 都不相交")
+        keep = {(swath, polarization.upper()) for swath in selected}
+        by_key = {(a["swath"], a["polarisation"]): a for a in anns}
+
+        for info in zf.infolist():
+            parts = info.filename.split("/")
+            rel = parts[1:] if parts[0].endswith(".SAFE") else parts
+            if info.is_dir() or not rel or not rel[-1]:
+                continue
+            dest = os.path.join(safe_dir, *rel)
+            key = s1_meta.annotation_key(rel[-1])
+            if rel[0] in ("annotation", "measurement") and key[0] and key not in keep:
+                continue  # 其他 swath / 极化
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if rel[0] == "measurement":
+                ann = by_key[key]
+                nbytes = s1_meta.burst_nbytes(ann)
+                offsets = [b["byte_offset"] for b in ann["bursts"]]
+                first, last = selected[key[0]]
+                read_at, src = _entry_reader(remote, zf, info)
+                try:
+                    # TIFF 头、IFD 及外置标签值 + 所选 burst（未压缩条目只按 Range 取这些字节）
+                    regions = tiff_metadata_regions(read_at, info.file_size)
+                    regions += [(offsets[i - 1], offsets[i - 1] + nbytes) for i in range(first, last + 1)]
+                    _copy_regions(read_at, dest, regions, info.file_size)
+                finally:
+                    if src is not None:
+                        src.close()
+            else:
+                with open(dest, 'wb') as out:
+                    out.write(zf.read(info))
+
+    with open(flag_path, 'w', encoding='utf-8') as f:
+        json.dump({"source": url, "polarization": polarization.upper(), "aoi_bbox": aoi_bbox,
+                   "bursts": selected}, f, indent=2)
+    return selected
+
+def download_burst_scenes(session, jobs, aoi_bbox, polarization=BURST_POLARIZATION,
+                          workers=DOWNLOAD_WORKERS, limiter=None):
+    """并行执行 download_burst_subset
+
+    jobs: [(url, target_dir, scene_name), ...]
+    返回 {scene_name: None 表示成功，否则为异常对象}
+    """
+    tune_session_pool(session, max(10, workers))
+    results = {}
+
+    def _job(url, target_dir, scene_name):
+        selected = download_burst_subset(session, url, target_dir, scene_name, aoi_bbox,
+                                         polarization, limiter)
+        desc = ", ".join(f"{sw} burst {a}-{b}" for sw, (a, b) in selected.items())
+        log_line(f"       ✅ burst 子集完成: {scene_name} ({desc})")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(_job, *job): job[2] for job in jobs}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                fut.result()
+                results[name] = None
+            except Exception as e:
+                log_line(f"       ❌ burst 子集失败: {name}: {e}")
+                results[name] = e
+    return results
+
+# -----------------------------
+# 完整性校验：大小 / MD5 / zip 中央目录 + 校验清单（manifest）
+# -----------------------------
+def file_md5(path, block_size=8 * 1024 * 1024):
+    """分块计算文件 MD5"""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def verify_scene_file(path, expected_size=None, md5=None, check_md5=False):
+    """校验单个 SLC zip，返回 (是否通过, 原因, 计算出的md5或None)
+
+    1. 大小与 ASF 元数据的 bytes 一致
+    2. （可选）MD5 与 ASF 元数据的 md5sum 一致
+    3. 能解析 zip 中央目录，且各条目的数据区不超出文件末尾
+       （被中断的下载缺少文件尾的中央目录，这一步即可发现）
+    """
+    if not os.path.exists(path):
+        return False, "文件不存在", None
+    size = os.path.getsize(path)
+    if expected_size and size != int(expected_size):
+        return False, f"大小不符: {size}/{expected_size}", None
+    try:
+        with zipfile.ZipFile(path) as zf:
+            infos = zf.infolist()
+            if not infos:
+                return False, "zip 为空", None
+            for info in infos:
+                if info.header_offset + info.compress_size > size:
+                    return False, f"zip 条目越界: {info.filename}", None
+    except (zipfile.BadZipFile, OSError) as e:
+        return False, f"zip 损坏: {e}", None
+    digest = None
+    if check_md5 and md5:
+        digest = file_md5(path)
+        if digest.lower() != str(md5).lower():
+            return False, f"MD5 不符: {digest}/{md5}", digest
+    return True, "ok", digest
+
+def load_manifest(session_dir):
+    """读取会话目录下的校验清单"""
+    path = os.path.join(session_dir, VERIFY_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(session_dir, manifest):
+    path = os.path.join(session_dir, VERIFY_MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _manifest_hit(entry, stat, expected_size, md5, check_md5):
+    """清单记录仍有效：文件未变化（大小+mtime），且当时的校验条件不弱于本次"""
+    if not entry or not entry.get("ok"):
+        return False
+    if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+        return False
+    if expected_size and entry.get("expected_size") != int(expected_size):
+        return False
+    if check_md5 and md5 and (entry.get("md5") or "").lower() != str(md5).lower():
+        return False
+    return True
+
+def verify_files(session_dir, items, manifest, workers=VERIFY_WORKERS, check_md5=VERIFY_MD5):
+    """并行校验一组文件并更新 manifest（调用方负责保存）
+
+    items: [(path, expected_size, md5), ...]
+    返回 {path: (是否通过, 原因)}；文件未变化且已通过校验的直接复用清单结果
+    """
+    results = {}
+    todo = []
+    for path, expected_size, md5 in items:
+        key = os.path.relpath(path, session_dir)
+        if not os.path.exists(path):
+            manifest.pop(key, None)
+            results[path] = (False, "文件不存在")
+            continue
+        if _manifest_hit(manifest.get(key), os.stat(path), expected_size, md5, check_md5):
+            results[path] = (True, "ok (manifest)")
+            continue
+        todo.append((path, expected_size, md5))
+
+    def _check(item):
+        path, expected_size, md5 = item
+        stat = os.stat(path)
+        ok, reason, digest = verify_scene_file(path, expected_size, md5, check_md5)
+        return path, stat, expected_size, ok, reason, digest
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for path, stat, expected_size, ok, reason, digest in pool.map(_check, todo):
+            key = os.path.relpath(path, session_dir)
+            manifest[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "expected_size": int(expected_size) if expected_size else None,
+                "md5": digest or (manifest.get(key) or {}).get("md5"),
+                "ok": ok,
+                "reason": reason,
+                "checked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            results[path] = (ok, reason)
+    return results
+
+def verify_session(session_dir=None, workers=VERIFY_WORKERS, check_md5=VERIFY_MD5, base_dir=None):
+    """校验会话目录下所有已下载的 zip，并写入 verify_manifest.json"""
+    if session_dir is None:
+        session_dir = find_latest_session_directory(base_dir)
+        if session_dir is None:
+            print("❌ 未找到任何搜索会话文件夹")
+            return {}
+
+    # 期望值来自搜索结果中的 ASF 元数据（旧会话可能没有 bytes/md5sum，只做 zip 检查）
+    expected = {}
+    saved = load_search_results(os.path.join(session_dir, "search_results.json")) or {}
+    for s in saved.get("ascending_scenes", []) + saved.get("descending_scenes", []):
+        expected[s["sceneName"]] = (s.get("bytes"), s.get("md5sum"))
+
+    items = []
+    for sub in ("Ascending", "Descending"):
+        d = os.path.join(session_dir, sub)
+        if not os.path.isdir(d):
+            continue
+        for fn in sorted(os.listdir(d)):
+            if fn.endswith(".zip"):
+                size, md5 = expected.get(fn[:-4], (None, None))
+                items.append((os.path.join(d, fn), size, md5))
+
+    print(f"\n🔎 校验 {len(items)} 个文件 (workers={workers}, md5={'开' if check_md5 else '关'})...")
+    manifest = load_manifest(session_dir)
+    results = verify_files(session_dir, items, manifest, workers=workers, check_md5=check_md5)
+    save_manifest(session_dir, manifest)
+
+    bad = {p: r for p, (ok, r) in results.items() if not ok}
+    for p, reason in sorted(bad.items()):
+        print(f"   ❌ {os.path.relpath(p, session_dir)}: {reason}")
+    print(f"✅ 通过 {len(results) - len(bad)} 个，失败 {len(bad)} 个；清单: {VERIFY_MANIFEST}")
+    return results
+
+# -----------------------------
+# 本地景目录库（SQLite）：以 sceneName 为键缓存 ASF 元数据
+# -----------------------------
+class CatalogScene:
+    """目录库中的一景，提供与 ASFProduct 相同的 properties / geometry 访问方式"""
+    def __init__(self, properties, geometry=None):
+        self.properties = properties
+        self.geometry = geometry
+
+def catalog_path(base_dir=None):
+    """目录库文件位于 BASE_DIR 下，跨会话共享"""
+    return os.path.join(base_dir or BASE_DIR, CATALOG_NAME)
+
+def open_catalog(path=None):
+    """打开（必要时创建）目录库"""
+    path = path or catalog_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=60)  # 多个 AOI 线程可能同时写入
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS scenes (
+            sceneName       TEXT PRIMARY KEY,
+            fileID          TEXT,
+            startTime       TEXT,
+            stopTime        TEXT,
+            orbitDirection  TEXT,
+            pathNumber      INTEGER,
+            frameNumber     INTEGER,
+            processingLevel TEXT,
+            polarization    TEXT,
+            url             TEXT,
+            bytes           INTEGER,
+            md5sum          TEXT,
+            min_lon REAL, min_lat REAL, max_lon REAL, max_lat REAL,
+            properties      TEXT,
+            geometry        TEXT,
+            updated_at      TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_scenes_start ON scenes(startTime);
+        CREATE INDEX IF NOT EXISTS idx_scenes_direction ON scenes(orbitDirection, startTime);
+        CREATE INDEX IF NOT EXISTS idx_scenes_path_frame ON scenes(pathNumber, frameNumber);
+        CREATE INDEX IF NOT EXISTS idx_scenes_bbox ON scenes(min_lon, max_lon, min_lat, max_lat);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            query_key       TEXT PRIMARY KEY,
+            synced_start    TEXT,
+            last_start_time TEXT,
+            synced_at       TEXT
+        );
+    """)
+    return conn
+
+def parse_roi(roi=None):
+    """'minLon,minLat,maxLon,maxLat' -> (min_lon, min_lat, max_lon, max_lat)；空则返回 None"""
+    roi = ROI if roi is None else roi
+    if not roi or not roi.strip():
+        return None
+    return tuple(float(x) for x in roi.split(","))
+
+def catalog_upsert(conn, products):
+    """写入/更新一批 ASFProduct（或 CatalogScene），返回写入条数"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for r in products:
+        p = dict(r.properties)
+        geometry = getattr(r, "geometry", None)
+        # ASF 字段为 flightDirection，本工具历来使用 orbitDirection，两者都保留
+        direction = p.get("orbitDirection") or p.get("flightDirection")
+        p["orbitDirection"] = direction
+        bbox = s1_meta.geometry_bbox(geometry) or (None, None, None, None)
+        rows.append((
+            p.get("sceneName"), p.get("fileID"), p.get("startTime"), p.get("stopTime"),
+            direction, p.get("pathNumber"), p.get("frameNumber"),
+            p.get("processingLevel"), p.get("polarization"),
+            p.get("url"), p.get("bytes"), p.get("md5sum"),
+            *bbox,
+            json.dumps(p, ensure_ascii=False, default=str),
+            json.dumps(geometry, default=str) if geometry else None,
+            now,
+        ))
+    with conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO scenes VALUES
+            (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    return len(rows)
+
+def _row_to_scene(row):
+    geometry = json.loads(row["geometry"]) if row["geometry"] else None
+    return CatalogScene(json.loads(row["properties"]), geometry)
+
+def _values(v):
+    # asf_search 的过滤条件可以是单个值、逗号分隔的字符串或列表
+    if isinstance(v, str):
+        v = v.split(",")
+    return [str(x).strip().upper() for x in v if str(x).strip()]
+
+def catalog_query(conn, direction=None, processing_level=None, start=None, end=None,
+                  bbox=None, path=None, frame=None, platform=None, beam_mode=None, polarization=None):
+    """按条件查询目录库，按 startTime 排序返回 CatalogScene 列表
+
+    end 只有日期（YYYY-MM-DD）时包含当天的全部景；platform 按前缀匹配（Sentinel-1 -> Sentinel-1A/B/C），
+    beam_mode、polarization 与 ASF 的 beamModeType / polarization 字段精确匹配（不区分大小写）
+    """
+    where, args = [], []
+    if direction:
+        where.append("orbitDirection = ?")
+        args.append(direction)
+    if processing_level:
+        where.append("processingLevel = ?")
+        args.append(processing_level)
+    if start:
+        where.append("startTime >= ?")
+        args.append(start)
+    if end:
+        if len(end) == 10:
+            where.append("startTime < ?")
+            args.append((datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        else:
+            where.append("startTime <= ?")
+            args.append(end)
+    if platform:
+        names = _values(platform)
+        where.append("(" + " OR ".join(["upper(json_extract(properties, '$.platform')) LIKE ?"] * len(names)) + ")")
+        args += [n + "%" for n in names]
+    if beam_mode:
+        names = _values(beam_mode)
+        where.append(f"upper(json_extract(properties, '$.beamModeType')) IN ({','.join('?' * len(names))})")
+        args += names
+    if polarization:
+        names = _values(polarization)
+        where.append(f"upper(polarization) IN ({','.join('?' * len(names))})")
+        args += names
+    if path is not None:
+        where.append("pathNumber = ?")
+        args.append(path)
+    if frame is not None:
+        where.append("frameNumber = ?")
+        args.append(frame)
+    if bbox:
+        # 外包框相交
+        min_lon, min_lat, max_lon, max_lat = bbox
+        where.append("min_lon <= ? AND max_lon >= ? AND min_lat <= ? AND max_lat >= ?")
+        args += [max_lon, min_lon, max_lat, min_lat]
+    sql = "SELECT * FROM scenes"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY startTime"
+    return [_row_to_scene(row) for row in conn.execute(sql, args)]
+
+def catalog_get(conn, scene_names):
+    """按 sceneName 批量取出，返回 CatalogScene 列表（缺失的不返回）"""
+    scenes = []
+    names = list(scene_names)
+    for i in range(0, len(names), 500):
+        batch = names[i:i + 500]
+        marks = ",".join("?" * len(batch))
+        rows = conn.execute(f"SELECT * FROM scenes WHERE sceneName IN ({marks})", batch)
+        scenes += [_row_to_scene(row) for row in rows]
+    return scenes
+
+def sync_key(cfg, direction, processing_level):
+    """增量同步状态的键：ROI + 方向 + 产品类型（以及会影响结果的其他过滤条件）"""
+    return "|".join(str(x or "") for x in
+                    ((cfg["roi"] or "").strip(), direction, processing_level,
+                     cfg["platform"], cfg["beam_mode"], cfg["polarization"]))
+
+def sync_state_get(conn, key):
+    """返回 (已同步窗口起点, 已入库的最新 startTime)；从未同步过返回 (None, None)"""
+    row = conn.execute("SELECT synced_start, last_start_time FROM sync_state WHERE query_key = ?",
+                       (key,)).fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+def sync_state_set(conn, key, synced_start, last_start_time):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                     (key, synced_start, last_start_time,
+                      datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
 # -----------------------------
 # 步骤1：搜索数据函数（包含附加 filters）
 # -----------------------------
-def search_with_direction(direction_value):
-    """根据指定的轨道方向搜索数据"""
+def _parse_time(value):
+    """'2017-04-01' / '2020-12-17T08:41:40.000Z' -> datetime（忽略时区，均按 UTC）"""
+    return datetime.fromisoformat(value.replace("Z", "")[:19])
+
+def split_time_windows(start, end):
+    """把 [start, end] 按自然年切成多个子窗口，返回 [(start, end), ...] 字符串对
+
+    end 只有日期（YYYY-MM-DD）时包含当天，即截止到次日 0 点（与 catalog_query 一致）
+    """
+    t0 = _parse_time(start) if start else datetime(2014, 4, 3)  # Sentinel-1A 发射
+    t1 = _parse_time(end) if end else datetime.utcnow()
+    if end and len(end) == 10:
+        t1 += timedelta(days=1)
+    windows = []
+    while t0 < t1:
+        t_next = min(datetime(t0.year + 1, 1, 1), t1)
+        windows.append((t0.strftime("%Y-%m-%dT%H:%M:%SZ"), t_next.strftime("%Y-%m-%dT%H:%M:%SZ")))
+        t0 = t_next
+    return windows
+
+def search_windows(opts, windows, workers=SEARCH_WORKERS):
+    """并发执行按时间窗口切分的子查询，按 sceneName 去重合并"""
+    def _search(window):
+        sub = dict(opts, start=window[0], end=window[1])
+        return with_retries(lambda: list(asf.geo_search(**sub)), f"搜索 {window[0][:10]}~{window[1][:10]}")
+
+    merged = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for results in pool.map(_search, windows):
+            for r in results:
+                merged.setdefault(r.properties.get("sceneName"), r)
+    return list(merged.values())
+
+def search_with_direction(direction_value, catalog=None, cfg=None):
+    """根据指定的轨道方向搜索数据
+
+    传入 catalog（本地目录库）时结果先入库，再从目录库返回完整的 START_DATE..END_DATE 结果；
+    cfg["incremental"] 为真时只向 ASF 请求该 (ROI, 方向, 产品类型) 上次同步水位线之后的新数据。
+    时间范围按年切分为并发子查询，合并时按 sceneName 去重。
+    """
+    cfg = cfg or default_config()
+    start_date, end_date = cfg["start"], cfg["end"]
     opts = {}
+    processing_level = normalize_processing_level(cfg["product_type"]) if cfg["product_type"] else None
+    roi_bbox = parse_roi(cfg["roi"])
 
     # 基础字段：仅在非空时加入
-    if PLATFORM:
-        opts["platform"] = PLATFORM
-    if BEAMMODE:
-        opts["beamMode"] = BEAMMODE
-    if PRODUCT_TYPE:
-        opts["processingLevel"] = normalize_processing_level(PRODUCT_TYPE)
-    if START_DATE:
-        opts["start"] = START_DATE
-    if END_DATE:
-        opts["end"] = END_DATE
+    if cfg["platform"]:
+        opts["platform"] = cfg["platform"]
+    if cfg["beam_mode"]:
+        opts["beamMode"] = cfg["beam_mode"]
+    if cfg["product_type"]:
+        opts["processingLevel"] = processing_level
+    if start_date:
+        opts["start"] = start_date
+    if end_date:
+        opts["end"] = end_date
+
+    # 增量：同一查询条件下已同步过且窗口起点不晚于 START_DATE 时，从水位线（回退几天）开始
+    state_key = sync_key(cfg, direction_value, processing_level)
+    synced_start, last_start = sync_state_get(catalog, state_key) if catalog is not None else (None, None)
+    query_start = start_date or None
+    if cfg["incremental"] and last_start and (not start_date or (synced_start and synced_start <= start_date)):
+        since = _parse_time(last_start) - timedelta(days=SYNC_OVERLAP_DAYS)
+        query_start = max(since.strftime("%Y-%m-%dT%H:%M:%SZ"), start_date or "")
+        print(f"🗂️  已同步至 {last_start}，仅请求 {query_start[:10]} 之后的增量")
+        opts["start"] = query_start
 
     # ROI：仅在非空时解析并加入 WKT
-    if ROI and ROI.strip():
+    if roi_bbox:
         # 将逗号分隔的 bbox 转换为合法的 WKT POLYGON，满足 asf_search 对 intersectsWith 的要求
-        min_lon, min_lat, max_lon, max_lat = [float(x) for x in ROI.split(",")]
+        min_lon, min_lat, max_lon, max_lat = roi_bbox
         wkt_polygon = (
             f"POLYGON(("
             f"{min_lon} {min_lat},"
@@ -173,8 +1104,8 @@ def search_with_direction(direction_value):
         opts["intersectsWith"] = wkt_polygon
 
     # Polarization 作为附加 filter：仅在非空时加入
-    if POLARIZATION:
-        opts["polarization"] = POLARIZATION
+    if cfg["polarization"]:
+        opts["polarization"] = cfg["polarization"]
 
     # 设置轨道方向
     opts["flightDirection"] = direction_value
@@ -184,54 +1115,84 @@ def search_with_direction(direction_value):
     for key, value in opts.items():
         print(f"   - {key}: {value}")
     
-    print(f"🔍 正在搜索...")
-    results = asf.geo_search(**opts)
+    windows = split_time_windows(query_start, end_date or None)
+    print(f"🔍 正在搜索（{len(windows)} 个时间窗口并发）...")
+    results = search_windows(opts, windows) if windows else []
+    
+    if catalog is not None:
+        n = catalog_upsert(catalog, results)
+        print(f"🗂️  新增/更新 {n} 条目录记录")
+        # 所有子查询成功后才推进水位线
+        newest = max([r.properties.get("startTime") or "" for r in results] + [last_start or ""])
+        if synced_start and start_date and synced_start < start_date:
+            new_start = synced_start
+        else:
+            new_start = start_date or synced_start
+        sync_state_set(catalog, state_key, new_start, newest or None)
+        results = catalog_query(catalog, direction=direction_value,
+                                processing_level=processing_level,
+                                start=start_date or None, end=end_date or None,
+                                bbox=roi_bbox, platform=cfg["platform"],
+                                beam_mode=cfg["beam_mode"], polarization=cfg["polarization"])
     
     filtered = []
     for r in results:
         props = r.properties
         # 进一步过滤 burst id
-        if BURST_IDS is not None:
+        if cfg["burst_ids"] is not None:
             # 检查 props 中是否有 burst id 信息
             burst = props.get("burst", None)
-            if burst is None or burst not in BURST_IDS:
+            if burst is None or burst not in cfg["burst_ids"]:
                 continue
         filtered.append(r)
     
     print(f"✅ 找到 {len(filtered)} 景数据")
     return filtered
 
-def step1_search_scenes():
-    """步骤1：搜索符合条件的Sentinel-1数据"""
+def step1_search_scenes(cfg=None):
+    """步骤1：搜索符合条件的Sentinel-1数据
+
+    cfg 为 default_config() 形式的运行配置，省略时使用配置区常量。
+    返回 (全部结果, 升轨, 降轨)；会话文件夹路径写入 cfg["session_dir"]。
+    """
+    cfg = cfg or default_config()
     print("\n" + "="*60)
-    print("步骤 1: 搜索 Sentinel-1 数据")
+    print("步骤 1: 搜索 Sentinel-1 数据" + (f" [{cfg['name']}]" if cfg["name"] else ""))
     print("="*60)
     
     # 创建时间戳文件夹
-    create_session_directory()
+    session_dir = create_session_directory(cfg["base_dir"])
+    cfg["session_dir"] = session_dir
+    _, _, search_result_file = session_paths(session_dir)
+    
+    # 打开本地目录库（搜索结果先入库，再从库中读取）
+    db_path = cfg["catalog"] or catalog_path(cfg["base_dir"])
+    catalog = open_catalog(db_path)
+    print(f"🗂️  目录库: {db_path}")
     
     # 如果 DIRECTION = None，分别搜索升轨和降轨
-    if DIRECTION is None:
+    direction = cfg["direction"]
+    if direction is None:
         print("\n📡 DIRECTION=None，将分别搜索升轨和降轨数据")
         
         # 搜索升轨数据
         print("\n" + "-"*60)
         print("🔼 搜索升轨数据 (ASCENDING)")
         print("-"*60)
-        ascending = search_with_direction("ASCENDING")
+        ascending = search_with_direction("ASCENDING", catalog, cfg)
         
         # 搜索降轨数据
         print("\n" + "-"*60)
         print("🔽 搜索降轨数据 (DESCENDING)")
         print("-"*60)
-        descending = search_with_direction("DESCENDING")
+        descending = search_with_direction("DESCENDING", catalog, cfg)
         
         # 合并结果
         filtered = ascending + descending
     else:
         # 如果指定了方向，只搜索一次
-        print(f"\n📡 搜索指定方向: {DIRECTION}")
-        filtered = search_with_direction(DIRECTION)
+        print(f"\n📡 搜索指定方向: {direction}")
+        filtered = search_with_direction(direction, catalog, cfg)
         
         # 分割 ascending / descending（与 ASF 字段保持一致）
         ascending = [r for r in filtered if r.properties.get("orbitDirection") == "ASCENDING"]
@@ -262,14 +1223,14 @@ def step1_search_scenes():
     results_data = {
         "search_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "search_parameters": {
-            "START_DATE": START_DATE,
-            "END_DATE": END_DATE,
-            "PLATFORM": PLATFORM,
-            "BEAMMODE": BEAMMODE,
-            "PRODUCT_TYPE": PRODUCT_TYPE,
-            "POLARIZATION": POLARIZATION,
-            "DIRECTION": DIRECTION,
-            "ROI": ROI
+            "START_DATE": cfg["start"],
+            "END_DATE": cfg["end"],
+            "PLATFORM": cfg["platform"],
+            "BEAMMODE": cfg["beam_mode"],
+            "PRODUCT_TYPE": cfg["product_type"],
+            "POLARIZATION": cfg["polarization"],
+            "DIRECTION": direction,
+            "ROI": cfg["roi"]
         },
         "total_count": len(filtered),
         "ascending_count": len(ascending),
@@ -280,63 +1241,33 @@ def step1_search_scenes():
                              "polarization": r.properties.get("polarization"),
                              "startTime": r.properties.get("startTime"),
                              "fileID": r.properties.get("fileID"),
-                             "url": r.properties.get("url")} for r in ascending],
+                             "url": r.properties.get("url"),
+                             "bytes": r.properties.get("bytes"),
+                             "md5sum": r.properties.get("md5sum")} for r in ascending],
         "descending_scenes": [{"sceneName": r.properties.get("sceneName"),
                               "orbitDirection": r.properties.get("orbitDirection"),
                               "burst": r.properties.get("burst", "N/A"),
                               "polarization": r.properties.get("polarization"),
                               "startTime": r.properties.get("startTime"),
                               "fileID": r.properties.get("fileID"),
-                              "url": r.properties.get("url")} for r in descending]
+                              "url": r.properties.get("url"),
+                              "bytes": r.properties.get("bytes"),
+                              "md5sum": r.properties.get("md5sum")} for r in descending]
     }
     
-    with open(SEARCH_RESULT_FILE, 'w', encoding='utf-8') as f:
+    with open(search_result_file, 'w', encoding='utf-8') as f:
         json.dump(results_data, f, indent=2, ensure_ascii=False)
+    catalog.close()
     
-    print(f"\n✅ 搜索结果已保存至: {SEARCH_RESULT_FILE}")
+    print(f"\n✅ 搜索结果已保存至: {search_result_file}")
     
     return filtered, ascending, descending
 
 # -----------------------------
 # 步骤2：下载数据函数
 # -----------------------------
-def step2_download_scenes():
-    """步骤2：下载已搜索到的数据"""
-    print("\n" + "="*60)
-    print("步骤 2: 下载 Sentinel-1 数据")
-    print("="*60)
-    
-    # 查找最新的会话文件夹
-    session_dir = find_latest_session_directory()
-    
-    if session_dir is None:
-        print(f"❌ 未找到任何搜索会话文件夹")
-        print(f"   请先运行步骤1进行搜索")
-        return
-    
-    print(f"\n📂 使用会话文件夹: {os.path.basename(session_dir)}")
-    
-    # 检查是否存在搜索结果
-    if not os.path.exists(SEARCH_RESULT_FILE):
-        print(f"❌ 未找到搜索结果文件: {SEARCH_RESULT_FILE}")
-        print(f"   请先运行步骤1进行搜索")
-        return
-    
-    # 加载搜索结果
-    saved_results = load_search_results(SEARCH_RESULT_FILE)
-    print(f"\n📊 加载搜索结果:")
-    print(f"   - 搜索时间: {saved_results.get('search_time', 'N/A')}")
-    print(f"   - 升轨数据: {saved_results.get('ascending_count', 0)} 景")
-    print(f"   - 降轨数据: {saved_results.get('descending_count', 0)} 景")
-    print(f"   - 总计: {saved_results.get('total_count', 0)} 景")
-    
-    # 确认是否下载
-    choice = input("\n❓ 是否开始下载以上数据？(y/n): ")
-    if choice.lower() != "y":
-        print("❌ 取消下载。")
-        return
-    
-    # 建立认证 session（优先使用环境变量，否则回退 ~/.netrc）
+def authenticate_for_download():
+    """建立下载用的认证 session（优先使用环境变量，否则回退 ~/.netrc），失败返回 None"""
     user_hint = ASF_USERNAME if ASF_USERNAME else "~/.netrc"
     print(f"\n🔐 正在使用凭据来源: {user_hint} 进行认证...")
     
@@ -347,11 +1278,11 @@ def step2_download_scenes():
     try:
         if ASF_USERNAME and ASF_PASSWORD:
             print(f"   - 使用环境变量认证，用户名: {ASF_USERNAME}")
-            session = ASFSession().auth_with_creds(ASF_USERNAME, ASF_PASSWORD)
         else:
             print("   - 使用 ~/.netrc 文件认证")
-            session = ASFSession()
+        session = create_asf_session()
         print("✅ 认证成功")
+        return session
     except Exception as e:
         print("❌ 认证失败")
         print("   - 请确认已能登录 https://urs.earthdata.nasa.gov")
@@ -363,11 +1294,13 @@ def step2_download_scenes():
         print("   1. 确保使用 NASA Earthdata 账户凭据（不是 ASF 账户）")
         print("   2. 在 https://urs.earthdata.nasa.gov 确认账户状态")
         print("   3. 检查账户是否有 Sentinel-1 数据访问权限")
-        return
-    
-    # 重新搜索获取完整的ASFProduct对象（用于下载）
-    print("\n🔍 重新获取数据产品信息...")
-    
+        return None
+
+def session_products(cfg, saved_results):
+    """会话搜索结果 -> (升轨产品列表, 降轨产品列表)；失败时返回 None
+
+    下载地址/大小/MD5 直接取自本地目录库，无需再次请求 ASF；目录库缺少的景用 granule_list 补查并入库
+    """
     # 从新的数据结构中提取场景名称
     ascending_names = [s['sceneName'] for s in saved_results.get('ascending_scenes', [])]
     descending_names = [s['sceneName'] for s in saved_results.get('descending_scenes', [])]
@@ -377,45 +1310,216 @@ def step2_download_scenes():
         print("❌ 没有找到任何场景数据")
         return
     
-    # 使用granule_list搜索
-    try:
-        results = asf.search(granule_list=all_scene_names)
-        print(f"✅ 成功获取 {len(results)} 个产品")
-    except Exception as e:
-        print(f"❌ 获取产品失败: {e}")
-        return
+    print("\n🗂️  从目录库读取数据产品信息...")
+    catalog = open_catalog(cfg["catalog"] or catalog_path(cfg["base_dir"]))
+    results = catalog_get(catalog, all_scene_names)
+    found = {r.properties.get("sceneName") for r in results}
+    missing = [n for n in all_scene_names if n not in found]
+    
+    # 旧会话或目录库被清理时，才对缺失部分用 granule_list 补查并入库
+    if missing:
+        print(f"🔍 目录库缺少 {len(missing)} 景，向 ASF 补查...")
+        try:
+            opts = {"granule_list": missing}
+            if cfg["product_type"]:
+                opts["processingLevel"] = normalize_processing_level(cfg["product_type"])
+            catalog_upsert(catalog, asf.search(**opts))
+            results += catalog_get(catalog, missing)
+        except Exception as e:
+            print(f"❌ 获取产品失败: {e}")
+            catalog.close()
+            return
+    catalog.close()
+    print(f"✅ 成功获取 {len(results)} 个产品")
     
     # 分类（按照场景名称列表分类，确保下载到正确的文件夹）
     ascending = [r for r in results if r.properties.get("sceneName") in ascending_names]
     descending = [r for r in results if r.properties.get("sceneName") in descending_names]
+    return ascending, descending
+
+_manifest_lock = threading.Lock()
+
+def scene_path(cfg, product, target_dir):
+    """一景下载完成后的本地路径：整景为 <scene>.zip，burst 模式为 <scene>.SAFE 目录"""
+    name = product.properties["sceneName"]
+    return os.path.join(target_dir, name + (".SAFE" if cfg["burst_mode"] else ".zip"))
+
+def download_scene(session, cfg, session_dir, product, target_dir, limiter=None):
+    """下载并校验单景（已存在且校验通过时跳过），返回本地路径；失败抛出 RuntimeError
+
+    供下载-处理流水线逐景调用；校验清单在多个下载线程之间加锁更新
+    """
+    name = product.properties["sceneName"]
+    dest = scene_path(cfg, product, target_dir)
+    if cfg["burst_mode"]:
+        if not os.path.exists(os.path.join(dest, BURST_SUBSET_FLAG)):
+            aoi_bbox = parse_roi(cfg["roi"])
+            if aoi_bbox is None:
+                raise RuntimeError("burst 模式需要 ROI/AOI")
+            download_burst_subset(session, product.properties["url"], target_dir, name, aoi_bbox,
+                                  cfg["burst_polarization"], limiter)
+        return dest
+
+    size, md5 = product.properties.get("bytes"), product.properties.get("md5sum")
+    for attempt in range(2):
+        if os.path.exists(dest):
+            with _manifest_lock:
+                manifest = load_manifest(session_dir)
+                ok, reason = verify_files(session_dir, [(dest, size, md5)], manifest,
+                                          workers=1, check_md5=cfg["check_md5"])[dest]
+                save_manifest(session_dir, manifest)
+            if ok:
+                return dest
+            if attempt:
+                raise RuntimeError(f"{name}: 校验失败: {reason}")
+            # 截断/损坏的文件删除后重新下载
+            log_line(f"       ♻️  {name}: 校验失败({reason})，重新下载")
+            os.remove(dest)
+        download_file(session, product.properties["url"], dest, size,
+                      chunk_size=cfg["chunk_size"], chunk_workers=cfg["chunk_workers"], limiter=limiter)
+    return dest
+
+def step2_download_scenes(cfg=None, session=None, confirm=True, limiter=None):
+    """步骤2：下载已搜索到的数据
+
+    cfg: 运行配置（省略时使用配置区常量）；cfg["session_dir"] 指定会话，否则取最新会话
+    session: 已认证的 ASFSession，多个 AOI 可共享同一个连接池；省略时在此认证
+    confirm: 是否交互式确认（命令行批处理时为 False）
+    limiter: 共享的 RateLimiter（限制合计带宽）
+    返回 (成功, 跳过, 失败) 景数；未执行下载时返回 None
+    """
+    cfg = cfg or default_config()
+    print("\n" + "="*60)
+    print("步骤 2: 下载 Sentinel-1 数据" + (f" [{cfg['name']}]" if cfg["name"] else ""))
+    print("="*60)
+    
+    # 查找最新的会话文件夹
+    session_dir = cfg.get("session_dir") or find_latest_session_directory(cfg["base_dir"])
+    
+    if session_dir is None:
+        print(f"❌ 未找到任何搜索会话文件夹")
+        print(f"   请先运行步骤1进行搜索")
+        return
+    asc_dir, des_dir, search_result_file = session_paths(session_dir)
+    
+    print(f"\n📂 使用会话文件夹: {os.path.basename(session_dir)}")
+    
+    # 检查是否存在搜索结果
+    if not os.path.exists(search_result_file):
+        print(f"❌ 未找到搜索结果文件: {search_result_file}")
+        print(f"   请先运行步骤1进行搜索")
+        return
+    
+    # 加载搜索结果
+    saved_results = load_search_results(search_result_file)
+    print(f"\n📊 加载搜索结果:")
+    print(f"   - 搜索时间: {saved_results.get('search_time', 'N/A')}")
+    print(f"   - 升轨数据: {saved_results.get('ascending_count', 0)} 景")
+    print(f"   - 降轨数据: {saved_results.get('descending_count', 0)} 景")
+    print(f"   - 总计: {saved_results.get('total_count', 0)} 景")
+    
+    # 确认是否下载
+    if confirm:
+        choice = input("\n❓ 是否开始下载以上数据？(y/n): ")
+        if choice.lower() != "y":
+            print("❌ 取消下载。")
+            return
+    
+    if session is None:
+        session = authenticate_for_download()
+        if session is None:
+            return
+    
+    products = session_products(cfg, saved_results)
+    if products is None:
+        return
+    ascending, descending = products
+    
+    manifest = load_manifest(session_dir)
     
     def download_list(scenes, target_dir, direction_name):
         """下载场景列表"""
         print(f"\n⬇️  开始下载 {direction_name} 数据 ({len(scenes)} 景)...")
         print("-" * 60)
         
-        success_count = 0
+        if cfg["burst_mode"]:
+            return download_burst_list(scenes, target_dir, direction_name)
+        
         skip_count = 0
-        fail_count = 0
+        expected = {}
+        for r in scenes:
+            dest = os.path.join(target_dir, r.properties["sceneName"] + ".zip")
+            expected[dest] = (r.properties.get("bytes"), r.properties.get("md5sum"))
+        
+        # 已存在的文件先做完整性校验（清单中未变化的文件不再重复校验）
+        existing = [(d, size, md5) for d, (size, md5) in expected.items() if os.path.exists(d)]
+        checked = verify_files(session_dir, existing, manifest,
+                               workers=cfg["verify_workers"], check_md5=cfg["check_md5"])
         
+        jobs = []
         for i, r in enumerate(scenes, 1):
             name = r.properties["sceneName"] + ".zip"
             dest = os.path.join(target_dir, name)
             
-            if os.path.exists(dest):
-                print(f"{i:3d}/{len(scenes)} ✔️  已存在: {name}")
-                skip_count += 1
-                continue
+            if dest in checked:
+                ok, reason = checked[dest]
+                if ok:
+                    print(f"{i:3d}/{len(scenes)} ✔️  已存在且校验通过: {name}")
+                    skip_count += 1
+                    continue
+                # 截断/损坏的文件删除后重新下载
+                print(f"{i:3d}/{len(scenes)} ♻️  校验失败({reason})，重新下载: {name}")
+                os.remove(dest)
             
-            print(f"{i:3d}/{len(scenes)} ⬇️  下载中: {name}")
-            try:
-                r.download(path=target_dir, session=session)
+            print(f"{i:3d}/{len(scenes)} ⬇️  排队下载: {name}")
+            jobs.append((r.properties["url"], dest, r.properties.get("bytes")))
+        
+        # 场景级并行 + 文件内 Range 分块，失败自动退避重试
+        results = download_scenes(session, jobs, workers=cfg["workers"],
+                                  chunk_size=cfg["chunk_size"], chunk_workers=cfg["chunk_workers"],
+                                  limiter=limiter)
+        
+        # 新下载的文件同样校验后才计为成功
+        done = [(d, *expected[d]) for d, e in results.items() if e is None]
+        checked = verify_files(session_dir, done, manifest,
+                               workers=cfg["verify_workers"], check_md5=cfg["check_md5"])
+        save_manifest(session_dir, manifest)
+        success_count = 0
+        for dest, (ok, reason) in checked.items():
+            if ok:
                 success_count += 1
-                print(f"       ✅ 下载完成")
-                time.sleep(1)  # 避免请求过快
-            except Exception as e:
-                fail_count += 1
-                print(f"       ❌ 下载失败: {e}")
+            else:
+                print(f"       ❌ 校验失败: {os.path.basename(dest)}: {reason}")
+        fail_count = len(results) - success_count
+        
+        print(f"\n{direction_name} 下载统计:")
+        print(f"   - 成功: {success_count} 景")
+        print(f"   - 跳过(已存在): {skip_count} 景")
+        print(f"   - 失败: {fail_count} 景")
+        
+        return success_count, skip_count, fail_count
+
+    def download_burst_list(scenes, target_dir, direction_name):
+        """按 burst 下载：每景生成 <scene>.SAFE 精简目录（以 burst_subset.json 标记完成）"""
+        aoi_bbox = parse_roi(cfg["roi"])
+        if aoi_bbox is None:
+            print("❌ burst 模式需要 ROI/AOI")
+            return 0, 0, len(scenes)
+        skip_count = 0
+        jobs = []
+        for i, r in enumerate(scenes, 1):
+            name = r.properties["sceneName"]
+            if os.path.exists(os.path.join(target_dir, name + ".SAFE", BURST_SUBSET_FLAG)):
+                print(f"{i:3d}/{len(scenes)} ✔️  burst 子集已存在: {name}.SAFE")
+                skip_count += 1
+                continue
+            print(f"{i:3d}/{len(scenes)} ⬇️  排队下载 burst 子集: {name}")
+            jobs.append((r.properties["url"], target_dir, name))
+        
+        results = download_burst_scenes(session, jobs, aoi_bbox, cfg["burst_polarization"],
+                                        workers=cfg["workers"], limiter=limiter)
+        success_count = sum(1 for e in results.values() if e is None)
+        fail_count = len(results) - success_count
         
         print(f"\n{direction_name} 下载统计:")
         print(f"   - 成功: {success_count} 景")
@@ -425,10 +1529,10 @@ def step2_download_scenes():
         return success_count, skip_count, fail_count
 
     # 下载升轨数据
-    asc_stats = download_list(ascending, ASC_DIR, "升轨(Ascending)")
+    asc_stats = download_list(ascending, asc_dir, "升轨(Ascending)")
     
     # 下载降轨数据
-    des_stats = download_list(descending, DES_DIR, "降轨(Descending)")
+    des_stats = download_list(descending, des_dir, "降轨(Descending)")
     
     # 总结
     print("\n" + "="*60)
@@ -442,14 +1546,177 @@ def step2_download_scenes():
     print(f"   - 跳过(已存在): {total_skip} 景")
     print(f"   - 下载失败: {total_fail} 景")
     print(f"\n数据保存位置:")
-    print(f"   - 升轨数据: {os.path.abspath(ASC_DIR)}")
-    print(f"   - 降轨数据: {os.path.abspath(DES_DIR)}")
+    print(f"   - 升轨数据: {os.path.abspath(asc_dir)}")
+    print(f"   - 降轨数据: {os.path.abspath(des_dir)}")
+    
+    return total_success, total_skip, total_fail
+
+# -----------------------------
+# 命令行：非交互批处理（search / download / sync / verify）
+# -----------------------------
+def geojson_roi(path):
+    """GeoJSON 文件（如 data/aoi.geojson）中所有几何的外包框，返回 ROI 字符串"""
+    return ",".join(str(v) for v in s1_meta.load_aoi_bbox(path))
+
+def parse_aoi_spec(spec, index=1):
+    """解析 --aoi：'名称=minLon,minLat,maxLon,maxLat'、'名称=xxx.geojson'、bbox 或 GeoJSON 路径
+
+    返回 {"name": ..., "roi": ...}
+    """
+    name, _, value = spec.rpartition("=")
+    value = value.strip()
+    if value.lower().endswith((".geojson", ".json")):
+        name = name or os.path.splitext(os.path.basename(value))[0]
+        return {"name": name, "roi": geojson_roi(value)}
+    parse_roi(value)  # 格式检查
+    return {"name": name or f"aoi{index}", "roi": value}
+
+def build_configs(args):
+    """合并 配置区常量 < 配置文件 < 命令行参数，按 AOI 生成运行配置列表
+
+    配置文件为 JSON，键与 default_config() 相同，另可包含
+    "aois": [{"name": "tokyo", "roi": "..."} 或 {"name": ..., "geojson": "data/aoi.geojson"}, ...]，
+    每个 AOI 条目也可覆盖其他键（如各自的 start/end）。
+    """
+    base = default_config()
+    aois = []
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            file_cfg = json.load(f)
+        for i, a in enumerate(file_cfg.pop("aois", []), 1):
+            a = dict(a)
+            if "geojson" in a:
+                a["roi"] = geojson_roi(a.pop("geojson"))
+            a.setdefault("name", f"aoi{i}")
+            aois.append(a)
+        unknown = set(file_cfg) - set(base)
+        if unknown:
+            raise ValueError(f"配置文件中有未知参数: {sorted(unknown)}")
+        base.update(file_cfg)
+
+    overrides = {
+        "start": args.start, "end": args.end, "base_dir": args.base_dir, "catalog": args.catalog,
+        "workers": args.workers, "chunk_workers": args.chunk_workers,
+        "verify_workers": args.verify_workers,
+        "chunk_size": args.chunk_size_mb * 1024 * 1024 if args.chunk_size_mb else None,
+    }
+    base.update({k: v for k, v in overrides.items() if v is not None})
+    if args.direction:
+        base["direction"] = None if args.direction == "BOTH" else args.direction
+    if args.full:
+        base["incremental"] = False
+    if args.check_md5:
+        base["check_md5"] = True
+    if args.bursts:
+        base["burst_mode"] = True
+    if args.burst_pol:
+        base["burst_polarization"] = args.burst_pol.upper()
+
+    if args.aoi:
+        aois = [parse_aoi_spec(spec, i) for i, spec in enumerate(args.aoi, 1)]
+    if not aois:
+        return [base]
+
+    # 多个 AOI 共享 BASE_DIR 下的同一个目录库，会话文件夹按 AOI 名称分开
+    configs = []
+    for a in aois:
+        cfg = dict(base)
+        cfg.update(a)
+        cfg["catalog"] = cfg["catalog"] or catalog_path(base["base_dir"])
+        cfg["base_dir"] = os.path.join(base["base_dir"], cfg["name"])
+        configs.append(cfg)
+    return configs
+
+def run_aoi(command, cfg, session=None, limiter=None, session_dir=None):
+    """对单个 AOI 执行子命令，返回失败景数（未能执行时返回 1）"""
+    try:
+        if command in ("search", "sync"):
+            step1_search_scenes(cfg)
+        elif session_dir:
+            cfg["session_dir"] = session_dir
+        if command in ("download", "sync"):
+            stats = step2_download_scenes(cfg, session=session, confirm=False, limiter=limiter)
+            return 1 if stats is None else stats[2]
+        if command == "verify":
+            results = verify_session(cfg.get("session_dir"), workers=cfg["verify_workers"],
+                                     check_md5=cfg["check_md5"], base_dir=cfg["base_dir"])
+            return sum(1 for ok, _ in results.values() if not ok)
+        return 0
+    except Exception as e:
+        log_line(f"❌ [{cfg['name'] or 'default'}] {command} 失败: {e}")
+        return 1
+
+def parse_args(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', help='JSON 配置文件（键同 default_config，可含 "aois" 列表）')
+    common.add_argument('--aoi', action='append',
+                        help='AOI，可重复：名称=minLon,minLat,maxLon,maxLat 或 名称=xxx.geojson')
+    common.add_argument('--start', help='起始日期，如 2017-04-01')
+    common.add_argument('--end', help='结束日期，如 2025-10-06')
+    common.add_argument('--direction', choices=['ASCENDING', 'DESCENDING', 'BOTH'],
+                        help='轨道方向（BOTH 表示分别搜索升轨和降轨）')
+    common.add_argument('--base-dir', help='下载根目录（默认 BASE_DIR）')
+    common.add_argument('--catalog', help='目录库路径（默认 BASE_DIR/scene_catalog.sqlite）')
+    common.add_argument('--full', action='store_true', help='关闭增量搜索，重新请求完整时间范围')
+    common.add_argument('--workers', type=int, help=f'每个 AOI 同时下载的景数（默认 {DOWNLOAD_WORKERS}）')
+    common.add_argument('--chunk-workers', type=int, help=f'单个文件内并行分块数（默认 {CHUNK_WORKERS}）')
+    common.add_argument('--chunk-size-mb', type=int, help=f'Range 分块大小 MB（默认 {CHUNK_SIZE // 1024 // 1024}）')
+    common.add_argument('--verify-workers', type=int, help=f'并行校验文件数（默认 {VERIFY_WORKERS}）')
+    common.add_argument('--check-md5', action='store_true', help='校验时同时比对 MD5')
+    common.add_argument('--bursts', action='store_true',
+                        help='按 burst 下载：只取覆盖 AOI 的 burst，输出精简 .SAFE 目录')
+    common.add_argument('--burst-pol', help=f'burst 模式的极化（默认 {BURST_POLARIZATION}）')
+    common.add_argument('--max-bandwidth', type=float, default=MAX_BANDWIDTH,
+                        help='所有 AOI 合计的下载带宽上限 MB/s（默认不限制）')
+    common.add_argument('--aoi-workers', type=int, default=AOI_WORKERS,
+                        help=f'并发处理的 AOI 数（默认 {AOI_WORKERS}）')
+
+    parser = argparse.ArgumentParser(description="Sentinel-1 SLC 数据查找与下载工具（不带参数运行进入交互菜单）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("search", parents=[common], help="步骤1：搜索并写入目录库/会话文件夹")
+    p = sub.add_parser("download", parents=[common], help="步骤2：下载最新会话（或 --session 指定）的数据")
+    p.add_argument('--session', help='会话文件夹路径（仅单个 AOI 时有效）')
+    sub.add_parser("sync", parents=[common], help="搜索 + 下载 + 校验（适合定时任务）")
+    p = sub.add_parser("verify", parents=[common], help="校验最新会话（或 --session 指定）的已下载数据")
+    p.add_argument('--session', help='会话文件夹路径（仅单个 AOI 时有效）')
+    return parser.parse_args(argv)
+
+def run_cli(argv):
+    """命令行入口；返回进程退出码（有失败时为 1）"""
+    args = parse_args(argv)
+    configs = build_configs(args)
+    session_dir = getattr(args, "session", None)
+    if session_dir and len(configs) > 1:
+        print("❌ --session 只能与单个 AOI 一起使用")
+        return 2
+
+    # 所有 AOI 共享同一个已认证 session（连接池按总并发扩容）与同一个带宽限速器
+    session = None
+    if args.command in ("download", "sync"):
+        session = authenticate_for_download()
+        if session is None:
+            return 1
+        pool = sum(cfg["workers"] * cfg["chunk_workers"] for cfg in configs[:args.aoi_workers])
+        tune_session_pool(session, max(10, pool))
+    limiter = RateLimiter(args.max_bandwidth * 1024 * 1024) if args.max_bandwidth else None
+
+    with ThreadPoolExecutor(max_workers=max(1, args.aoi_workers)) as pool:
+        futures = [pool.submit(run_aoi, args.command, cfg, session, limiter, session_dir)
+                   for cfg in configs]
+        failures = sum(f.result() for f in futures)
+
+    print(f"\n{'✅' if failures == 0 else '❌'} {args.command} 完成：{len(configs)} 个 AOI，失败 {failures}")
+    return 0 if failures == 0 else 1
 
 # -----------------------------
 # 主程序
 # -----------------------------
-def main():
-    """主函数：选择执行步骤"""
+def main(argv=None):
+    """主函数：带子命令参数时以批处理方式运行，否则进入交互菜单选择执行步骤"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_cli(argv)
+    
     print("\n" + "="*60)
     print("Sentinel-1 数据查找与下载工具")
     print("="*60)
@@ -464,9 +1731,10 @@ def main():
     print("  1 - 仅搜索数据（步骤1）")
     print("  2 - 仅下载数据（步骤2，需先执行步骤1）")
     print("  3 - 搜索并下载（执行步骤1和步骤2）")
+    print("  4 - 校验已下载数据（大小 / zip 结构，写入校验清单）")
     print("  q - 退出")
     
-    choice = input("\n请输入选项 (1/2/3/q): ").strip().lower()
+    choice = input("\n请输入选项 (1/2/3/4/q): ").strip().lower()
     
     if choice == '1':
         # 仅搜索
@@ -488,6 +1756,10 @@ def main():
         else:
             print("✅ 步骤1完成！可稍后运行步骤2进行下载。")
             
+    elif choice == '4':
+        # 仅校验
+        verify_session()
+        
     elif choice == 'q':
         print("👋 再见！")
         return
@@ -496,5 +1768,5 @@ def main():
         print("❌ 无效选项，请重新运行程序")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+SNAP / JVM 调优配置（仅依赖标准库）
+
+在 esa_snappy 启动 JVM 之前确定：最大堆、GPF 瓦片缓存 (snap.jai.tileCacheSize)、
+计算线程数 (snap.parallelism) 与默认瓦片尺寸 (snap.jai.defaultTileSize，ProductIO.writeProduct
+按该尺寸逐块计算与写出)。
+
+- preset(name)：按本机内存与核数给出一组取值（small / medium / large / auto）
+- java_options / apply_env：写入 _JAVA_OPTIONS，JNI 创建的 JVM 同样读取它，且优先于 snappy 配置中的 -Xmx
+- apply_runtime：JVM 启动后对 JAI 瓦片缓存与调度线程数再设置一次（这两项可以在运行中修改）
+"""
+import os
+import json
+
+JAVA_OPTIONS_ENV = "_JAVA_OPTIONS"
+
+# (堆占内存比例, 堆上限 GB, 瓦片缓存占堆比例, 线程数上限, 瓦片尺寸)
+PRESETS = {
+    "small": (0.5, 8, 0.4, 4, 256),        # 单个小 AOI / 调试：启动快、不占满节点
+    "medium": (0.65, 64, 0.5, 16, 512),
+    "large": (0.8, None, 0.6, None, 1024),  # 大 stack / 多 swath：大缓存减少瓦片重算
+}
+KEYS = ("max_heap_gb", "tile_cache_mb", "parallelism", "tile_size")
+
+
+def machine():
+    """(内存 GB, 可用核数)"""
+    try:
+        ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+    except (ValueError, OSError, AttributeError):
+        ram = 16.0
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return ram, cores
+
+
+def preset(name="auto", ram_gb=None, cores=None):
+    """预设 -> dict(max_heap_gb, tile_cache_mb, parallelism, tile_size)；auto 按内存大小选择"""
+    m_ram, m_cores = machine()
+    ram_gb = ram_gb or m_ram
+    cores = cores or m_cores
+    if name == "auto":
+        name = "small" if ram_gb < 16 else "medium" if ram_gb < 96 else "large"
+    heap_ratio, heap_cap, cache_ratio, threads_cap, tile = PRESETS[name]
+    heap = ram_gb * heap_ratio
+    if heap_cap:
+        heap = min(heap, heap_cap)
+    heap = max(1, int(heap))
+    return {
+        "preset": name,
+        "max_heap_gb": heap,
+        "tile_cache_mb": int(heap * 1024 * cache_ratio),
+        "parallelism": max(1, min(cores, threads_cap or cores)),
+        "tile_size": tile,
+    }
+
+
+def load(path):
+    """JSON 文件：可含 "preset" 与 KEYS 中任意项（覆盖预设）"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    cfg = preset(data.get("preset", "auto"))
+    cfg.update({k: data[k] for k in KEYS if data.get(k) is not None})
+    return cfg
+
+
+def java_options(cfg):
+    opts = []
+    if cfg.get("max_heap_gb"):
+        opts.append(f"-Xmx{int(cfg['max_heap_gb'])}G")
+    if cfg.get("tile_cache_mb"):
+        opts.append(f"-Dsnap.jai.tileCacheSize={int(cfg['tile_cache_mb'])}")
+    if cfg.get("parallelism"):
+        opts.append(f"-Dsnap.parallelism={int(cfg['parallelism'])}")
+    if cfg.get("tile_size"):
+        opts.append(f"-Dsnap.jai.defaultTileSize={int(cfg['tile_size'])}")
+    return opts
+
+
+def apply_env(cfg, environ=None):
+    """在 JVM 启动之前调用；保留已有的 _JAVA_OPTIONS（后写的同名选项生效）"""
+    environ = os.environ if environ is None else environ
+    opts = java_options(cfg)
+    if opts:
+        current = environ.get(JAVA_OPTIONS_ENV, "").strip()
+        environ[JAVA_OPTIONS_ENV] = " ".join(([current] if current else []) + opts)
+    return opts
+
+
+def apply_runtime(cfg, jpy):
+    """JVM 启动后设置 JAI 瓦片缓存容量、调度线程数与 SNAP 偏好（对之后创建的算子生效）"""
+    JAI = jpy.get_type("javax.media.jai.JAI")
+    System = jpy.get_type("java.lang.System")
+    jai = JAI.getDefaultInstance()
+    if cfg.get("tile_cache_mb"):
+        jai.getTileCache().setMemoryCapacity(int(cfg["tile_cache_mb"]) * 1024 * 1024)
+    if cfg.get("parallelism"):
+        jai.getTileScheduler().setParallelism(int(cfg["parallelism"]))
+        jai.getTileScheduler().setPrefetchParallelism(int(cfg["parallelism"]))
+    for key, prop in (("tile_cache_mb", "snap.jai.tileCacheSize"), ("parallelism", "snap.parallelism"),
+                      ("tile_size", "snap.jai.defaultTileSize")):
+        if cfg.get(key):
+            System.setProperty(prop, str(int(cfg[key])))
+
+
+def describe(cfg):
+    return ", ".join(f"{k}={cfg[k]}" for k in ("preset",) + KEYS if cfg.get(k) is not None)
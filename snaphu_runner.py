@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+SNAPHU 执行层（仅依赖标准库）
+
+- 从 snaphu.conf（SnaphuExport 生成）中取出输入文件与宽度，由文件大小推算行数
+- 按影像尺寸与 CPU 核数规划分块：--tile ntilerow ntilecol rowovrlp colovrlp --nproc N，
+  由 snaphu 自己把各分块派发到 N 个子进程并完成分块拼接（secondary network）
+- 输出逐行写入日志；超时后结束整个进程组，并以更粗的分块重试
+"""
+import os
+import glob
+import math
+import time
+import shutil
+import signal
+import threading
+import subprocess
+
+TILE_TARGET = 2000       # 目标分块边长（像元）
+MIN_TILE = 500           # 小于该边长不再细分
+OVERLAP_RATIO = 0.1      # 重叠占分块边长的比例
+MIN_OVERLAP = 200
+TIMEOUT = None           # 单次运行超时（秒），None 不限制
+RETRIES = 2              # 超时后以更粗的分块重试的次数
+
+
+def parse_snaphu_conf(conf_path):
+    """snaphu.conf 中注释掉的命令行 '# snaphu -f snaphu.conf Phase.img 1234' -> (input_file, width)"""
+    with open(conf_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            # 允许带 "#" 的命令行
+            if "snaphu" in line and "-f" in line:
+                parts = line.lstrip("#").strip().split()
+                if len(parts) >= 4:
+                    return parts[-2], int(parts[-1])
+    raise ValueError(f"Cannot find SNAPHU command line in {conf_path}")
+
+
+def raster_lines(path, width, bytes_per_pixel=4):
+    """FLOAT 原始栅格的行数（SnaphuExport 输出为 float32）"""
+    return os.path.getsize(path) // (width * bytes_per_pixel)
+
+
+def plan_tiling(width, lines, cores=None, target=TILE_TARGET):
+    """分块规划 -> dict(ntilerow, ntilecol, rowovrlp, colovrlp, nproc)
+
+    分块边长接近 target；核数多于分块数时继续细分（不小于 MIN_TILE），以便所有核都有活干
+    """
+    cores = max(1, cores or os.cpu_count() or 1)
+    nrow = max(1, math.ceil(lines / target))
+    ncol = max(1, math.ceil(width / target))
+    while nrow * ncol < cores:
+        if lines / (nrow + 1) >= MIN_TILE and lines / nrow >= width / ncol:
+            nrow += 1
+        elif width / (ncol + 1) >= MIN_TILE:
+            ncol += 1
+        elif lines / (nrow + 1) >= MIN_TILE:
+            nrow += 1
+        else:
+            break
+    return _tiling(width, lines, nrow, ncol, cores)
+
+
+def _tiling(width, lines, nrow, ncol, cores):
+    tile_edge = min(lines / nrow, width / ncol)
+    overlap = max(MIN_OVERLAP, int(tile_edge * OVERLAP_RATIO)) if nrow * ncol > 1 else 0
+    return {
+        "ntilerow": nrow,
+        "ntilecol": ncol,
+        "rowovrlp": overlap if nrow > 1 else 0,
+        "colovrlp": overlap if ncol > 1 else 0,
+        "nproc": max(1, min(cores, nrow * ncol)),
+    }
+
+
+def coarser(tiling, width, lines, cores=None):
+    """分块数减半（先减大的一边）；已是单块时返回 None"""
+    nrow, ncol = tiling["ntilerow"], tiling["ntilecol"]
+    if nrow == 1 and ncol == 1:
+        return None
+    if nrow >= ncol:
+        nrow = max(1, nrow // 2)
+    else:
+        ncol = max(1, ncol // 2)
+    return _tiling(width, lines, nrow, ncol, cores or tiling["nproc"])
+
+
+def tile_args(tiling):
+    if tiling["ntilerow"] * tiling["ntilecol"] == 1:
+        return []
+    return ["--tile", str(tiling["ntilerow"]), str(tiling["ntilecol"]),
+            str(tiling["rowovrlp"]), str(tiling["colovrlp"]),
+            "--nproc", str(tiling["nproc"])]
+
+
+class SnaphuTimeout(RuntimeError):
+    pass
+
+
+def _stream(pipe, log):
+    for line in iter(pipe.readline, ""):
+        line = line.rstrip()
+        if line:
+            log("INFO", f"snaphu: {line}")
+    pipe.close()
+
+
+def run_once(cmd, cwd, log, timeout=None):
+    """运行一次 snaphu，输出实时写入日志；超时则结束整个进程组（含 snaphu fork 的分块子进程）"""
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, bufsize=1, start_new_session=True)
+    reader = threading.Thread(target=_stream, args=(proc.stdout, log), daemon=True)
+    reader.start()
+    try:
+        code = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+        proc.wait()
+        reader.join()
+        raise SnaphuTimeout(f"SNAPHU timed out after {timeout}s")
+    # 残留的子进程可能仍持有管道，主进程结束后只再等一小会儿输出
+    reader.join(timeout=5)
+    return code
+
+
+def cleanup_tiles(snaphu_dir):
+    # snaphu 分块模式的中间目录 snaphu_tiles_<pid>
+    for d in glob.glob(os.path.join(snaphu_dir, "snaphu_tiles_*")):
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def run_snaphu_tiled(snaphu_bin, snaphu_dir, log, cores=None, timeout=TIMEOUT, retries=RETRIES,
+                     conf_name="snaphu.conf"):
+    """log(level, msg)。返回最终使用的分块规划；失败时抛 RuntimeError"""
+    input_file, width = parse_snaphu_conf(os.path.join(snaphu_dir, conf_name))
+    lines = raster_lines(os.path.join(snaphu_dir, input_file), width)
+    tiling = plan_tiling(width, lines, cores)
+
+    for attempt in range(retries + 1):
+        cmd = [snaphu_bin, "-f", conf_name] + tile_args(tiling) + [input_file, str(width)]
+        log("INFO", f"SNAPHU {width}x{lines}, tiles {tiling['ntilerow']}x{tiling['ntilecol']}, "
+                    f"overlap {tiling['rowovrlp']}/{tiling['colovrlp']}, nproc {tiling['nproc']}")
+        log("INFO", "Command: " + " ".join(cmd))
+        t0 = time.time()
+        try:
+            code = run_once(cmd, snaphu_dir, log, timeout)
+        except SnaphuTimeout as e:
+            cleanup_tiles(snaphu_dir)
+            nxt = coarser(tiling, width, lines, cores)
+            if attempt == retries or nxt is None:
+                raise RuntimeError(f"{e}; no retries left")
+            log("WARN", f"{e}; retrying with coarser tiling")
+            tiling = nxt
+            continue
+        if code != 0:
+            raise RuntimeError(f"SNAPHU failed with code {code}")
+        log("INFO", f"SNAPHU finished in {time.time() - t0:.1f}s")
+        cleanup_tiles(snaphu_dir)
+        return tiling
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+dsm.py 中间产品的内容寻址缓存（仅依赖标准库）
+
+- 键：sha256(阶段名 + 算子名 + 参数 + 上游键)；输入景的键来自文件名与大小
+- 条目：<root>/<key>/product.dim + product.data/ + meta.json（meta.json 最后写入，存在即有效）
+- 容量：超过 max_gb 时按 last_used 做 LRU 淘汰；本进程正在使用的条目（lookup/commit 后、release 前）不会被淘汰
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+META_NAME = "meta.json"
+PRODUCT_NAME = "product"
+
+
+def stage_key(name, op, params, source_keys=()):
+    """params: [(key, value), ...]（值统一转为字符串），顺序无关"""
+    h = hashlib.sha256()
+    h.update(f"{name}\0{op}\0".encode("utf-8"))
+    for k, v in sorted((str(k), str(v)) for k, v in params):
+        h.update(f"{k}={v}\0".encode("utf-8"))
+    for sk in source_keys:
+        h.update(f"<{sk}\0".encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def input_key(path):
+    """输入景的标识：S1 产品名不可变，因此用文件名 + 大小；.SAFE 目录（burst 子集）用各文件相对路径 + 大小"""
+    path = os.path.abspath(path.rstrip("/\\"))
+    h = hashlib.sha256(os.path.basename(path).encode("utf-8"))
+    if os.path.isdir(path):
+        for dirpath, _, filenames in sorted(os.walk(path)):
+            for fn in sorted(filenames):
+                fp = os.path.join(dirpath, fn)
+                h.update(f"{os.path.relpath(fp, path)}:{os.path.getsize(fp)}\0".encode("utf-8"))
+    else:
+        h.update(f":{os.path.getsize(path)}".encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, fn))
+            except OSError:
+                pass
+    return total
+
+
+class StageCache:
+    def __init__(self, root, max_gb=200.0):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.pinned = {}  # key -> 使用中的次数
+        self.lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def product_path(self, key):
+        """BEAM-DIMAP 头文件路径（ProductIO.readProduct 用）"""
+        return os.path.join(self.entry_dir(key), PRODUCT_NAME + ".dim")
+
+    def _read_meta(self, key):
+        try:
+            with open(os.path.join(self.entry_dir(key), META_NAME), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        path = os.path.join(self.entry_dir(key), META_NAME)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, path)
+
+    def lookup(self, key):
+        """命中返回 .dim 路径并刷新 last_used；未命中或条目不完整返回 None"""
+        with self.lock:
+            meta = self._read_meta(key)
+            if meta is None or not os.path.exists(self.product_path(key)):
+                return None
+            meta["last_used"] = time.time()
+            meta["hits"] = meta.get("hits", 0) + 1
+            self._write_meta(key, meta)
+            self.pinned[key] = self.pinned.get(key, 0) + 1
+            return self.product_path(key)
+
+    def release(self, key):
+        """lookup/commit 返回的产品不再使用；最后一个使用者释放后条目可以被淘汰（随即按容量淘汰一次）"""
+        with self.lock:
+            n = self.pinned.get(key, 0) - 1
+            if n > 0:
+                self.pinned[key] = n
+                return
+            self.pinned.pop(key, None)
+        self.evict()
+
+    def staging_path(self, key):
+        """写入用的临时目录；返回 (tmp_dir, DIMAP 基础路径，不含 .dim)"""
+        tmp_dir = os.path.join(self.root, f"{key}.tmp-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        return tmp_dir, os.path.join(tmp_dir, PRODUCT_NAME)
+
+    def commit(self, key, tmp_dir, meta):
+        """临时目录 -> 正式条目（原子 rename），随后按容量淘汰；返回 .dim 路径"""
+        size = dir_size(tmp_dir)
+        now = time.time()
+        meta = dict(meta, key=key, size=size, created=now, last_used=now, hits=0)
+        with open(os.path.join(tmp_dir, META_NAME), "w") as f:
+            json.dump(meta, f, indent=2)
+        with self.lock:
+            final = self.entry_dir(key)
+            if os.path.exists(final):
+                # 并发写入了同一个键（或残留的不完整条目）：保留完整的那个
+                if self._read_meta(key) is not None:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                else:
+                    shutil.rmtree(final, ignore_errors=True)
+                    os.rename(tmp_dir, final)
+            else:
+                os.rename(tmp_dir, final)
+            self.pinned[key] = self.pinned.get(key, 0) + 1
+        self.evict()
+        return self.product_path(key)
+
+    def abort(self, tmp_dir):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def entries(self):
+        """[(key, meta)]；忽略临时目录和不完整条目"""
+        out = []
+        for name in os.listdir(self.root):
+            if ".tmp-" in name:
+                continue
+            meta = self._read_meta(name)
+            if meta is not None:
+                out.append((name, meta))
+        return out
+
+    def total_size(self):
+        return sum(m.get("size", 0) for _, m in self.entries())
+
+    def evict(self):
+        """超出容量时删除最久未使用的条目；返回被删除的键"""
+        removed = []
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda e: e[1].get("last_used", 0))
+            total = sum(m.get("size", 0) for _, m in entries)
+            for key, meta in entries:
+                if total <= self.max_bytes:
+                    break
+                if key in self.pinned:
+                    continue
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                total -= meta.get("size", 0)
+                removed.append(key)
+        return removed
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+dsm.py 的按阶段性能记录（仅依赖标准库）
+
+每个阶段记录：墙钟时间、CPU 时间（本进程 + 子进程，如 snaphu）、写出字节数（/proc/self/io）、
+RSS 峰值与 JVM 堆峰值（后台线程采样）。阶段可以嵌套（惰性链向上游拉取），
+时间/CPU/字节数为扣除子阶段后的独占值，峰值为阶段窗口内的最大值。
+除墙钟时间外都是进程级的量（JVM 工作线程、已回收的子进程都算在内），同一进程内同时跑的 pair
+会互相计入，因此 dsm.py 在 --profile 时一次只处理一个 pair；CSV 表头以 process_ 前缀标出这些列。
+"""
+import os
+import csv
+import json
+import time
+import resource
+import threading
+import contextlib
+
+FIELDS = ["stage", "wall_s", "cpu_s", "bytes_written", "peak_rss_mb", "peak_heap_mb", "cached", "materialized"]
+SUMMARY_FIELDS = ["stage", "runs", "wall_s", "wall_mean_s", "wall_max_s", "cpu_s", "bytes_written",
+                  "peak_rss_mb", "peak_heap_mb"]
+PROCESS_WIDE = ("cpu_s", "bytes_written", "peak_rss_mb", "peak_heap_mb")
+
+_local = threading.local()
+
+
+def current():
+    """当前线程正在使用的 StageProfiler（没有则为 None）"""
+    return getattr(_local, "profiler", None)
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # 非 Linux：只能拿到进程生命周期内的峰值（macOS 为字节，Linux 为 KB）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if peak > 1 << 32 else peak / 1024
+
+
+def bytes_written():
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def cpu_seconds():
+    self_ = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_.ru_utime + self_.ru_stime + children.ru_utime + children.ru_stime
+
+
+class StageProfiler:
+    """heap_mb: 返回当前 JVM 已用堆（MB）的函数；materialize: 是否强制每个阶段落盘（由 dsm.Stage 执行）"""
+
+    def __init__(self, heap_mb=None, materialize=False, scratch_dir=None, interval=0.5):
+        self.heap_mb = heap_mb
+        self.materialize = materialize
+        self.scratch_dir = scratch_dir
+        self.interval = interval
+        self.records = []
+        self.lock = threading.Lock()
+        self._open = []
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # ---------- sampling ----------
+    def _sample(self):
+        rss = rss_mb()
+        heap = None
+        if self.heap_mb:
+            try:
+                heap = self.heap_mb()
+            except Exception:
+                heap = None
+        with self.lock:
+            for rec in self._open:
+                rec["peak_rss_mb"] = max(rec["peak_rss_mb"] or 0, rss)
+                if heap is not None:
+                    rec["peak_heap_mb"] = max(rec["peak_heap_mb"] or 0, heap)
+
+    def _run_sampler(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    @contextlib.contextmanager
+    def active(self):
+        """在当前线程启用（Stage 通过 current() 找到它），并启动采样线程"""
+        prev = current()
+        _local.profiler = self
+        if self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._run_sampler, daemon=True)
+            self._sampler.start()
+        try:
+            yield self
+        finally:
+            _local.profiler = prev
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    # ---------- stages ----------
+    @contextlib.contextmanager
+    def stage(self, name):
+        rec = {f: None for f in FIELDS}
+        rec.update(stage=name, cached=False, materialized=False, _children=[0.0, 0.0, 0])
+        w0, c0, b0 = time.perf_counter(), cpu_seconds(), bytes_written()
+        with self.lock:
+            parent = self._open[-1] if self._open else None
+            self._open.append(rec)
+        self._sample()
+        try:
+            yield rec
+        finally:
+            self._sample()
+            wall = time.perf_counter() - w0
+            cpu = cpu_seconds() - c0
+            b1 = bytes_written()
+            nbytes = b1 - b0 if b0 is not None and b1 is not None else 0
+            child_wall, child_cpu, child_bytes = rec.pop("_children")
+            rec["wall_s"] = round(wall - child_wall, 3)
+            rec["cpu_s"] = round(cpu - child_cpu, 3)
+            rec["bytes_written"] = nbytes - child_bytes if b0 is not None else None
+            for k in ("peak_rss_mb", "peak_heap_mb"):
+                if rec[k] is not None:
+                    rec[k] = round(rec[k], 1)
+            with self.lock:
+                self._open.remove(rec)
+                if parent is not None and "_children" in parent:
+                    parent["_children"][0] += wall
+                    parent["_children"][1] += cpu
+                    parent["_children"][2] += nbytes
+                self.records.append(rec)
+
+    # ---------- output ----------
+    def write(self, output_dir, basename="profile"):
+        """<output_dir>/profile.json + profile.csv；返回 json 路径"""
+        json_path = os.path.join(output_dir, basename + ".json")
+        with open(json_path, "w") as f:
+            json.dump({"stages": self.records, "materialize": self.materialize, "process_wide": list(PROCESS_WIDE)},
+                      f, indent=2)
+        write_csv(os.path.join(output_dir, basename + ".csv"), self.records, FIELDS)
+        return json_path
+
+
+def write_csv(path, rows, fields):
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        w.writerow({k: "process_" + k if k in PROCESS_WIDE else k for k in fields})
+        w.writerows(rows)
+
+
+def aggregate(json_paths):
+    """多个 profile.json（批处理各 pair）-> 按阶段汇总的行列表"""
+    summary = {}
+    for path in json_paths:
+        try:
+            with open(path) as f:
+                records = json.load(f)["stages"]
+        except (OSError, ValueError, KeyError):
+            continue
+        for rec in records:
+            s = summary.setdefault(rec["stage"], {
+                "stage": rec["stage"], "runs": 0, "wall_s": 0.0, "wall_max_s": 0.0, "cpu_s": 0.0,
+                "bytes_written": 0, "peak_rss_mb": None, "peak_heap_mb": None,
+            })
+            s["runs"] += 1
+            s["wall_s"] += rec.get("wall_s") or 0
+            s["wall_max_s"] = max(s["wall_max_s"], rec.get("wall_s") or 0)
+            s["cpu_s"] += rec.get("cpu_s") or 0
+            s["bytes_written"] += rec.get("bytes_written") or 0
+            for k in ("peak_rss_mb", "peak_heap_mb"):
+                if rec.get(k) is not None:
+                    s[k] = max(s[k] or 0, rec[k])
+    rows = sorted(summary.values(), key=lambda r: -r["wall_s"])
+    for r in rows:
+        r["wall_s"] = round(r["wall_s"], 3)
+        r["cpu_s"] = round(r["cpu_s"], 3)
+        r["wall_mean_s"] = round(r["wall_s"] / r["runs"], 3)
+    return rows
+
+
+def write_summary(output_dir, json_paths, basename="profile_summary"):
+    rows = aggregate(json_paths)
+    with open(os.path.join(output_dir, basename + ".json"), "w") as f:
+        json.dump({"pairs": len(json_paths), "stages": rows, "process_wide": list(PROCESS_WIDE)}, f, indent=2)
+    write_csv(os.path.join(output_dir, basename + ".csv"), rows, SUMMARY_FIELDS)
+    return rows
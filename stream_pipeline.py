@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+下载-处理流水线（生产者/消费者）
+
+- 候选 pair 与 dsm.py --network 相同：同一轨道/帧、时间基线窗口内的小基线网络（s1_meta.small_baseline_pairs），
+  在开始时由全部待下载景确定，不随下载完成顺序变化
+- 生产者：download_workers 个线程逐景下载 + 校验（fetch），按时间顺序；一景就绪后，
+  与之配对且另一景也已就绪的 pair 进入有界队列
+- 消费者：process_workers 个线程从队列取 pair 处理（process）
+- 队列满时下载线程阻塞在入队处，不再开始新的下载：网络与 CPU 同时工作，且已下载未处理的数据量有上限
+- 某景下载/校验失败时，包含它的 pair 记为失败，不影响其他 pair
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import s1_meta
+
+QUEUE_SIZE = 2
+DOWNLOAD_WORKERS = 2
+PROCESS_WORKERS = 1
+
+
+class StreamPipeline:
+    """scenes: 下载完成后的本地路径列表（.zip 或 .SAFE）；fetch(path) 下载并校验该景（已存在时直接返回），
+    process(master, slave) 处理一个 pair；log(level, msg)
+    """
+
+    def __init__(self, scenes, fetch, process, max_days=48, max_neighbors=2, tracks=None,
+                 download_workers=DOWNLOAD_WORKERS, process_workers=PROCESS_WORKERS, queue_size=QUEUE_SIZE,
+                 log=None):
+        self.fetch = fetch
+        self.process = process
+        self.download_workers = max(1, download_workers)
+        self.process_workers = max(1, process_workers)
+        self.queue = queue.Queue(max(1, queue_size))
+        self.log = log or (lambda level, msg: print(f"[{level}] {msg}"))
+        self.pairs = s1_meta.small_baseline_pairs(scenes, max_days, max_neighbors, tracks)
+        self.by_scene = {}
+        for pair in self.pairs:
+            for path in pair:
+                self.by_scene.setdefault(path, []).append(pair)
+        # 只下载参与至少一个 pair 的景，按采集时间排序，使早期 pair 尽早可处理
+        infos = {p: s1_meta.scene_info(p) for p in self.by_scene}
+        self.scenes = sorted(self.by_scene, key=lambda p: infos[p]["start"])
+        self.ready = set()
+        self.failed = {}
+        self.enqueued = set()
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def _scene_ready(self, path):
+        # 在下载线程中调用：队列满时阻塞，该下载线程暂停
+        with self.lock:
+            self.ready.add(path)
+            todo = [pair for pair in self.by_scene[path]
+                    if pair not in self.enqueued and all(p in self.ready for p in pair)]
+            self.enqueued.update(todo)
+        for pair in todo:
+            self.log("INFO", f"Pair ready: {s1_meta.scene_info(pair[0])['name']} / "
+                             f"{s1_meta.scene_info(pair[1])['name']} (queue {self.queue.qsize()})")
+            self.queue.put(pair)
+
+    def _scene_failed(self, path, error):
+        with self.lock:
+            self.failed[path] = error
+            for pair in self.by_scene[path]:
+                if pair not in self.enqueued:
+                    self.enqueued.add(pair)
+                    self.results[pair] = RuntimeError(f"scene {s1_meta.scene_info(path)['name']} unavailable: {error}")
+
+    def _download(self, path):
+        try:
+            self.fetch(path)
+        except Exception as e:
+            self.log("ERROR", f"Download failed: {s1_meta.scene_info(path)['name']}: {e}")
+            self._scene_failed(path, e)
+            return
+        self._scene_ready(path)
+
+    def _consume(self):
+        while True:
+            pair = self.queue.get()
+            if pair is None:
+                return
+            try:
+                self.process(*pair)
+                result = None
+            except Exception as e:
+                self.log("ERROR", f"Pair {s1_meta.scene_info(pair[0])['name']} / "
+                                  f"{s1_meta.scene_info(pair[1])['name']} failed: {e}")
+                result = e
+            with self.lock:
+                self.results[pair] = result
+
+    def run(self):
+        """返回 {(master, slave): None 表示成功，否则为异常对象}"""
+        self.log("INFO", f"Stream: {len(self.scenes)} scenes, {len(self.pairs)} candidate pairs, "
+                         f"{self.download_workers} download / {self.process_workers} process workers, "
+                         f"queue {self.queue.maxsize}")
+        consumers = [threading.Thread(target=self._consume, name=f"process-{i}", daemon=True)
+                     for i in range(self.process_workers)]
+        for t in consumers:
+            t.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+                for fut in [pool.submit(self._download, p) for p in self.scenes]:
+                    fut.result()
+        finally:
+            for _ in consumers:
+                self.queue.put(None)
+            for t in consumers:
+                t.join()
+        failed = sum(1 for e in self.results.values() if e is not None)
+        self.log("INFO", f"Stream finished: {len(self.results) - failed} pairs ok, {failed} failed, "
+                         f"{len(self.failed)} scenes unavailable")
+        return dict(self.results)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""slc_dl.download_burst_subset：本地 Range 服务器上统计实际取回的字节数"""
+import os
+import re
+import struct
+import zipfile
+import threading
+import http.server
+
+import requests
+
+import slc_dl
+
+LPB, SPB, NBURSTS = 128, 1024, 16
+BURST_BYTES = LPB * SPB * 4
+DATA_START = 4096
+ROOT = "S1A_IW_SLC__1SDV_20201217T084140_20201217T084207_024740_02F148_C219.SAFE"
+
+
+def make_tiff():
+    """经典 TIFF：影像数据（各 burst）在前，外置标签值与 IFD 在文件末尾"""
+    data = bytearray(DATA_START)
+    for i in range(NBURSTS):
+        data += bytes([i + 1]) * BURST_BYTES
+    offsets = [DATA_START + i * BURST_BYTES for i in range(NBURSTS)]
+    strip_offsets = len(data)
+    data += struct.pack(f"<{NBURSTS}I", *offsets)
+    strip_counts = len(data)
+    data += struct.pack(f"<{NBURSTS}I", *[BURST_BYTES] * NBURSTS)
+    tiepoints = len(data)
+    data += struct.pack("<12d", *range(12))
+    ifd = len(data)
+    entries = [(256, 3, 1, SPB), (257, 3, 1, LPB * NBURSTS), (273, 4, NBURSTS, strip_offsets),
+               (279, 4, NBURSTS, strip_counts), (33922, 12, 12, tiepoints)]
+    data += struct.pack("<H", len(entries))
+    for tag, typ, count, value in entries:
+        data += struct.pack("<HHII", tag, typ, count, value)
+    data += struct.pack("<I", 0)
+    data[:8] = b"II" + struct.pack("<HI", 42, ifd)
+    return bytes(data), offsets
+
+
+def annotation(swath, pol, offsets):
+    bursts = "".join(f"<burst><azimuthTime>2020-12-17T08:41:{40 + i:02d}</azimuthTime>"
+                     f"<byteOffset>{off}</byteOffset></burst>" for i, off in enumerate(offsets))
+    pts = "".join(f"<geolocationGridPoint><line>{k * LPB}</line><pixel>{px}</pixel>"
+                  f"<latitude>{35.0 + k * 0.1}</latitude><longitude>{139.0 + dl}</longitude></geolocationGridPoint>"
+                  for k in range(NBURSTS + 1) for px, dl in ((0, 0.0), (SPB - 1, 0.3)))
+    return (f"<product><adsHeader><swath>{swath}</swath><polarisation>{pol}</polarisation></adsHeader>"
+            f"<swathTiming><linesPerBurst>{LPB}</linesPerBurst><samplesPerBurst>{SPB}</samplesPerBurst>"
+            f"<burstList>{bursts}</burstList></swathTiming>"
+            f"<geolocationGrid><geolocationGridPointList>{pts}</geolocationGridPointList></geolocationGrid>"
+            f"</product>").encode()
+
+
+def make_zip(path):
+    tiff, offsets = make_tiff()
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr(ROOT + "/manifest.safe", b"<manifest/>")
+        for pol in ("vv", "vh"):
+            base = f"s1a-iw2-slc-{pol}-20201217t084141-20201217t084207-024740-02f148-005"
+            z.writestr(f"{ROOT}/annotation/{base}.xml", annotation("IW2", pol.upper(), offsets))
+            z.writestr(zipfile.ZipInfo(f"{ROOT}/measurement/{base}.tiff"), tiff, compress_type=zipfile.ZIP_STORED)
+    return tiff, offsets
+
+
+def serve(data):
+    served = {"bytes": 0}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            a, b = map(int, re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups())
+            body = data[a:b + 1]
+            served["bytes"] += len(body)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {a}-{a + len(body) - 1}/{len(data)}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, served
+
+
+def test_burst_subset_fetches_only_selected_bursts(tmp_path):
+    zip_path = str(tmp_path / "scene.zip")
+    tiff, offsets = make_zip(zip_path)
+    with open(zip_path, "rb") as f:
+        server, served = serve(f.read())
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/scene.zip"
+        aoi = (139.05, 35.42, 139.1, 35.48)   # 只与第 5 个 burst 相交
+        selected = slc_dl.download_burst_subset(requests.Session(), url, str(tmp_path), ROOT[:-5], aoi, "VV")
+    finally:
+        server.shutdown()
+    assert selected == {"IW2": (5, 5)}
+    # 一个 burst + 中央目录/annotation 等小文件（预读 256 KB），远小于整个 measurement TIFF
+    # 所选 burst + zip 目录/annotation 的预读块 + 少量 TIFF 头/IFD；旧实现会读完整个 TIFF 前缀与尾部
+    assert served["bytes"] < BURST_BYTES + 3 * slc_dl.HttpRangeFile.READAHEAD
+    assert served["bytes"] < len(tiff) // 4
+
+    out_path = os.path.join(str(tmp_path), ROOT, "measurement",
+                            "s1a-iw2-slc-vv-20201217t084141-20201217t084207-024740-02f148-005.tiff")
+    with open(out_path, "rb") as f:
+        out = f.read()
+    assert len(out) == len(tiff)
+    burst = slice(offsets[4], offsets[4] + BURST_BYTES)
+    assert out[burst] == tiff[burst]
+    assert out[:8] == tiff[:8]
+    tail = DATA_START + NBURSTS * BURST_BYTES
+    assert out[tail:] == tiff[tail:]                       # 外置标签值 + IFD
+    assert out[offsets[3]:offsets[3] + BURST_BYTES] == bytes(BURST_BYTES)   # 未选 burst 为空洞
+    assert not os.path.exists(out_path.replace("-vv-", "-vh-"))
+
+
+def test_tiff_metadata_regions_excludes_image_data():
+    tiff, _ = make_tiff()
+    regions = slc_dl.tiff_metadata_regions(lambda off, n: tiff[off:off + n], len(tiff))
+    tail = DATA_START + NBURSTS * BURST_BYTES
+    assert regions == [(0, 8), (tail, len(tiff))]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""slc_dl 目录库查询与搜索窗口：END_DATE 当天的景、与同步键一致的过滤字段"""
+import slc_dl
+
+
+def scene(name, start, platform="Sentinel-1A", beam="IW", pol="VV+VH"):
+    props = {"sceneName": name, "startTime": start, "flightDirection": "ASCENDING", "processingLevel": "SLC",
+             "platform": platform, "beamModeType": beam, "polarization": pol, "pathNumber": 46, "frameNumber": 112}
+    return slc_dl.CatalogScene(props, {"type": "Polygon", "coordinates": [[[139, 35], [140, 35], [140, 36], [139, 35]]]})
+
+
+def names(scenes):
+    return [s.properties["sceneName"] for s in scenes]
+
+
+def test_catalog_query_end_date_and_sync_filters(tmp_path):
+    conn = slc_dl.open_catalog(str(tmp_path / slc_dl.CATALOG_NAME))
+    slc_dl.catalog_upsert(conn, [
+        scene("a", "2024-01-05T08:42:07.000Z"),
+        scene("b", "2024-01-17T08:42:06.000Z"),                      # END_DATE 当天
+        scene("c", "2024-01-18T00:00:01.000Z"),
+        scene("d", "2024-01-10T08:42:07.000Z", beam="EW"),
+        scene("e", "2024-01-11T08:42:07.000Z", pol="HH+HV"),
+        scene("f", "2024-01-12T08:42:07.000Z", platform="ALOS"),
+    ])
+    assert names(slc_dl.catalog_query(conn, start="2024-01-01", end="2024-01-17")) == ["a", "d", "e", "f", "b"]
+    assert names(slc_dl.catalog_query(conn, end="2024-01-17T08:00:00Z")) == ["a", "d", "e", "f"]
+    assert names(slc_dl.catalog_query(conn, end="2024-01-17", platform="SENTINEL-1", beam_mode="IW",
+                                      polarization="VV+VH")) == ["a", "b"]
+    assert names(slc_dl.catalog_query(conn, polarization=["hh+hv", "VV"])) == ["e"]
+    conn.close()
+
+
+def test_search_windows_include_end_date():
+    # 搜索窗口与目录库查询对同一个 END_DATE 的理解一致：当天的景都在范围内
+    windows = slc_dl.split_time_windows("2023-11-20", "2024-01-17")
+    assert windows == [("2023-11-20T00:00:00Z", "2024-01-01T00:00:00Z"),
+                       ("2024-01-01T00:00:00Z", "2024-01-18T00:00:00Z")]
+    assert slc_dl.split_time_windows("2024-01-17", "2024-01-17") == [("2024-01-17T00:00:00Z", "2024-01-18T00:00:00Z")]
+    assert slc_dl.split_time_windows(None, "2024-01-17T08:00:00Z")[-1][1] == "2024-01-17T08:00:00Z"
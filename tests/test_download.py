@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""slc_dl 下载引擎：本地 Range 服务器上的分块下载、断点续传与故障重试"""
+import os
+import re
+import json
+import hashlib
+import threading
+import http.server
+
+import pytest
+import requests
+
+import slc_dl
+
+CHUNK = 64 * 1024
+SIZE = 5 * CHUNK + 1234
+DATA = bytes(hashlib.sha256(str(i).encode()).digest()[i % 32] for i in range(SIZE))
+
+
+def serve(data, faults=None):
+    """faults: {起始偏移: ["503" | "short", ...]}，对该偏移的 Range 请求依次注入故障"""
+    requested = []
+    lock = threading.Lock()
+    faults = faults or {}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            a, b = map(int, re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups())
+            with lock:
+                requested.append((a, b))
+                fault = faults[a].pop(0) if faults.get(a) else None
+            if fault == "503":
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = data[a:b + 1]
+            if fault == "short":
+                body = body[:len(body) // 2]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {a}-{a + len(body) - 1}/{len(data)}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/scene.zip", requested
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(slc_dl.with_retries, "__defaults__", (slc_dl.MAX_RETRIES, 0.0))
+
+
+def chunk_ranges(indices):
+    return sorted((i * CHUNK, min((i + 1) * CHUNK, SIZE) - 1) for i in indices)
+
+
+def fetched(requested):
+    # 去掉探测请求 bytes=0-0
+    return sorted(r for r in requested if r != (0, 0))
+
+
+def test_chunked_download_matches_checksum(tmp_path):
+    server, url, requested = serve(DATA)
+    dest = str(tmp_path / "scene.zip")
+    try:
+        slc_dl.download_file(requests.Session(), url, dest, SIZE, chunk_size=CHUNK, chunk_workers=3)
+    finally:
+        server.shutdown()
+    assert slc_dl.file_md5(dest) == hashlib.md5(DATA).hexdigest()
+    assert fetched(requested) == chunk_ranges(range(6))
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.json")
+
+
+def test_resume_fetches_only_missing_chunks(tmp_path):
+    dest = str(tmp_path / "scene.zip")
+    # 中断的下载：分块 0、2、5 已完成，其余为空洞
+    with open(dest + ".part", "wb") as f:
+        f.truncate(SIZE)
+        for i in (0, 2, 5):
+            f.seek(i * CHUNK)
+            f.write(DATA[i * CHUNK:(i + 1) * CHUNK])
+    with open(dest + ".part.json", "w") as f:
+        json.dump({"size": SIZE, "chunk_size": CHUNK, "done": [0, 2, 5]}, f)
+
+    server, url, requested = serve(DATA)
+    try:
+        slc_dl.download_file(requests.Session(), url, dest, SIZE, chunk_size=CHUNK, chunk_workers=2)
+    finally:
+        server.shutdown()
+    assert fetched(requested) == chunk_ranges((1, 3, 4))
+    assert slc_dl.file_md5(dest) == hashlib.md5(DATA).hexdigest()
+
+
+def test_retries_5xx_and_short_chunk(tmp_path):
+    faults = {CHUNK: ["503", "short"], 3 * CHUNK: ["short"]}
+    server, url, requested = serve(DATA, faults)
+    dest = str(tmp_path / "scene.zip")
+    try:
+        slc_dl.download_file(requests.Session(), url, dest, SIZE, chunk_size=CHUNK, chunk_workers=2)
+    finally:
+        server.shutdown()
+    assert slc_dl.file_md5(dest) == hashlib.md5(DATA).hexdigest()
+    # 故障分块被整块重下，其余分块只请求一次
+    got = fetched(requested)
+    assert got.count(chunk_ranges([1])[0]) == 3 and got.count(chunk_ranges([3])[0]) == 2
+    assert sorted(set(got)) == chunk_ranges(range(6))
+    assert len(got) == 6 + 3
+
+
+def test_download_scenes_reports_failures(tmp_path):
+    # 重试用尽的景在结果中返回异常，其他景照常完成
+    faults = {0: ["503"] * (slc_dl.MAX_RETRIES + 1)}
+    server, url, _ = serve(DATA, faults)
+    good, bad = str(tmp_path / "good.zip"), str(tmp_path / "bad.zip")
+    try:
+        # 第一个作业的探测请求 bytes=0-0 用尽全部重试（消耗掉所有注入的故障）
+        results = slc_dl.download_scenes(requests.Session(), [(url, bad, SIZE)], workers=1, chunk_size=CHUNK)
+        results.update(slc_dl.download_scenes(requests.Session(), [(url, good, SIZE)], workers=1, chunk_size=CHUNK))
+    finally:
+        server.shutdown()
+    assert isinstance(results[bad], slc_dl.RetryableError)
+    assert results[good] is None
+    assert slc_dl.file_md5(good) == hashlib.md5(DATA).hexdigest()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""s1_meta.select_bursts：倾斜、相邻重叠的 IW swath 上选出覆盖 AOI 的最少 swath / burst"""
+import s1_meta
+
+LPB, NBURSTS = 100, 9
+
+
+def annotation(index):
+    # 平行四边形 swath：近距边经度随行号增大（倾斜），与相邻 swath 重叠 0.05°
+    swath = f"IW{index + 1}"
+    bursts = "".join(f"<burst><azimuthTime>t{i}</azimuthTime><byteOffset>{i}</byteOffset></burst>"
+                     for i in range(NBURSTS))
+    pts = ""
+    for k in range(NBURSTS + 1):
+        near = 139.0 + index * 0.25 + k * 0.02
+        for px, lon in ((0, near), (499, near + 0.15), (999, near + 0.3)):
+            pts += (f"<geolocationGridPoint><line>{k * LPB}</line><pixel>{px}</pixel>"
+                    f"<latitude>{35.0 + k * 0.1:.3f}</latitude><longitude>{lon:.4f}</longitude></geolocationGridPoint>")
+    xml = (f"<product><adsHeader><swath>{swath}</swath><polarisation>VV</polarisation></adsHeader>"
+           f"<swathTiming><linesPerBurst>{LPB}</linesPerBurst><samplesPerBurst>1000</samplesPerBurst>"
+           f"<burstList>{bursts}</burstList></swathTiming>"
+           f"<geolocationGrid><geolocationGridPointList>{pts}</geolocationGridPointList></geolocationGrid></product>")
+    return s1_meta.parse_annotation(xml.encode())
+
+
+ANNS = [annotation(i) for i in range(3)]
+
+
+def test_burst_polygon_follows_grid_rows():
+    burst = ANNS[1]["bursts"][4]
+    assert burst["polygon"][0] == (139.33, 35.4) and burst["polygon"][2] == (139.63, 35.4)
+    assert burst["polygon"][3] == (139.65, 35.5) and burst["polygon"][-1] == (139.35, 35.5)
+
+
+def test_single_swath_near_edge():
+    aoi = (139.39, 35.42, 139.42, 35.45)
+    # IW1 的 burst 外包框也与 AOI 相交，但只有 IW2 的 burst 轮廓覆盖 AOI
+    assert s1_meta.bbox_intersects(ANNS[0]["bursts"][4]["bbox"], aoi)
+    assert s1_meta.select_bursts(ANNS, aoi) == {"IW2": (5, 5)}
+
+
+def test_single_swath_shortest_burst_run():
+    assert s1_meta.select_bursts(ANNS, (139.45, 35.48, 139.5, 35.52)) == {"IW2": (5, 6)}
+
+
+def test_straddling_aoi_uses_adjacent_swaths():
+    assert s1_meta.select_bursts(ANNS, (139.3, 35.42, 139.5, 35.45)) == {"IW1": (5, 5), "IW2": (5, 5)}
+
+
+def test_aoi_beyond_scene_falls_back_to_intersecting_swaths():
+    assert s1_meta.select_bursts(ANNS, (139.85, 35.42, 140.2, 35.45)) == {"IW3": (5, 5)}
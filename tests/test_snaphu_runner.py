@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""snaphu_runner：用假的 snaphu 可执行文件检查分块参数、超时结束进程组与更粗分块重试"""
+import sys
+import json
+import time
+
+import pytest
+
+import snaphu_runner
+
+WIDTH = LINES = 4000
+
+FAKE_SNAPHU = """#!{python}
+# 记录参数；分块数 > 2 时 fork 一个子进程并挂起（模拟卡住的分块），否则立即成功
+import os, sys, json, time, subprocess
+args = sys.argv[1:]
+with open("calls.jsonl", "a") as f:
+    f.write(json.dumps(args) + "\\n")
+tiles = 1
+if "--tile" in args:
+    i = args.index("--tile")
+    tiles = int(args[i + 1]) * int(args[i + 2])
+if tiles > 2:
+    os.makedirs("snaphu_tiles_%d" % os.getpid())
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    with open("child.pid", "w") as f:
+        f.write(str(child.pid))
+    print("unwrapping %d tiles" % tiles, flush=True)
+    time.sleep(60)
+print("done", flush=True)
+"""
+
+
+@pytest.fixture
+def snaphu_dir(tmp_path):
+    with open(tmp_path / "snaphu.conf", "w") as f:
+        f.write(f"# snaphu -f snaphu.conf Phase_ifg.img {WIDTH}\n")
+    with open(tmp_path / "Phase_ifg.img", "wb") as f:
+        f.truncate(WIDTH * LINES * 4)
+    fake = tmp_path / "snaphu"
+    fake.write_text(FAKE_SNAPHU.format(python=sys.executable))
+    fake.chmod(0o755)
+    return tmp_path
+
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+def test_tiling_timeout_kill_and_coarser_retry(snaphu_dir):
+    logs = []
+    tiling = snaphu_runner.run_snaphu_tiled(str(snaphu_dir / "snaphu"), str(snaphu_dir),
+                                            lambda level, msg: logs.append((level, msg)), cores=4, timeout=2,
+                                            retries=1)
+    with open(snaphu_dir / "calls.jsonl") as f:
+        calls = [json.loads(line) for line in f]
+    # 4000x4000、4 核 -> 2x2 分块，重叠 200；超时后减半为 1x2
+    assert calls[0] == ["-f", "snaphu.conf", "--tile", "2", "2", "200", "200", "--nproc", "4",
+                        "Phase_ifg.img", str(WIDTH)]
+    assert calls[1] == ["-f", "snaphu.conf", "--tile", "1", "2", "0", "200", "--nproc", "2",
+                        "Phase_ifg.img", str(WIDTH)]
+    assert (tiling["ntilerow"], tiling["ntilecol"], tiling["nproc"]) == (1, 2, 2)
+    assert ("INFO", "snaphu: unwrapping 4 tiles") in logs
+    assert any(level == "WARN" and "coarser tiling" in msg for level, msg in logs)
+    assert not list(snaphu_dir.glob("snaphu_tiles_*"))
+
+    # 超时结束的是整个进程组：挂起分块的子进程也不能残留
+    with open(snaphu_dir / "child.pid") as f:
+        child = int(f.read())
+    deadline = time.time() + 5
+    while alive(child) and time.time() < deadline:
+        time.sleep(0.1)
+    assert not alive(child)
+
+
+def test_timeout_without_retries_raises(snaphu_dir):
+    with pytest.raises(RuntimeError, match="no retries left"):
+        snaphu_runner.run_snaphu_tiled(str(snaphu_dir / "snaphu"), str(snaphu_dir), lambda level, msg: None,
+                                       cores=4, timeout=1, retries=0)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""stage_cache：pin 只在使用期间有效，同一进程连续处理多个 pair 时容量上限仍然成立"""
+import os
+
+import stage_cache
+
+ENTRY_BYTES = 100 * 1024
+
+
+def put(cache, key):
+    tmp_dir, base = cache.staging_path(key)
+    os.makedirs(base + ".data")
+    with open(base + ".dim", "w") as f:
+        f.write("<Dimap_Document/>")
+    with open(os.path.join(base + ".data", "band.img"), "wb") as f:
+        f.write(b"\0" * ENTRY_BYTES)
+    return cache.commit(key, tmp_dir, {"stage": "ifg"})
+
+
+def test_cap_holds_across_pairs(tmp_path):
+    cap_gb = 3.5 * ENTRY_BYTES / 1024 ** 3
+    cache = stage_cache.StageCache(str(tmp_path), max_gb=cap_gb)
+    shared = stage_cache.stage_key("split_orb:IW1", "Apply-Orbit-File", [], ["scene"])
+    put(cache, shared)                                   # 所有 pair 共用的景级条目，整批期间保持 pin
+    for pair in range(6):
+        keys = [stage_cache.stage_key(name, "op", [("pair", pair)]) for name in ("bg", "esd", "ifg")]
+        for key in keys:
+            put(cache, key)
+        assert cache.lookup(shared)
+        # pair 进行中：本 pair 的条目都在使用，不能被淘汰（允许暂时超出容量）
+        assert all(os.path.exists(cache.product_path(k)) for k in keys)
+        for key in keys:
+            cache.release(key)
+        cache.release(shared)
+        assert cache.total_size() <= cache.max_bytes
+        assert os.path.exists(cache.product_path(shared))
+    assert set(cache.pinned) == {shared}
+    cache.release(shared)
+    assert cache.pinned == {}
+
+
+def test_release_makes_entry_evictable(tmp_path):
+    cache = stage_cache.StageCache(str(tmp_path), max_gb=0.5 * ENTRY_BYTES / 1024 ** 3)
+    put(cache, "a")
+    assert cache.lookup("a")
+    assert cache.evict() == []                           # 两次使用（commit + lookup）
+    cache.release("a")
+    assert os.path.exists(cache.product_path("a"))
+    cache.release("a")                                   # 最后一个使用者释放后立即按容量淘汰
+    assert not os.path.exists(cache.entry_dir("a"))
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+纯 NumPy 相位解缠（SNAPHU 的后备方案）
+
+加权最小二乘（Ghiglia & Romero 1994）：
+- 权重 = 相干性²；以无权 Poisson 方程（DCT，Neumann 边界）为预条件的共轭梯度求解
+- 结果与缠绕相位做同余处理：unw = psi + 2π·round((phi - psi) / 2π)
+- 分块处理（带重叠），相邻块按重叠区中位数差确定 2π 整数倍偏移后拼接，内存只与块大小有关
+
+DCT 通过镜像延拓 + rfft2 实现，只依赖 numpy。
+"""
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+TWO_PI = 2 * np.pi
+TILE = 1024          # 分块边长（像元）
+OVERLAP = 128        # 分块重叠
+MAX_ITER = 50        # PCG 最大迭代次数
+TOL = 1e-3           # PCG 相对残差阈值
+MIN_WEIGHT = 0.09    # 估计块间偏移时使用的像元：相干性² 不小于该值（相干性 0.3）
+
+_denoms = {}
+_denoms_lock = threading.Lock()
+
+
+def wrap(x):
+    return (x + np.pi) % TWO_PI - np.pi
+
+
+def _denom(shape):
+    # 镜像延拓网格上离散 Laplacian 的特征值（rfft2 布局）
+    with _denoms_lock:
+        if shape not in _denoms:
+            m, n = shape
+            k = np.arange(2 * m)[:, None]
+            l = np.arange(n + 1)[None, :]
+            d = 2 * np.cos(np.pi * k / m) + 2 * np.cos(np.pi * l / n) - 4
+            d[0, 0] = 1.0
+            _denoms[shape] = d
+        return _denoms[shape]
+
+
+def solve_poisson(rho):
+    """Neumann 边界 Poisson 方程 ∇²phi = rho（均值为 0 的解）"""
+    m, n = rho.shape
+    ext = np.empty((2 * m, 2 * n), dtype=np.float64)
+    ext[:m, :n] = rho
+    ext[m:, :n] = rho[::-1]
+    ext[:, n:] = ext[:, n - 1::-1]
+    spec = np.fft.rfft2(ext)
+    spec /= _denom((m, n))
+    spec[0, 0] = 0.0
+    return np.fft.irfft2(spec, s=ext.shape)[:m, :n]
+
+
+def _div(gx, gy):
+    # gx: (m, n-1) 的 x 向差分，gy: (m-1, n)；Neumann 边界下的散度
+    out = np.zeros((gy.shape[0] + 1, gx.shape[1] + 1), dtype=np.float64)
+    out[:, :-1] += gx
+    out[:, 1:] -= gx
+    out[:-1, :] += gy
+    out[1:, :] -= gy
+    return out
+
+
+def unwrap_tile(psi, weight=None, max_iter=MAX_ITER, tol=TOL):
+    """单块解缠；psi 为缠绕相位，weight 为像元权重（None 时为无权最小二乘）"""
+    psi = np.asarray(psi, dtype=np.float64)
+    dx = wrap(np.diff(psi, axis=1))
+    dy = wrap(np.diff(psi, axis=0))
+
+    if weight is None:
+        phi = solve_poisson(_div(dx, dy))
+    else:
+        w = np.asarray(weight, dtype=np.float64)
+        wx = np.minimum(w[:, 1:], w[:, :-1])
+        wy = np.minimum(w[1:, :], w[:-1, :])
+
+        def apply(p):
+            # A = -div(W grad p)，半正定
+            return -_div(wx * np.diff(p, axis=1), wy * np.diff(p, axis=0))
+
+        b = -_div(wx * dx, wy * dy)
+        b_norm = np.linalg.norm(b)
+        phi = np.zeros_like(psi)
+        if b_norm > 0:
+            r = b.copy()
+            z = solve_poisson(-r)          # (-∇²)⁻¹ r
+            p = z.copy()
+            rz = np.vdot(r, z)
+            for _ in range(max_iter):
+                ap = apply(p)
+                alpha = rz / np.vdot(p, ap)
+                phi += alpha * p
+                r -= alpha * ap
+                if np.linalg.norm(r) < tol * b_norm:
+                    break
+                z = solve_poisson(-r)
+                rz_new = np.vdot(r, z)
+                p = z + (rz_new / rz) * p
+                rz = rz_new
+
+    # 同余：只改变 2π 的整数倍，保留原始缠绕相位的细节
+    unw = psi + TWO_PI * np.round((phi - psi) / TWO_PI)
+    if weight is not None:
+        unw[np.asarray(weight) <= 0] = 0.0
+    return unw
+
+
+def tiles(height, width, tile=TILE, overlap=OVERLAP):
+    """按行优先顺序的块窗口 (y0, x0, h, w)；相邻块重叠 overlap 像元"""
+    step = max(1, tile - overlap)
+    ys = list(range(0, max(1, height - overlap), step)) or [0]
+    xs = list(range(0, max(1, width - overlap), step)) or [0]
+    for y0 in ys:
+        for x0 in xs:
+            yield y0, x0, min(tile, height - y0), min(tile, width - x0)
+
+
+def _offset(existing, new, weight):
+    # 重叠区中 (已写入 - 新块) 的中位数 -> 2π 整数倍
+    valid = (existing != 0) & (weight >= MIN_WEIGHT)
+    if not valid.any():
+        return 0.0
+    return TWO_PI * np.round(np.median(existing[valid] - new[valid]) / TWO_PI)
+
+
+def unwrap_tiled(read_tile, height, width, out, tile=TILE, overlap=OVERLAP, workers=1, log=None):
+    """分块解缠写入 out（ndarray 或 np.memmap，形状 (height, width)）
+
+    read_tile(y0, x0, h, w) -> (phase, coherence)，coherence 可为 None；
+    读块与拼接在调用线程中按顺序进行，解缠在 workers 个线程中进行（同时在途的块数有上限）
+    """
+    windows = list(tiles(height, width, tile, overlap))
+    if log:
+        log("INFO", f"NumPy unwrap {width}x{height}: {len(windows)} tiles of {tile} px, overlap {overlap}")
+
+    def work(win, phase, coh):
+        weight = None if coh is None else np.square(np.nan_to_num(coh.astype(np.float64)))
+        return win, unwrap_tile(phase, weight), weight
+
+    def stitch(win, unw, weight):
+        y0, x0, h, w = win
+        if weight is None:
+            weight = np.ones_like(unw)
+        oy = min(overlap, h) if y0 > 0 else 0
+        ox = min(overlap, w) if x0 > 0 else 0
+        region = np.zeros((h, w), dtype=bool)
+        region[:oy, :] = True
+        region[:, :ox] = True
+        if region.any():
+            existing = np.asarray(out[y0:y0 + h, x0:x0 + w], dtype=np.float64)
+            unw = unw + _offset(existing[region], unw[region], weight[region])
+        # 重叠区的前一半保留已写入的值，后一半使用新块
+        cy, cx = oy // 2, ox // 2
+        out[y0 + cy:y0 + h, x0 + cx:x0 + w] = unw[cy:, cx:]
+
+    pending = deque()
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for win in windows:
+            phase, coh = read_tile(*win)
+            pending.append(pool.submit(work, win, phase, coh))
+            while len(pending) > max(1, workers):
+                stitch(*pending.popleft().result())
+                done += 1
+        while pending:
+            stitch(*pending.popleft().result())
+            done += 1
+    if log:
+        log("INFO", f"NumPy unwrap finished: {done} tiles")
+    return out
+
+
+def tile_memory_mb(tile=TILE, workers=1):
+    # 粗略估计：每个在途块 ~ 镜像延拓 (2t)² float64 + 复数谱 + 若干 t² 工作数组
+    per_tile = (4 * tile * tile * 8) * 2 + 12 * tile * tile * 8
+    return math.ceil(per_tile * (workers + 1) / 1024 ** 2)